@@ -0,0 +1,14 @@
+"""
+ASGI config for articles project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with any ASGI server, e.g. ``uvicorn articles.asgi:application``.
+"""
+
+import os
+
+from articles_app.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'articles.settings')
+
+application = get_asgi_application()
@@ -36,19 +36,30 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'articles_app.apps.ArticlesAppConfig',
-    'rest_framework'
+    'rest_framework',
+    'rest_framework.authtoken',
 ]
 
 AUTH_USER_MODEL = 'articles_app.CustomUser'
 
-# REST_FRAMEWORK = {
-#     'DEFAULT_AUTHENTICATION_CLASSES': (
-#         'rest_framework.authentication.BasicAuthentication',
-#         'rest_framework.authentication.SessionAuthentication',
-#     )
-# }
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'rest_framework.authentication.SessionAuthentication',
+        'articles_app.authentication.CachedTokenAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'articles_app.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
+# JSON is rendered with orjson when it is installed, 'json' selects the standard library
+ARTICLES_JSON_BACKEND = 'orjson'
 
 MIDDLEWARE = [
+    'articles_app.instrumentation.InstrumentationMiddleware',
+    'articles_app.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,6 +104,62 @@ DATABASES = {
     }
 }
 
+# Safe requests of article and comment views are served from ARTICLES_READ_REPLICAS aliases, e.g.
+# ['replica'] with a 'replica' entry in DATABASES. Clients read from the primary for ARTICLES_STICKY_SECONDS
+# after they write, replicas which fail health check or lag more than ARTICLES_REPLICA_MAX_LAG seconds
+# are skipped until the next check
+DATABASE_ROUTERS = ['articles_app.routers.ReplicaRouter']
+ARTICLES_READ_REPLICAS = []
+ARTICLES_STICKY_SECONDS = 5
+ARTICLES_REPLICA_MAX_LAG = 10
+ARTICLES_REPLICA_CHECK_INTERVAL = 5
+
+# Trending feed: publications, comments and votes weigh this much, halved every ARTICLES_TRENDING_HALF_LIFE
+# hours. Run decay_trending periodically (e.g. hourly), it drops articles below ARTICLES_TRENDING_MIN_SCORE
+ARTICLES_TRENDING_HALF_LIFE = 24.0
+ARTICLES_TRENDING_PUBLICATION_WEIGHT = 10.0
+ARTICLES_TRENDING_COMMENT_WEIGHT = 1.0
+ARTICLES_TRENDING_VOTE_WEIGHT = 2.0
+ARTICLES_TRENDING_MIN_SCORE = 0.01
+
+# /articles/changes serves change log entries older than ARTICLES_CHANGES_SETTLE_SECONDS, so entries of
+# transactions still running cannot be skipped. compact_changes prunes entries older than
+# ARTICLES_CHANGES_RETENTION_DAYS, clients which did not synchronize for that long start over
+ARTICLES_CHANGES_SETTLE_SECONDS = 5
+ARTICLES_CHANGES_RETENTION_DAYS = 30
+
+# Worker threads running Django under articles.asgi, connections themselves are served by the event loop
+ARTICLES_ASGI_THREADS = 8
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+# Article responses are cached in ARTICLES_CACHE_ALIAS, use a shared backend (memcached, redis)
+# when running more than one worker process
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+ARTICLES_CACHE_ALIAS = 'default'
+ARTICLES_CACHE_TIMEOUT = 300
+# Users of API tokens are cached for this many seconds, entries are dropped on revoke or user change
+ARTICLES_TOKEN_CACHE_TIMEOUT = 60
+
+# Per-request query count and timing in Server-Timing header and log, requests slower than
+# ARTICLES_SLOW_REQUEST_MS are logged with their slowest statements and query plans
+ARTICLES_INSTRUMENTATION = False
+ARTICLES_SLOW_REQUEST_MS = 500
+ARTICLES_SLOW_STATEMENTS = 5
+
+# Responses of at least ARTICLES_COMPRESSION_MIN_SIZE bytes are compressed with brotli, when installed,
+# or gzip. Streamed responses are flushed to the client every ARTICLES_COMPRESSION_FLUSH_SIZE input bytes
+ARTICLES_COMPRESSION_MIN_SIZE = 1024
+ARTICLES_COMPRESSION_FLUSH_SIZE = 16384
+ARTICLES_GZIP_LEVEL = 6
+ARTICLES_BROTLI_QUALITY = 5
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
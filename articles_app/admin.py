@@ -5,6 +5,11 @@ from django.contrib.auth.admin import UserAdmin
 
 from articles_app.forms import CustomUserChangeForm, CustomUserCreationForm
 from articles_app.models import *
+from articles_app.pagination import CountLimitedPaginator
+from articles_app.search import ArticleSearch
+
+ADMIN_COUNT_LIMIT = 10000
+ADMIN_SEARCH_LIMIT = 1000
 
 
 class CustomUserAdmin(UserAdmin):
@@ -14,8 +19,83 @@ class CustomUserAdmin(UserAdmin):
     list_display = ['email', 'username']
 
 
-admin.site.register(Article)
-admin.site.register(Comment)
-admin.site.register(Author)
-admin.site.register(Tag)
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist of a large table. Unfiltered tables report the planner estimate on PostgreSQL, filtered ones
+    are counted up to ADMIN_COUNT_LIMIT rows, and the second count of the whole table is not run
+    """
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return CountLimitedPaginator(queryset, per_page, orphans, allow_empty_first_page,
+                                     count_limit=ADMIN_COUNT_LIMIT, estimate=True)
+
+
+class ArticleAdmin(LargeTableAdmin):
+    list_display = ['title', 'author', 'publication_date', 'rating', 'views']
+    list_select_related = ['author']
+    date_hierarchy = 'publication_date'
+    ordering = ['-publication_date', '-id']
+    search_fields = ['title']
+    autocomplete_fields = ['author', 'tags']
+    readonly_fields = ['rating', 'views', 'excerpt']
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through the full-text index of articles instead of LIKE over every row
+        """
+        if not search_term.strip():
+            return queryset, False
+        rows = ArticleSearch(search_term, queryset).fetch_rows(None, False, ADMIN_SEARCH_LIMIT)
+        return queryset.filter(id__in=[row[0] for row in rows]), False
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Counters are written by their buffers, the values loaded into the form may be stale
+        fields = [name for name in form.changed_data if name not in ('tags', 'rating', 'views')]
+        obj.save(update_fields=fields + ['excerpt', 'updated_at'])
+
+
+class CommentAdmin(LargeTableAdmin):
+    list_display = ['id', 'article_id', 'author', 'publication_date', 'depth']
+    list_select_related = ['author']
+    date_hierarchy = 'publication_date'
+    ordering = ['-publication_date', '-id']
+    search_fields = ['article__id']
+    raw_id_fields = ['article', 'parent']
+    autocomplete_fields = ['author']
+
+    def article_id(self, comment):
+        return comment.article_id
+    article_id.short_description = 'article'
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Comments are searched by id of their article, which is indexed
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if not search_term.isdigit():
+            return queryset.none(), False
+        return queryset.filter(article_id=int(search_term)), False
+
+
+class AuthorAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'user']
+    list_select_related = ['user']
+    search_fields = ['^nickname', '^user__username']
+    raw_id_fields = ['user']
+
+
+class TagAdmin(admin.ModelAdmin):
+    search_fields = ['^name']
+    ordering = ['name']
+
+
+admin.site.register(Article, ArticleAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Author, AuthorAdmin)
+admin.site.register(Tag, TagAdmin)
 admin.site.register(CustomUser, CustomUserAdmin)
@@ -0,0 +1,159 @@
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+from articles_app.counters import flush_all
+
+QUEUE_SIZE = 8
+
+
+def build_environ(scope, body):
+    """
+    Translate ASGI HTTP connection scope into WSGI environ reading the request from body file
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': str(client[0]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin-1').upper().replace('-', '_'), value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = '{},{}'.format(environ[name], value) if name in environ else value
+    return environ
+
+
+class ASGIHandler(object):
+    """
+    ASGI application serving Django. Connections, request bodies and sending of responses are handled
+    on the event loop, only Django itself (middleware, views and their database work) runs in a pool
+    of max_workers threads, so a slow client holds a coroutine instead of a worker.
+    Chunks of streaming responses are produced by the thread which handled the request, because
+    database cursors cannot move between threads, and handed to the event loop through a bounded queue.
+
+    On lifespan shutdown pending counter increments are flushed
+    """
+
+    def __init__(self, handler=None, max_workers=None):
+        self.handler = handler or WSGIHandler()
+        self.max_workers = max_workers or getattr(settings, 'ARTICLES_ASGI_THREADS', 8)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI connection type {}'.format(scope['type']))
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_event_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await loop.run_in_executor(self.executor, flush_all)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(QUEUE_SIZE)
+        aborted = threading.Event()
+        handled = loop.run_in_executor(self.executor, self.handle, build_environ(scope, body), loop, queue, aborted)
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                await send(message)
+        finally:
+            aborted.set()
+            while not queue.empty():
+                queue.get_nowait()
+            try:
+                await handled
+            finally:
+                body.close()
+
+    def handle(self, environ, loop, queue, aborted):
+        """
+        Run Django for environ in a worker thread and put ASGI response messages into queue,
+        None marks the end of the response
+        """
+
+        def put(message):
+            if not aborted.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        started = dict()
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                  for name, value in headers]
+
+        response = None
+        try:
+            response = self.handler(environ, start_response)
+            put({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            if not response.streaming:
+                put({'type': 'http.response.body', 'body': b''.join(response)})
+            else:
+                for chunk in response:
+                    if aborted.is_set():
+                        break
+                    if chunk:
+                        put({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                put({'type': 'http.response.body', 'body': b''})
+        finally:
+            try:
+                if response is not None:
+                    # Sends request_finished which closes database connections of this thread
+                    response.close()
+            finally:
+                put(None)
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
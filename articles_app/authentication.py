@@ -0,0 +1,53 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from articles_app.cache import get_cache
+
+TOKEN_CACHE_TIMEOUT = getattr(settings, 'ARTICLES_TOKEN_CACHE_TIMEOUT', 60)
+
+
+def token_cache_key(key):
+    return 'auth:token:{}'.format(hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def invalidate_token(key):
+    get_cache().delete(token_cache_key(key))
+
+
+def invalidate_user_tokens(user_id):
+    get_cache().delete_many([token_cache_key(key) for key in
+                             Token.objects.filter(user_id=user_id).values_list('key', flat=True)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication which keeps the user of every token, together with the user's author,
+    in cache for TOKEN_CACHE_TIMEOUT seconds. Cached entries are dropped when the token is revoked
+    or the user or author changes, so no request runs a password hash and repeated requests
+    of a client run no authentication queries at all. The password hash is never cached
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cache_key = token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            model = self.get_model()
+            try:
+                # Author is loaded along with the user and reused by get_author_data_related_to_user()
+                token = model.objects.select_related('user__author').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            # Left out the password becomes a deferred field, loaded on access and skipped by save()
+            del token.user.password
+            credentials = (token.user, token)
+            cache.set(cache_key, credentials, TOKEN_CACHE_TIMEOUT)
+
+        if not credentials[0].is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return credentials
@@ -0,0 +1,163 @@
+import json
+import math
+import random
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from articles_app.importer import ArticleImporter
+from articles_app.models import Article, ArticleTrend, Author, Change, Comment, CustomUser, Tag
+
+BENCH_USER_PREFIX = 'bench_'
+BENCH_TAG_PREFIX = 'bench'
+DELETE_CHUNK_SIZE = 500
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(int(math.ceil(p / 100 * len(ordered))) - 1, 0)]
+
+
+def summarize(latencies, queries, elapsed, errors=0):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Compare scenarios of report with baseline report. Return list of (scenario, metric, baseline, current)
+    of metrics which got worse by more than tolerance, a fraction of the baseline value
+    """
+    regressions = list()
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append((name, metric, previous[metric], current[metric]))
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append((name, 'throughput_rps', previous['throughput_rps'], current['throughput_rps']))
+    return regressions
+
+
+def benchmark_host():
+    """
+    Host header accepted by ALLOWED_HOSTS
+    """
+    return next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')),
+                'localhost')
+
+
+def seed_dataset(articles, authors, tags_per_article, comments_per_article, tags=None, rng=None):
+    """
+    Create authors and articles with tags and comments using bulk inserts. Return (users, article_ids)
+    """
+    rng = rng or random.Random(0)
+    tags = tags or max(tags_per_article * 10, 1)
+    stamp = int(time.time() * 1000)
+    password = make_password('password')
+    users = CustomUser.objects.bulk_create([
+        CustomUser(username='{}{}_{}'.format(BENCH_USER_PREFIX, stamp, i), password=password, is_redaction=True)
+        for i in range(authors)])
+    users = list(CustomUser.objects.filter(username__startswith='{}{}_'.format(BENCH_USER_PREFIX, stamp))
+                 .order_by('id'))
+    Author.objects.bulk_create([Author(user=user, first_name='Bench', nickname=user.username) for user in users])
+
+    today = date.today()
+    now = timezone.now()
+
+    def lines():
+        for i in range(articles):
+            yield json.dumps({
+                'title': 'Benchmark article {}'.format(i),
+                'content': ' '.join('word{}'.format(rng.randrange(1000)) for _ in range(200)),
+                'author': rng.choice(users).username,
+                'tags': [BENCH_TAG_PREFIX + str(rng.randrange(tags)) for _ in range(tags_per_article)],
+                'publication_date': (today - timedelta(days=rng.randrange(365))).isoformat(),
+                'rating': rng.randrange(-10, 100),
+                'comments': [{'author': rng.choice(users).username, 'content': 'Comment {}'.format(j),
+                              'publication_date': (now - timedelta(minutes=rng.randrange(10000))).isoformat()}
+                             for j in range(comments_per_article)],
+            })
+
+    importer = ArticleImporter(chunk_size=500)
+    errors = list(importer.import_lines(lines()))
+    if errors:
+        raise ValueError('Benchmark data was rejected: {}'.format(errors[0]))
+    article_ids = list(Article.objects.filter(author__user__in=users).values_list('id', flat=True))
+    return users, article_ids
+
+
+def delete_dataset(users):
+    """
+    Delete users with their articles and comments, including the ones benchmark requests created,
+    benchmark tags no other article uses and trending scores of the articles. Create and update entries of
+    the deleted objects are dropped from the change log, their delete entries are kept for clients which
+    read the log during the run
+    """
+    articles = Article.objects.filter(author__user__in=users)
+    article_ids = list(articles.values_list('id', flat=True))
+    comment_ids = list(Comment.objects.filter(Q(article__in=articles) | Q(author__user__in=users))
+                       .values_list('id', flat=True))
+    with transaction.atomic():
+        ArticleTrend.objects.filter(article__in=articles).delete()
+        articles.delete()
+        CustomUser.objects.filter(id__in=[user.id for user in users]).delete()
+        tags = Tag.objects.filter(name__regex=r'^{}[0-9]+$'.format(BENCH_TAG_PREFIX), article=None)
+        tag_ids = list(tags.values_list('id', flat=True))
+        tags.delete()
+        # Entries are deleted last, deletes above log their own tombstones
+        changes = Change.objects.exclude(action=Change.DELETE)
+        for kind, ids in ((Change.ARTICLE, article_ids), (Change.COMMENT, comment_ids), (Change.TAG, tag_ids)):
+            for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+                changes.filter(kind=kind, object_id__in=ids[start:start + DELETE_CHUNK_SIZE]).delete()
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+
+def run_scenario(client, make_request, requests, warmup=0):
+    """
+    Send warmup and then requests requests with make_request(client, i), which returns the response.
+    Return summary of measured requests
+    """
+    for i in range(warmup):
+        make_request(client, i)
+
+    latencies, queries, errors = list(), list(), 0
+    counter = QueryCounter()
+    started = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        for i in range(requests):
+            counter.queries = 0
+            request_started = time.perf_counter()
+            response = make_request(client, warmup + i)
+            latencies.append(time.perf_counter() - request_started)
+            queries.append(counter.queries)
+            if response.status_code >= 400:
+                errors += 1
+    return summarize(latencies, queries, time.perf_counter() - started, errors)
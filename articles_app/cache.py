@@ -0,0 +1,169 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from articles_app.routers import may_lag_behind
+
+CACHE_ALIAS = getattr(settings, 'ARTICLES_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'ARTICLES_CACHE_TIMEOUT', 300)
+LOCK_TIMEOUT = getattr(settings, 'ARTICLES_CACHE_LOCK_TIMEOUT', 10)
+LOCK_WAIT = 0.05
+
+LIST_VERSION_KEY = 'articles:list:version'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def detail_version_key(pk):
+    return 'articles:detail:{}:version'.format(pk)
+
+
+def _new_version():
+    return '{:.6f}:{}'.format(time.time(), uuid.uuid4().hex)
+
+
+def _version_time(version):
+    return float(version.split(':', 1)[0])
+
+
+def _get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def list_version():
+    """
+    Return token which changes whenever any list page changes and time of that change
+    """
+    version = _get_version(LIST_VERSION_KEY)
+    return version, _version_time(version)
+
+
+def query_hash(request):
+    """
+    Hash of query params together with scheme and host, which absolute urls in the payload are built from
+    """
+    query = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    return hashlib.sha1(repr((request.scheme, request.get_host(), query)).encode('utf-8')).hexdigest()
+
+
+def list_cache_key(request):
+    """
+    Return (cache key of list page, time of the last change of lists)
+    """
+    version, changed_at = list_version()
+    return 'articles:list:{}:{}'.format(version, query_hash(request)), changed_at
+
+
+def detail_version(pk):
+    """
+    Return token which changes whenever payload of the article changes and time of that change
+    """
+    version = _get_version(detail_version_key(pk))
+    return version, _version_time(version)
+
+
+def detail_cache_key(request, pk):
+    """
+    Return (cache key of article payload, time of the last change of the article)
+    """
+    version, changed_at = detail_version(pk)
+    return 'articles:detail:{}:{}:{}'.format(pk, version, query_hash(request)), changed_at
+
+
+def _bump(article_ids, lists):
+    versions = {detail_version_key(pk): _new_version() for pk in article_ids}
+    if lists:
+        versions[LIST_VERSION_KEY] = _new_version()
+    if versions:
+        get_cache().set_many(versions, None)
+
+
+def invalidate_articles(article_ids=(), lists=True):
+    """
+    Make cached payloads of given articles and, unless lists is False, all cached list pages stale.
+    Versions are bumped immediately and once more after commit so that a page computed by concurrent
+    request from not yet committed state is never served
+    """
+    article_ids = set(article_ids)
+    _bump(article_ids, lists)
+    transaction.on_commit(lambda: _bump(article_ids, lists))
+
+
+def get_or_compute(key, compute, timeout=CACHE_TIMEOUT):
+    """
+    Return cached value of key or compute and store it. Only one worker computes a missing value,
+    the others wait up to LOCK_TIMEOUT for it to appear before computing it themselves
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = key + ':lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_WAIT)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            if cache.add(lock_key, 1, LOCK_TIMEOUT):
+                break
+
+    try:
+        value = compute()
+        if value is not None:
+            cache.set(key, value, timeout)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+class CachedReadMixin(object):
+    """
+    Serve list and retrieve responses of the view from cache. Only successful responses are stored.
+    Responses read from a replica which may not have replayed the last change yet are not stored,
+    they would be served under the version of that change
+    """
+
+    def _cached_response(self, key, changed_at, view_method, request, *args, **kwargs):
+        if may_lag_behind(changed_at):
+            data = get_cache().get(key)
+            if data is None:
+                return view_method(request, *args, **kwargs)
+            return Response(data)
+
+        response = None
+
+        def compute():
+            nonlocal response
+            response = view_method(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                return response.data
+            return None
+
+        data = get_or_compute(key, compute)
+        if response is not None:
+            return response
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        key, changed_at = list_cache_key(request)
+        return self._cached_response(key, changed_at, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        key, changed_at = detail_cache_key(request, kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return self._cached_response(key, changed_at, super().retrieve, request, *args, **kwargs)
@@ -0,0 +1,91 @@
+from itertools import takewhile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from articles_app.models import Change, ChangeCompaction
+
+RETENTION_DAYS = getattr(settings, 'ARTICLES_CHANGES_RETENTION_DAYS', 30)
+COMPACTION_BATCH_SIZE = 10000
+
+
+def compacted_seq(using=None):
+    """
+    Highest pruned seq, 0 when the log was never pruned
+    """
+    return ChangeCompaction.objects.using(using).aggregate(seq=Max('seq'))['seq'] or 0
+
+
+def latest_changes(changes):
+    """
+    Changes without the ones followed by a later change of the same object, in seq order
+    """
+    latest = dict()
+    for change in changes:
+        latest.pop((change.kind, change.object_id), None)
+        latest[(change.kind, change.object_id)] = change
+    return list(latest.values())
+
+
+def fetch_changes(since, limit, settled_before, using=None):
+    """
+    Return (changes, last_seq, has_more) for up to limit entries following since. Reading stops at the first
+    entry written after settled_before: entries are numbered when inserted, an entry of a transaction which
+    has not committed yet may get a lower seq than one which already has. Superseded entries are left out,
+    last_seq is the seq to continue from
+    """
+    rows = list(Change.objects.using(using).filter(seq__gt=since).order_by('seq')[:limit + 1])
+    settled = list(takewhile(lambda change: change.created_at <= settled_before, rows))
+    page = settled[:limit]
+    has_more = len(settled) > limit
+    last_seq = page[-1].seq if page else since
+    return latest_changes(page), last_seq, has_more
+
+
+def collapse(batch_size=COMPACTION_BATCH_SIZE, using='default'):
+    """
+    Delete entries followed by a later entry of the same object, a client reading from any seq still gets
+    the latest entry of every object it has not seen. Return number of deleted entries
+    """
+    changes = Change.objects.using(using)
+    deleted, last_seq = 0, 0
+    while True:
+        batch = list(changes.filter(seq__gt=last_seq).order_by('seq')
+                     .values_list('seq', 'kind', 'object_id')[:batch_size])
+        if not batch:
+            return deleted
+        last_seq = batch[-1][0]
+
+        latest = dict()
+        for kind in set(kind for _, kind, _ in batch):
+            ids = set(object_id for _, entry_kind, object_id in batch if entry_kind == kind)
+            for object_id, seq in changes.filter(kind=kind, object_id__in=ids).values('object_id') \
+                    .annotate(seq=Max('seq')).values_list('object_id', 'seq'):
+                latest[(kind, object_id)] = seq
+        superseded = [seq for seq, kind, object_id in batch if seq < latest[(kind, object_id)]]
+        if superseded:
+            deleted += changes.filter(seq__in=superseded).delete()[0]
+
+
+def expire(before, batch_size=COMPACTION_BATCH_SIZE, using='default'):
+    """
+    Delete entries written before the given moment, oldest first, and record the highest deleted seq.
+    Return number of deleted entries
+    """
+    changes = Change.objects.using(using)
+    deleted = 0
+    while True:
+        rows = list(changes.order_by('seq').values_list('seq', 'created_at')[:batch_size])
+        expired = list(takewhile(lambda row: row[1] < before, rows))
+        if not expired:
+            break
+        with transaction.atomic(using=using):
+            ChangeCompaction.objects.using(using).create(seq=expired[-1][0])
+            deleted += changes.filter(seq__lte=expired[-1][0]).delete()[0]
+        if len(expired) < batch_size:
+            break
+
+    horizon = compacted_seq(using)
+    ChangeCompaction.objects.using(using).filter(seq__lt=horizon).delete()
+    return deleted
@@ -0,0 +1,144 @@
+import re
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class GzipCompressor(object):
+    def __init__(self, level=6):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor(object):
+    def __init__(self, quality=5):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def get_codings():
+    """
+    Supported content codings in order of preference mapped to their compressor factories
+    """
+    codings = OrderedDict()
+    if brotli is not None:
+        codings['br'] = lambda: BrotliCompressor(getattr(settings, 'ARTICLES_BROTLI_QUALITY', 5))
+    codings['gzip'] = lambda: GzipCompressor(getattr(settings, 'ARTICLES_GZIP_LEVEL', 6))
+    return codings
+
+
+def negotiate(accept_encoding, codings):
+    """
+    Return coding of codings with the highest q value in Accept-Encoding header, earlier codings win ties.
+    None when the client accepts none of them
+    """
+    accepted = dict()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for coding in codings:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(data, compressor):
+    return compressor.process(data) + compressor.finish()
+
+
+def compress_stream(chunks, compressor, flush_size):
+    """
+    Compress iterable of byte chunks. Compressed data is flushed to the client whenever flush_size bytes
+    were fed to the compressor since the last flush, so streamed responses keep arriving incrementally
+    """
+    pending = 0
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            data += compressor.flush()
+            pending = 0
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(object):
+    """
+    Compress JSON, NDJSON and text responses with brotli (when installed) or gzip negotiated by
+    Accept-Encoding. Responses shorter than ARTICLES_COMPRESSION_MIN_SIZE bytes are sent as they are,
+    streaming responses are compressed chunk by chunk and flushed every ARTICLES_COMPRESSION_FLUSH_SIZE
+    bytes of input
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'ARTICLES_COMPRESSION_MIN_SIZE', 1024)
+        self.flush_size = getattr(settings, 'ARTICLES_COMPRESSION_FLUSH_SIZE', 16384)
+        self.codings = get_codings()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '')
+        if response.has_header('Content-Encoding') or not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.codings)
+        if coding is None:
+            return response
+
+        compressor = self.codings[coding]()
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, compressor, self.flush_size)
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, compressor)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # Compressed representation is not byte for byte the same, its validator becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
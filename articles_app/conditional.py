@@ -0,0 +1,57 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from articles_app.cache import detail_version, list_version, query_hash
+from articles_app.models import Article
+from articles_app.routers import may_lag_behind
+
+
+def make_etag(*parts):
+    return '"{}"'.format(hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest())
+
+
+class ConditionalGetMixin(object):
+    """
+    Emit ETag and Last-Modified on list and retrieve responses and answer matching If-None-Match
+    or If-Modified-Since with 304 before the payload is loaded or serialized
+    """
+
+    def get_list_validators(self, request):
+        version, last_modified = list_version()
+        return make_etag('list', version, query_hash(request)), int(last_modified)
+
+    def get_retrieve_validators(self, request, pk):
+        updated_at = Article.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None, None
+        # Counters such as views change the payload without touching updated_at, they bump the version
+        version, changed_at = detail_version(pk)
+        last_modified = max(timegm(updated_at.utctimetuple()), int(changed_at))
+        return make_etag('detail', pk, updated_at.isoformat(), version, query_hash(request)), last_modified
+
+    def _conditional_response(self, validators, view_method, request, *args, **kwargs):
+        etag, last_modified = validators
+        if etag is None:
+            return view_method(request, *args, **kwargs)
+
+        response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view_method(request, *args, **kwargs)
+            # A replica which lags behind may have returned payload older than the validators
+            if response.status_code != 200 or may_lag_behind(last_modified):
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(self.get_list_validators(request), super().list,
+                                          request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self._conditional_response(self.get_retrieve_validators(request, pk), super().retrieve,
+                                          request, *args, **kwargs)
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.db import DatabaseError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+BUFFERS = list()
+
+
+class CounterBuffer(object):
+    """
+    Accumulate increments of an integer column of model rows in process memory and apply them
+    with a single UPDATE ... SET field = field + CASE pk ... END statement once flush_size increments
+    are pending or flush_interval seconds passed since the last flush, checked when an increment is added
+    and when a request finishes (see flush_due). Concurrent increments of the same
+    row never wait for each other's row locks, and no increment is read back and rewritten.
+    updates may return values of other columns to set in the same statement. on_write is called with
+    the flushed pks in the transaction of the UPDATE, on_flush after it was committed.
+
+    Pending increments are flushed at interpreter exit. Increments which could not be written
+    stay in the buffer for the next flush, a failed flush started by add() or flush_due() is logged and
+    not raised: the caller has already committed the change it counts
+    """
+
+    def __init__(self, model, field, flush_size=100, flush_interval=5.0, updates=None, on_write=None, on_flush=None,
+                 using='default'):
+        self.model = model
+        self.field = field
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.updates = updates
+        self.on_write = on_write
+        self.on_flush = on_flush
+        self.using = using
+        self.pending = dict()
+        self.pending_count = 0
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        BUFFERS.append(self)
+
+    def add(self, pk, delta=1):
+        with self.lock:
+            self.pending[pk] = self.pending.get(pk, 0) + delta
+            self.pending_count += 1
+        self.flush_if_due()
+
+    def is_due(self):
+        with self.lock:
+            return self.pending_count >= self.flush_size or \
+                (self.pending_count > 0 and time.monotonic() - self.last_flush >= self.flush_interval)
+
+    def flush_if_due(self):
+        if not self.is_due():
+            return
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.exception('Flush of %s.%s failed', self.model.__name__, self.field)
+
+    def get_pending(self, pk):
+        with self.lock:
+            return self.pending.get(pk, 0)
+
+    def _take(self):
+        with self.lock:
+            pending, self.pending, self.pending_count = self.pending, dict(), 0
+            self.last_flush = time.monotonic()
+        return {pk: delta for pk, delta in pending.items() if delta}
+
+    def _restore(self, pending):
+        with self.lock:
+            for pk, delta in pending.items():
+                self.pending[pk] = self.pending.get(pk, 0) + delta
+                self.pending_count += 1
+
+    def _update(self, pending):
+        updates = self.updates() if self.updates is not None else dict()
+        increment = Case(*[When(pk=pk, then=Value(delta)) for pk, delta in pending.items()],
+                         default=Value(0), output_field=IntegerField())
+        return self.model._default_manager.using(self.using).filter(pk__in=list(pending)) \
+            .update(**{self.field: F(self.field) + increment}, **updates)
+
+    def flush(self):
+        """
+        Write all pending increments with one statement, return number of updated rows
+        """
+        with self.flush_lock:
+            pending = self._take()
+            if not pending:
+                return 0
+            try:
+                if self.on_write is None:
+                    updated = self._update(pending)
+                else:
+                    with transaction.atomic(using=self.using):
+                        updated = self._update(pending)
+                        self.on_write(list(pending))
+            except DatabaseError:
+                self._restore(pending)
+                raise
+        if self.on_flush is not None:
+            self.on_flush(list(pending))
+        return updated
+
+
+def flush_due():
+    """
+    Flush buffers which have pending increments older than their flush_interval. Run when every request
+    finishes, so increments are written even when no further ones are added
+    """
+    for buffer in BUFFERS:
+        buffer.flush_if_due()
+
+
+def flush_all():
+    """
+    Flush every buffer, buffers which cannot be written keep their increments
+    """
+    for buffer in BUFFERS:
+        try:
+            buffer.flush()
+        except DatabaseError:
+            pass
+
+
+atexit.register(flush_all)
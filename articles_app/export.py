@@ -0,0 +1,103 @@
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, time
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from articles_app.models import Article, Author
+
+EXPORT_COLUMNS = ('id', 'title', 'content', 'author_id', 'publication_date', 'updated_at', 'rating')
+CSV_HEADER = ['id', 'title', 'content', 'author_first_name', 'author_last_name', 'author_nickname', 'tags',
+              'publication_date', 'updated_at', 'rating']
+
+
+def _authors(using, author_ids):
+    authors = Author.objects.using(using).filter(id__in=author_ids).values('id', 'first_name', 'last_name', 'nickname')
+    return {author.pop('id'): author for author in authors}
+
+
+def _tags(using, article_ids):
+    tags = defaultdict(list)
+    links = Article.tags.through.objects.using(using).filter(article_id__in=article_ids).order_by('tag__name')
+    for article_id, name in links.values_list('article_id', 'tag__name'):
+        tags[article_id].append(name)
+    return tags
+
+
+def export_articles(queryset, chunk_size=1000):
+    """
+    Yield dictionaries with all articles of queryset in id order. Rows are read with a chunked iterator
+    (server-side cursor on PostgreSQL), authors and tags are resolved with one query per chunk,
+    so memory use does not depend on the number of exported articles
+    """
+    rows = queryset.order_by('id').values_list(*EXPORT_COLUMNS).iterator(chunk_size=chunk_size)
+    empty_author = {'first_name': None, 'last_name': None, 'nickname': None}
+    while True:
+        chunk = [dict(zip(EXPORT_COLUMNS, row)) for row in islice(rows, chunk_size)]
+        if not chunk:
+            return
+
+        authors = _authors(queryset.db, set(row['author_id'] for row in chunk))
+        tags = _tags(queryset.db, [row['id'] for row in chunk])
+        for row in chunk:
+            row['author'] = authors.get(row.pop('author_id'), empty_author)
+            row['tags'] = tags[row['id']]
+            yield row
+
+
+def ndjson_lines(articles):
+    for article in articles:
+        yield json.dumps(article, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Line(object):
+    def write(self, value):
+        return value
+
+
+def csv_lines(articles):
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_HEADER)
+    for article in articles:
+        author = article['author']
+        yield writer.writerow([article['id'], article['title'], article['content'], author['first_name'],
+                               author['last_name'], author['nickname'], ','.join(article['tags']),
+                               article['publication_date'].isoformat(), article['updated_at'].isoformat(),
+                               article['rating']])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
+
+
+def filter_export(queryset, since=None, after=None):
+    """
+    Restrict export to articles modified at or after since and, to resume interrupted export,
+    to articles with id greater than after, the id of last received article
+    """
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    return queryset
+
+
+def parse_since(value):
+    """
+    Parse ISO 8601 date or datetime, naive values are in current time zone
+    """
+    since = parse_datetime(value)
+    if since is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError("'{}' is not a valid date or datetime".format(value))
+        since = datetime.combine(day, time.min)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
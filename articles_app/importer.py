@@ -0,0 +1,154 @@
+import json
+import uuid
+from itertools import islice
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Max
+
+from articles_app import trending
+from articles_app.cache import invalidate_articles
+from articles_app.models import Article, Author, Change, Comment, Tag, make_excerpt
+from articles_app.serializers import ArticleImportSerializer
+
+
+class ArticleImporter(object):
+    """
+    Import articles with their tags and comments from NDJSON lines, one article per line.
+    Lines are processed in chunks: every chunk is validated, its authors and tags are resolved with
+    one query each and articles, tag links and comments are inserted with bulk_create in a single
+    transaction. Only the current chunk is held in memory.
+
+    Authors are given by username, records without author are assigned to default_author.
+    When restrict_author is set records may not name any other author.
+    """
+    chunk_size = 500
+
+    def __init__(self, default_author=None, restrict_author=False, chunk_size=None, using='default'):
+        self.default_author = default_author
+        self.restrict_author = restrict_author
+        self.chunk_size = chunk_size or self.chunk_size
+        self.using = using
+        self.imported = 0
+        self.failed = 0
+
+    def import_lines(self, lines):
+        """
+        Import all lines, yield error report {'line': number, 'errors': ...} for every rejected line
+        """
+        numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                return
+            for error in self.import_chunk(chunk):
+                self.failed += 1
+                yield error
+
+    def import_chunk(self, chunk):
+        rows, errors = list(), list()
+        for number, line in chunk:
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                errors.append({'line': number, 'errors': {'non_field_errors': ['Invalid JSON: {}'.format(e)]}})
+                continue
+            serializer = ArticleImportSerializer(data=data)
+            if serializer.is_valid():
+                rows.append((number, serializer.validated_data))
+            else:
+                errors.append({'line': number, 'errors': serializer.errors})
+
+        rows, author_errors = self.resolve_authors(rows)
+        errors.extend(author_errors)
+        if rows:
+            try:
+                self.insert(rows)
+                self.imported += len(rows)
+            except DatabaseError as e:
+                errors.extend({'line': number, 'errors': {'non_field_errors': [str(e)]}} for number, _ in rows)
+        return sorted(errors, key=lambda error: error['line'])
+
+    def resolve_authors(self, rows):
+        usernames = set()
+        for _, data in rows:
+            usernames.add(data.get('author'))
+            usernames.update(comment.get('author') for comment in data['comments'])
+        usernames.discard(None)
+
+        authors = {author.user.username: author.id for author in
+                   Author.objects.using(self.using).filter(user__username__in=usernames).select_related('user')}
+        if self.default_author is not None:
+            authors[None] = self.default_author.id
+
+        resolved, errors = list(), list()
+        for number, data in rows:
+            row_errors = dict()
+            if data.get('author') not in authors:
+                row_errors['author'] = ['Unknown author.']
+            elif self.restrict_author and authors[data.get('author')] != self.default_author.id:
+                row_errors['author'] = ['Articles can only be imported as the requesting author.']
+            for comment in data['comments']:
+                if comment.get('author') not in authors:
+                    row_errors['comments'] = ['Unknown comment author.']
+            if row_errors:
+                errors.append({'line': number, 'errors': row_errors})
+                continue
+            data['author_id'] = authors[data.get('author')]
+            for comment in data['comments']:
+                comment['author_id'] = authors[comment.get('author')]
+            resolved.append((number, data))
+        return resolved, errors
+
+    def insert(self, rows):
+        tag_names = set(name for _, data in rows for name in data['tags'])
+        with transaction.atomic(using=self.using):
+            tags = {tag.name: tag.id for tag in Tag.objects.db_manager(self.using).get_or_create_many(tag_names)}
+
+            articles = [Article(title=data['title'], content=data['content'], excerpt=make_excerpt(data['content']),
+                                author_id=data['author_id'], publication_date=data['publication_date'],
+                                rating=data['rating'])
+                        for _, data in rows]
+            self.bulk_create_articles(articles)
+
+            ArticleTags = Article.tags.through
+            ArticleTags.objects.using(self.using).bulk_create(
+                [ArticleTags(article_id=article.id, tag_id=tags[name])
+                 for article, (_, data) in zip(articles, rows) for name in set(data['tags'])])
+
+            Comment.objects.using(self.using).bulk_create(
+                [Comment(article_id=article.id, author_id=comment['author_id'], content=comment['content'],
+                         publication_date=comment['publication_date'])
+                 for article, (_, data) in zip(articles, rows) for comment in data['comments']])
+            article_ids = [article.id for article in articles]
+            Comment.objects.using(self.using).filter(article_id__in=article_ids).fill_paths()
+            trending.rebuild(article_ids, self.using)
+
+            changes = Change.objects.using(self.using)
+            changes.record(Change.ARTICLE, article_ids, Change.CREATE)
+            changes.record(Change.COMMENT, Comment.objects.using(self.using).filter(article_id__in=article_ids)
+                           .values_list('id', flat=True), Change.CREATE)
+
+        # bulk_create does not send save signals
+        invalidate_articles()
+
+    def bulk_create_articles(self, articles):
+        manager = Article.objects.db_manager(self.using)
+        connection = connections[self.using]
+        if connection.features.can_return_ids_from_bulk_insert:
+            manager.bulk_create(articles)
+            return
+        if connection.vendor == 'sqlite':
+            # SQLite serializes writers, so rows inserted inside the transaction get consecutive ids
+            manager.bulk_create(articles)
+            last_id = manager.aggregate(last_id=Max('id'))['last_id']
+            for article_id, article in enumerate(articles, last_id - len(articles) + 1):
+                article.id = article_id
+            return
+        # Ids of concurrent inserts interleave elsewhere (MySQL), rows are found by their import keys
+        for article in articles:
+            article.import_key = uuid.uuid4()
+        manager.bulk_create(articles)
+        ids = dict(manager.filter(import_key__in=[article.import_key for article in articles])
+                   .values_list('import_key', 'id'))
+        for article in articles:
+            article.id = ids[article.import_key]
@@ -0,0 +1,161 @@
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack
+from itertools import count
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+class RequestMetrics(object):
+    """
+    Queries run while handling a request and time spent in SQL, view code and rendering.
+    Only the slowest statements are kept
+    """
+
+    def __init__(self, keep_statements=5):
+        self.keep_statements = keep_statements
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.timings = dict()
+        self.slowest = list()
+        self.sequence = count()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += duration
+            statement = (duration, next(self.sequence), context['connection'].alias, sql, params, many)
+            if len(self.slowest) < self.keep_statements:
+                heapq.heappush(self.slowest, statement)
+            else:
+                heapq.heappushpop(self.slowest, statement)
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def slowest_statements(self):
+        return [{'alias': alias, 'sql': sql, 'params': params, 'many': many, 'duration': duration}
+                for duration, _, alias, sql, params, many in sorted(self.slowest, reverse=True)]
+
+    def server_timing(self, total):
+        metrics = ['sql;dur={:.2f};desc="{} queries"'.format(self.sql_time * 1000, self.queries)]
+        metrics.extend('{};dur={:.2f}'.format(name, duration * 1000) for name, duration in self.timings.items())
+        metrics.append('total;dur={:.2f}'.format(total * 1000))
+        return ', '.join(metrics)
+
+
+def get_metrics(request):
+    return getattr(request, 'metrics', None)
+
+
+def explain(statement):
+    """
+    Return query plan of SELECT statement as list of rows, or None when it cannot be explained
+    """
+    connection = connections[statement['alias']]
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if prefix is None or statement['many'] or not statement['sql'].lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + statement['sql'], statement['params'])
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+
+
+class InstrumentationMiddleware(object):
+    """
+    Count queries and measure SQL, view and render time of every request. Results are sent in
+    Server-Timing header and logged as JSON. Requests slower than ARTICLES_SLOW_REQUEST_MS
+    are logged as warnings together with their slowest statements and query plans.
+
+    Enabled by ARTICLES_INSTRUMENTATION setting, when it is off the middleware removes itself
+    from the handler chain
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ARTICLES_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_request = getattr(settings, 'ARTICLES_SLOW_REQUEST_MS', 500) / 1000
+        self.keep_statements = getattr(settings, 'ARTICLES_SLOW_STATEMENTS', 5)
+
+    def __call__(self, request):
+        metrics = request.metrics = RequestMetrics(self.keep_statements)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+
+        total = metrics.total_time
+        response['Server-Timing'] = metrics.server_timing(total)
+        record = {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+        }
+        record.update(('{}_ms'.format(name), round(duration * 1000, 2)) for name, duration in metrics.timings.items())
+
+        if total < self.slow_request:
+            logger.info(json.dumps(record))
+            return response
+
+        statements = metrics.slowest_statements()
+        for statement in statements:
+            statement['plan'] = explain(statement)
+            statement['duration_ms'] = round(statement.pop('duration') * 1000, 2)
+            statement['params'] = [str(param) for param in statement['params'] or ()]
+            del statement['many']
+        record['slow'] = True
+        record['statements'] = statements
+        logger.warning(json.dumps(record))
+        return response
+
+
+class InstrumentedViewMixin(object):
+    """
+    Split time of DRF view into serialize, time spent in the view handler outside of SQL
+    (for read endpoints that is serialization of the loaded rows), and render
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        metrics = get_metrics(request)
+        if metrics is not None:
+            self._handler_started = (time.perf_counter(), metrics.sql_time)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        metrics = get_metrics(request)
+        if metrics is None or not hasattr(self, '_handler_started'):
+            return response
+
+        started, sql_time = self._handler_started
+        metrics.timings['serialize'] = max(time.perf_counter() - started - (metrics.sql_time - sql_time), 0.0)
+        if hasattr(response, 'render') and not response.is_rendered:
+            started = time.perf_counter()
+            response.render()
+            metrics.timings['render'] = time.perf_counter() - started
+        return response
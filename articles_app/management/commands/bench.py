@@ -0,0 +1,106 @@
+import io
+import json
+import random
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from articles_app.benchmark import BENCH_TAG_PREFIX, benchmark_host, compare, delete_dataset, run_scenario, \
+    seed_dataset
+from articles_app.cache import invalidate_articles
+from articles_app.counters import flush_all
+
+SCENARIOS = ('list', 'tagged_list', 'detail', 'comment_post', 'article_post')
+
+
+class Command(BaseCommand):
+    help = 'Seed benchmark dataset, drive article endpoints through the test client and report throughput, ' \
+           'latency percentiles and queries per request as JSON. Requests commit as they would in production, ' \
+           'benchmark data is deleted afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--authors', type=int, default=20)
+        parser.add_argument('--tags-per-article', type=int, default=3)
+        parser.add_argument('--comments-per-article', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per scenario')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help='Comma separated scenarios out of: {}'.format(', '.join(SCENARIOS)))
+        parser.add_argument('--seed', type=int, default=0, help='Seed of dataset and request parameters')
+        parser.add_argument('--output', help='Write report to this file')
+        parser.add_argument('--baseline', help='Compare with report stored in this file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed regression against baseline as a fraction, 0.2 is 20%%')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenarios'].split(',')
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+        baseline = None
+        if options['baseline']:
+            with io.open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = json.load(baseline_file)
+
+        rng = random.Random(options['seed'])
+        users, article_ids = seed_dataset(options['articles'], options['authors'], options['tags_per_article'],
+                                          options['comments_per_article'], rng=rng)
+        try:
+            report = self.run(scenarios, options, rng, users, article_ids)
+        finally:
+            flush_all()
+            delete_dataset(users)
+            invalidate_articles(article_ids)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+        self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare(report, baseline, options['tolerance'])
+            for name, metric, previous, current in regressions:
+                self.stderr.write('{} {}: {} -> {}'.format(name, metric, previous, current))
+            if regressions:
+                raise CommandError('{} metrics regressed against baseline'.format(len(regressions)))
+
+    def run(self, scenarios, options, rng, users, article_ids):
+        tags = max(options['tags_per_article'] * 10, 1)
+        pages = max(len(article_ids) // 10, 1)
+        token = Token.objects.create(user=users[0])
+        headers = {'HTTP_AUTHORIZATION': 'Token ' + token.key}
+
+        def tag(number):
+            return BENCH_TAG_PREFIX + str(number)
+
+        requests = {
+            'list': lambda client, i: client.get('/articles/?page_size=10&page={}'.format(rng.randrange(pages) + 1)),
+            'tagged_list': lambda client, i: client.get('/articles/?tags={}'.format(tag(rng.randrange(tags)))),
+            'detail': lambda client, i: client.get('/articles/{}'.format(rng.choice(article_ids))),
+            'comment_post': lambda client, i: client.post(
+                '/articles/{}/comment'.format(rng.choice(article_ids)), {'content': 'Benchmark comment'},
+                **headers),
+            'article_post': lambda client, i: client.post(
+                '/articles/', json.dumps({'title': 'Posted {}'.format(i), 'content': 'Benchmark', 'tags': [tag(0)]}),
+                content_type='application/json', **headers),
+        }
+
+        client = Client(HTTP_HOST=benchmark_host())
+        results = OrderedDict()
+        for name in scenarios:
+            # Every scenario starts with cold cached payloads and its buffered counters are written before
+            # the next one starts
+            invalidate_articles(article_ids)
+            results[name] = run_scenario(client, requests[name], options['requests'], options['warmup'])
+            flush_all()
+
+        return OrderedDict([
+            ('dataset', OrderedDict((key, options[key]) for key in
+                                    ('articles', 'authors', 'tags_per_article', 'comments_per_article', 'seed'))),
+            ('requests', options['requests']),
+            ('scenarios', results),
+        ])
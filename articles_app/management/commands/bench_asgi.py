@@ -0,0 +1,114 @@
+import asyncio
+import io
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+
+from articles_app.asgi import ASGIHandler, build_environ
+from articles_app.benchmark import benchmark_host, delete_dataset, percentile, seed_dataset
+
+
+def summarize(latencies, statuses, elapsed):
+    return OrderedDict([
+        ('elapsed_s', round(elapsed, 3)),
+        ('throughput_rps', round(len(latencies) / elapsed, 2)),
+        ('p50_ms', round(percentile(latencies, 50) * 1000, 1)),
+        ('p95_ms', round(percentile(latencies, 95) * 1000, 1)),
+        ('p99_ms', round(percentile(latencies, 99) * 1000, 1)),
+        ('errors', sum(1 for status in statuses if status >= 400)),
+    ])
+
+
+class Command(BaseCommand):
+    help = 'Serve the same burst of concurrent slow clients with the ASGI application and with a WSGI ' \
+           'deployment of the same number of worker threads, report latency and throughput of both as JSON. ' \
+           'Every client spends --client-delay seconds sending its request and receiving the response'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=100, help='Concurrent connections')
+        parser.add_argument('--workers', type=int, default=4, help='WSGI workers and ASGI worker threads')
+        parser.add_argument('--client-delay', type=float, default=0.2)
+        parser.add_argument('--path', default='/articles/')
+        parser.add_argument('--articles', type=int, default=50,
+                            help='Articles to seed and delete afterwards, 0 uses existing data')
+
+    def handle(self, *args, **options):
+        users = None
+        if options['articles']:
+            users, _ = seed_dataset(options['articles'], 5, 3, 5)
+        try:
+            path, _, query = options['path'].partition('?')
+            scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode('latin-1'),
+                     'headers': [(b'host', benchmark_host().encode('latin-1'))]}
+            report = OrderedDict([
+                ('connections', options['connections']),
+                ('workers', options['workers']),
+                ('client_delay_s', options['client_delay']),
+                ('wsgi', self.run_wsgi(scope, options['connections'], options['workers'], options['client_delay'])),
+                ('asgi', self.run_asgi(scope, options['connections'], options['workers'], options['client_delay'])),
+            ])
+        finally:
+            if users is not None:
+                delete_dataset(users)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_wsgi(self, scope, connections, workers, delay):
+        """
+        Every connection occupies a worker while the client sends its request and reads the response
+        """
+        handler = WSGIHandler()
+
+        def serve(started):
+            statuses = list()
+            time.sleep(delay / 2)
+            response = handler(build_environ(scope, io.BytesIO()),
+                               lambda status, headers, exc_info=None: statuses.append(int(status.split()[0])))
+            b''.join(response)
+            response.close()
+            time.sleep(delay / 2)
+            return time.perf_counter() - started, statuses[0]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(serve, [started] * connections))
+        return summarize([latency for latency, _ in results], [status for _, status in results],
+                         time.perf_counter() - started)
+
+    def run_asgi(self, scope, connections, workers, delay):
+        """
+        Connections wait for their clients on the event loop, worker threads only run Django
+        """
+        application = ASGIHandler(max_workers=workers)
+
+        async def serve(started):
+            statuses = list()
+
+            async def receive():
+                await asyncio.sleep(delay / 2)
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif not message.get('more_body', False):
+                    await asyncio.sleep(delay / 2)
+
+            await application(dict(scope), receive, send)
+            return time.perf_counter() - started, statuses[0]
+
+        async def serve_all(started):
+            return await asyncio.gather(*[serve(started) for _ in range(connections)])
+
+        loop = asyncio.new_event_loop()
+        try:
+            started = time.perf_counter()
+            results = loop.run_until_complete(serve_all(started))
+            elapsed = time.perf_counter() - started
+        finally:
+            loop.close()
+            application.executor.shutdown()
+        return summarize([latency for latency, _ in results], [status for _, status in results], elapsed)
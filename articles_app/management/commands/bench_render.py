@@ -0,0 +1,69 @@
+import json
+import time
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from articles_app.benchmark import benchmark_host, seed_dataset
+from articles_app.compression import compress, get_codings
+from articles_app.renderers import FastJSONRenderer, orjson
+
+PAGES = OrderedDict([
+    ('list_summary', '/articles/?page_size=10&view=summary'),
+    ('list_full', '/articles/?page_size=10'),
+    ('detail', '/articles/{article_id}'),
+])
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Report render time of typical article pages with the DRF and the fast JSON renderer and their ' \
+           'size on the wire uncompressed and with every supported content coding as JSON. ' \
+           'Benchmark data is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=50)
+        parser.add_argument('--comments-per-article', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = self.run(options)
+            transaction.set_rollback(True)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, options):
+        _, article_ids = seed_dataset(options['articles'], 5, 3, options['comments_per_article'])
+        client = Client(HTTP_HOST=benchmark_host())
+        renderers = [('drf', JSONRenderer()), ('fast_stdlib', FastJSONRenderer())]
+        if orjson is not None:
+            renderers.append(('fast_orjson', FastJSONRenderer()))
+
+        report = OrderedDict([('orjson', orjson is not None), ('pages', OrderedDict())])
+        for name, path in PAGES.items():
+            data = client.get(path.format(article_id=article_ids[0])).data
+            page = report['pages'][name] = OrderedDict()
+            for renderer_name, renderer in renderers:
+                with override_settings(ARTICLES_JSON_BACKEND='orjson' if renderer_name == 'fast_orjson' else 'json'):
+                    seconds = best_time(lambda: renderer.render(data), options['repeat'])
+                page['{}_render_ms'.format(renderer_name)] = round(seconds * 1000, 3)
+
+            content = JSONRenderer().render(data)
+            page['identity_bytes'] = len(content)
+            for coding, compressor in get_codings().items():
+                seconds = best_time(lambda: compress(content, compressor()), options['repeat'])
+                page['{}_bytes'.format(coding)] = len(compress(content, compressor()))
+                page['{}_ms'.format(coding)] = round(seconds * 1000, 3)
+        return report
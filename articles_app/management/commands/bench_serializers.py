@@ -0,0 +1,71 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.request import Request
+
+from articles_app.models import Article, Author, Comment, CustomUser, Tag
+from articles_app.planner import plan_queryset
+from articles_app.serializers import ArticlesGetSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare objects per second of compiled and field by field serialization of articles. ' \
+           'Benchmark data is created in a transaction which is rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=200)
+        parser.add_argument('--tags', type=int, default=3, help='Tags per article')
+        parser.add_argument('--comments', type=int, default=5, help='Comments per article')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--summary', action='store_true', help='Serialize summary view fields')
+        parser.add_argument('--host', help='Host of built URLs, first of ALLOWED_HOSTS by default')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['articles'], options['tags'], options['comments'])
+            fields = ArticlesGetSerializer.summary_fields if options['summary'] else None
+            articles = list(plan_queryset(Article.objects.order_by('-id')[:options['articles']],
+                                          ArticlesGetSerializer, fields))
+            host = options['host'] or next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '')
+                                            and not host.startswith('.')), 'localhost')
+            request = Request(RequestFactory().get('/articles/', HTTP_HOST=host))
+            serializer = ArticlesGetSerializer(fields=fields, context={'request': request})
+
+            paths = [
+                ('fields', lambda article: serializers.Serializer.to_representation(serializer, article)),
+                ('compiled', serializer.to_representation),
+            ]
+            rates = dict()
+            for name, represent in paths:
+                rates[name] = self.measure(represent, articles, options['repeat'])
+                self.stdout.write('{:<10} {:>12,.0f} objects/s'.format(name, rates[name]))
+            self.stdout.write('speedup    {:>12.2f}x'.format(rates['compiled'] / rates['fields']))
+            transaction.set_rollback(True)
+
+    def seed(self, count, tags_per_article, comments_per_article):
+        user = CustomUser.objects.create_user(username='bench_serializers_{}'.format(time.time()))
+        author = Author.objects.get(user=user)
+        tags = Tag.objects.get_or_create_many('bench{}'.format(i) for i in range(tags_per_article))
+        now = timezone.now()
+        for i in range(count):
+            article = Article.objects.create(title='Benchmark {}'.format(i), content='Benchmark content ' * 50,
+                                             author=author, publication_date=now.date())
+            article.tags.add(*tags)
+            Comment.objects.bulk_create([Comment(article=article, author=author, content='Comment {}'.format(j),
+                                                 publication_date=now) for j in range(comments_per_article)])
+        Comment.objects.fill_paths()
+
+    def measure(self, represent, articles, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for article in articles:
+                represent(article)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return len(articles) / best
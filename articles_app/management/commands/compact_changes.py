@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from articles_app import changes
+
+
+class Command(BaseCommand):
+    help = 'Compact the change log: delete entries superseded by a later entry of the same object and entries ' \
+           'older than --days days. Clients which synchronized to a pruned entry have to start over'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=changes.RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=changes.COMPACTION_BATCH_SIZE)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        collapsed = changes.collapse(options['batch_size'], options['database'])
+        expired = changes.expire(timezone.now() - timedelta(days=options['days']), options['batch_size'],
+                                 options['database'])
+        self.stdout.write('Deleted {} superseded and {} expired changes'.format(collapsed, expired))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from articles_app import trending
+
+
+class Command(BaseCommand):
+    help = 'Apply decay to trending scores and drop articles which fell out of the feed. Run it periodically, ' \
+           'stored scores grow with time until they are decayed. --rebuild recomputes all scores from ' \
+           'articles, comments and votes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            stored = trending.rebuild(using=options['database'])
+            self.stdout.write('Rebuilt {} trending scores'.format(stored))
+        else:
+            rebased, pruned = trending.rebase(using=options['database'])
+            self.stdout.write('Decayed {} trending scores, dropped {}'.format(rebased, pruned))
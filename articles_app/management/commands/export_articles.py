@@ -0,0 +1,42 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from articles_app.export import EXPORT_FORMATS, export_articles, filter_export, parse_since
+from articles_app.models import Article
+
+
+class Command(BaseCommand):
+    help = 'Export articles as NDJSON or CSV in id order without loading the whole table into memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='Write export to this file instead of stdout')
+        parser.add_argument('--since', help='Export only articles modified at or after this date or datetime')
+        parser.add_argument('--after', type=int, help='Resume export after article with this id')
+        parser.add_argument('--tags', help='Comma separated tags, export articles with any of them')
+        parser.add_argument('--tags-all', help='Comma separated tags, export articles with all of them')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        queryset = Article.objects.using(options['database'])
+        if options['tags']:
+            queryset = queryset.tagged_with_any(options['tags'].split(','))
+        if options['tags_all']:
+            queryset = queryset.tagged_with_all(options['tags_all'].split(','))
+        queryset = filter_export(queryset, since, options['after'])
+
+        lines, _ = EXPORT_FORMATS[options['format']]
+        if not options['output']:
+            for line in lines(export_articles(queryset, options['chunk_size'])):
+                self.stdout.write(line, ending='')
+            return
+        with io.open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for line in lines(export_articles(queryset, options['chunk_size'])):
+                output.write(line)
@@ -0,0 +1,44 @@
+import io
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from articles_app.importer import ArticleImporter
+from articles_app.models import Author
+
+
+class Command(BaseCommand):
+    help = 'Import articles from NDJSON file, one article per line. Rejected lines are reported as NDJSON ' \
+           'on stderr or in the --errors file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON file to import, - reads standard input')
+        parser.add_argument('--author', help='Username of the author of records which do not name one')
+        parser.add_argument('--chunk-size', type=int, default=ArticleImporter.chunk_size)
+        parser.add_argument('--errors', help='Write error report to this file instead of stderr')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['author']:
+            try:
+                default_author = Author.objects.using(options['database']).select_related('user') \
+                    .get(user__username=options['author'])
+            except Author.DoesNotExist:
+                raise CommandError("Author '{}' does not exist".format(options['author']))
+
+        importer = ArticleImporter(default_author=default_author, chunk_size=options['chunk_size'],
+                                   using=options['database'])
+        source = sys.stdin if options['path'] == '-' else io.open(options['path'], encoding='utf-8')
+        report = io.open(options['errors'], 'w', encoding='utf-8') if options['errors'] else self.stderr
+        try:
+            for error in importer.import_lines(source):
+                report.write(json.dumps(error) + '\n')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if options['errors']:
+                report.close()
+
+        self.stdout.write('Imported {} articles, rejected {}'.format(importer.imported, importer.failed))
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """
+    Keep the oldest tag of every name, move article links of its duplicates to it and delete the duplicates
+    """
+    Tag = apps.get_model('articles_app', 'Tag')
+    ArticleTags = apps.get_model('articles_app', 'Article').tags.through
+    db = schema_editor.connection.alias
+
+    duplicates = Tag.objects.using(db).values('name').annotate(keep=Min('id'), tags=Count('id')).filter(tags__gt=1)
+    for duplicate in duplicates:
+        merged = list(Tag.objects.using(db).filter(name=duplicate['name']).exclude(id=duplicate['keep'])
+                      .values_list('id', flat=True))
+        linked = set(ArticleTags.objects.using(db).filter(tag_id=duplicate['keep'])
+                     .values_list('article_id', flat=True))
+        relinked = set(ArticleTags.objects.using(db).filter(tag_id__in=merged)
+                       .values_list('article_id', flat=True)) - linked
+
+        ArticleTags.objects.using(db).bulk_create([ArticleTags(article_id=article_id, tag_id=duplicate['keep'])
+                                                   for article_id in relinked])
+        ArticleTags.objects.using(db).filter(tag_id__in=merged).delete()
+        Tag.objects.using(db).filter(id__in=merged).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    "ALTER TABLE articles_app_article ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION articles_app_article_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('pg_catalog.english', coalesce(NEW.content, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER articles_app_article_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON articles_app_article
+    FOR EACH ROW EXECUTE PROCEDURE articles_app_article_search_vector_update()
+    """,
+    """
+    UPDATE articles_app_article SET search_vector =
+        setweight(to_tsvector('pg_catalog.english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(content, '')), 'B')
+    """,
+    "CREATE INDEX articles_app_article_search_vector_idx ON articles_app_article USING GIN (search_vector)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER articles_app_article_search_vector_trigger ON articles_app_article",
+    "DROP FUNCTION articles_app_article_search_vector_update()",
+    "ALTER TABLE articles_app_article DROP COLUMN search_vector",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    Full-text index of article title and content on PostgreSQL: weighted tsvector column maintained
+    by trigger with GIN index. It is not exposed as a model field, so article queries never load it.
+    SQLite FTS5 index is installed after every migrate by articles_app.search.install_sqlite_index
+    """
+
+    dependencies = [
+        ('articles_app', '0004_article_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRESQL_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRESQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+EXCERPT_LENGTH = 280
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    # Copy of articles_app.models.make_excerpt as it was when this migration was written
+    text = ' '.join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip(',.;:-') + '\u2026'
+
+
+def fill_excerpts(apps, schema_editor):
+    Article = apps.get_model('articles_app', 'Article')
+    db = schema_editor.connection.alias
+    articles = Article.objects.using(db).only('id', 'content').order_by('id')
+    for article in articles.iterator(chunk_size=1000):
+        Article.objects.using(db).filter(pk=article.pk).update(excerpt=make_excerpt(article.content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0005_article_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', max_length=280),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
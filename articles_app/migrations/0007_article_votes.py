@@ -0,0 +1,39 @@
+# Generated by Django 2.1.5 on 2026-10-18 17:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0006_article_excerpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vote',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField(choices=[(1, 'up'), (-1, 'down')])),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-rating', '-id'], name='article_rating_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='article',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='articles_app.Article'),
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='articles_app.Author'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vote',
+            unique_together={('article', 'author')},
+        ),
+    ]
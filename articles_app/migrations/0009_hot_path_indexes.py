@@ -0,0 +1,30 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Indexes of list ordering and of comments of an article in date order. Tag filters look up
+    articles of a tag, the automatic through table has unique (article_id, tag_id) only, so the reverse
+    pair is added with plain SQL. Tag.name is indexed by its unique constraint
+    """
+
+    dependencies = [
+        ('articles_app', '0008_article_views'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['-publication_date', '-id'], name='article_pubdate_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'publication_date', 'id'], name='comment_article_date_idx'),
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX article_tags_tag_article_idx ON articles_app_article_tags (tag_id, article_id)'],
+            ['DROP INDEX article_tags_tag_article_idx'],
+        ),
+    ]
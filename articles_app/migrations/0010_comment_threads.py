@@ -0,0 +1,56 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+PATH_SEGMENT_LENGTH = 10
+
+
+class PathSegment(models.Func):
+    # Copy of articles_app.models.PathSegment as it was when this migration was written
+    template = "LPAD(CAST(%(expressions)s AS VARCHAR), {}, '0')".format(PATH_SEGMENT_LENGTH)
+    output_field = models.CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="SUBSTR('{}' || %(expressions)s, -{})".format(
+            '0' * PATH_SEGMENT_LENGTH, PATH_SEGMENT_LENGTH), **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="LPAD(CAST(%(expressions)s AS CHAR), {}, '0')".format(
+            PATH_SEGMENT_LENGTH), **extra_context)
+
+
+def fill_paths(apps, schema_editor):
+    # Existing comments become roots of their own threads
+    Comment = apps.get_model('articles_app', 'Comment')
+    Comment.objects.using(schema_editor.connection.alias).filter(path='').update(path=PathSegment('id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='articles_app.Comment'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=250),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['article', 'path'], name='comment_article_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
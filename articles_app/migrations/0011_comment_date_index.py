@@ -0,0 +1,17 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0010_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['-publication_date', '-id'], name='comment_pubdate_id_idx'),
+        ),
+    ]
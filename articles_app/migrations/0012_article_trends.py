@@ -0,0 +1,32 @@
+# Generated by Django 2.1.5 on 2026-10-18 18:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0011_comment_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleTrend',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='articles_app.Article')),
+                ('score', models.FloatField()),
+                ('epoch', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='articletrend',
+            index=models.Index(fields=['-score', '-article'], name='trend_score_article_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.1.5 on 2026-10-18 19:03
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def store_epoch(apps, schema_editor):
+    # Scores stored so far are relative to the epoch of the last rebase
+    db = schema_editor.connection.alias
+    epoch = apps.get_model('articles_app', 'ArticleTrend').objects.using(db).aggregate(epoch=Max('epoch'))['epoch']
+    apps.get_model('articles_app', 'TrendingEpoch').objects.using(db).create(pk=1, epoch=epoch or timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0013_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(store_epoch, migrations.RunPython.noop),
+    ]
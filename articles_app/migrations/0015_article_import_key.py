@@ -0,0 +1,18 @@
+# Generated by Django 2.1.5 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('articles_app', '0014_trending_epoch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='import_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.utils import timezone
+from django.db.models.functions import RowNumber
 from django.contrib.auth.models import AbstractUser
 
 # Create your models here.
@@ -24,6 +26,9 @@ class Author(models.Model):
 
 
 def get_author_data_related_to_user(user: CustomUser):
+    if isinstance(user, CustomUser):
+        # Reverse accessor reuses the author when it was loaded together with the user
+        return user.author
     return Author.objects.get(user_id=user.id)
 
 
@@ -32,12 +37,80 @@ class TagManager(models.Manager):
         tag = self.get_or_create(name=name)
         return tag
 
+    def get_or_create_many(self, names):
+        """
+        Return tags for all names, creating missing ones with a single bulk insert.
+        Only one SELECT is run when all tags already exist
+        """
+        names = set(names)
+        if not names:
+            return list()
+
+        tags = list(self.filter(name__in=names))
+        missing = names.difference(tag.name for tag in tags)
+        if not missing:
+            return tags
+
+        try:
+            with transaction.atomic(using=self.db):
+                created = self.bulk_create([self.model(name=name) for name in missing])
+        except IntegrityError:
+            # Some of the tags were created concurrently
+            return list(self.filter(name__in=names))
+
+        if connections[self.db].features.can_return_ids_from_bulk_insert:
+            tags = tags + created
+        else:
+            tags = list(self.filter(name__in=names))
+        # Bulk inserts send no save signals
+        Change.objects.db_manager(self.db).record(Change.TAG, [tag.id for tag in tags if tag.name in missing],
+                                                  Change.CREATE)
+        return tags
+
 
 class Tag(models.Model):
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, unique=True)
     objects = TagManager()
 
 
+class ArticleQuerySet(models.QuerySet):
+    # Tags are checked per article through the (article, tag) index of the through table, so articles are
+    # read from the index of the page ordering and reading stops once the page is full, no matter how many
+    # articles have the tags
+    def _article_tags(self, names):
+        return Article.tags.through.objects.filter(article_id=models.OuterRef('pk'), tag__name__in=set(names))
+
+    def tagged_with_any(self, names):
+        return self.annotate(has_tags=models.Exists(self._article_tags(names))).filter(has_tags=True)
+
+    def tagged_with_all(self, names):
+        checks = {'has_tag_{}'.format(i): models.Exists(self._article_tags([name]))
+                  for i, name in enumerate(sorted(set(names)))}
+        return self.annotate(**checks).filter(**{check: True for check in checks})
+
+    def touch(self):
+        """
+        Mark articles as modified without running save signals
+        """
+        return self.update(updated_at=timezone.now())
+
+
+EXCERPT_LENGTH = 280
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """
+    Collapse whitespace of content and cut it at the last word boundary before length characters
+    """
+    text = ' '.join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip(',.;:-') + '\u2026'
+
+
 class Article(models.Model):
     title = models.CharField(max_length=255)
     content = models.TextField()
@@ -45,6 +118,110 @@ class Article(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, default='')
     publication_date = models.DateField()
     rating = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, default='')
+    views = models.PositiveIntegerField(default=0)
+    # Set by the importer on backends which do not return ids of bulk inserted rows
+    import_key = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    objects = ArticleQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-publication_date', '-id'], name='article_pubdate_id_idx'),
+            models.Index(fields=['-rating', '-id'], name='article_rating_id_idx'),
+            models.Index(fields=['-views', '-id'], name='article_views_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if 'content' in self.__dict__:
+            self.excerpt = make_excerpt(self.content)
+        super().save(*args, **kwargs)
+
+
+# Comment path is the chain of zero padded ids from the root of its thread down to the comment itself,
+# so ordering by path lists threads depth first and a subtree is one range of paths
+PATH_SEGMENT_LENGTH = 10
+MAX_COMMENT_DEPTH = 25
+
+
+def path_segment(pk):
+    return str(pk).zfill(PATH_SEGMENT_LENGTH)
+
+
+def subtree_range(path):
+    """
+    Return (lowest, highest exclusive) paths of the subtree rooted at path
+    """
+    return path, str(int(path) + 1).zfill(len(path))
+
+
+class PathSegment(models.Func):
+    """
+    Path segment of id computed by the database, for comments inserted in bulk
+    """
+    template = "LPAD(CAST(%(expressions)s AS VARCHAR), {}, '0')".format(PATH_SEGMENT_LENGTH)
+    output_field = models.CharField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="SUBSTR('{}' || %(expressions)s, -{})".format(
+            '0' * PATH_SEGMENT_LENGTH, PATH_SEGMENT_LENGTH), **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="LPAD(CAST(%(expressions)s AS CHAR), {}, '0')".format(
+            PATH_SEGMENT_LENGTH), **extra_context)
+
+
+class TopPerParentQuerySet(models.QuerySet):
+    """
+    Queryset which can be limited to the first rows of every parent. The limit is applied when the queryset
+    is evaluated, after all other filters (the one added by prefetch_related included): the remaining rows are
+    numbered with ROW_NUMBER() over partitions of their parent and only rows ranked within the limit are kept
+    """
+    top_per_parent = None
+
+    def limit_per_parent(self, parent, ordering, limit):
+        clone = self._chain()
+        clone.top_per_parent = (parent, tuple(ordering), limit)
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.top_per_parent = self.top_per_parent
+        return clone
+
+    def _top_rows(self):
+        parent, ordering, limit = self.top_per_parent
+        order_by = [models.F(name[1:]).desc() if name.startswith('-') else models.F(name).asc()
+                    for name in ordering]
+        ranked = self.order_by().annotate(
+            top_pk=models.F('pk'),
+            top_rank=models.Window(RowNumber(), partition_by=models.F(parent), order_by=order_by),
+        ).values('top_pk', 'top_rank')
+        sql, params = ranked.query.get_compiler(using=self.db).as_sql()
+        quote = connections[self.db].ops.quote_name
+        condition = '{table}.{pk} IN (SELECT {top_pk} FROM ({sql}) {ranked} WHERE {top_rank} <= %s)'.format(
+            table=quote(self.model._meta.db_table), pk=quote(self.model._meta.pk.column), top_pk=quote('top_pk'),
+            sql=sql, ranked=quote('ranked'), top_rank=quote('top_rank'))
+        return condition, params + (limit,)
+
+    def _fetch_all(self):
+        if self._result_cache is None and self.top_per_parent is not None:
+            condition, params = self._top_rows()
+            self.query = self.extra(where=[condition], params=params).query
+            self.top_per_parent = None
+        super()._fetch_all()
+
+
+class CommentQuerySet(TopPerParentQuerySet):
+    def fill_paths(self):
+        """
+        Set paths of comments created without one (by bulk_create), which are roots of their threads
+        """
+        return self.filter(path='').update(path=PathSegment('id'))
+
+    def subtree(self, comment):
+        lowest, highest = subtree_range(comment.path)
+        return self.filter(article_id=comment.article_id, path__gte=lowest, path__lt=highest).order_by('path')
 
 
 class Comment(models.Model):
@@ -52,3 +229,109 @@ class Comment(models.Model):
     content = models.TextField(blank=True)
     publication_date = models.DateTimeField()
     article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='replies')
+    path = models.CharField(max_length=PATH_SEGMENT_LENGTH * MAX_COMMENT_DEPTH, blank=True, default='',
+                            editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['article', 'publication_date', 'id'], name='comment_article_date_idx'),
+            models.Index(fields=['article', 'path'], name='comment_article_path_idx'),
+            models.Index(fields=['-publication_date', '-id'], name='comment_pubdate_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Path of a new comment contains its id, it is written right after the insert
+        """
+        if self.parent_id is not None and not self.path:
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if not self.path:
+            parent_path = self.parent.path if self.parent_id is not None else ''
+            self.path = parent_path + path_segment(self.pk)
+            type(self)._default_manager.using(self._state.db).filter(pk=self.pk).update(path=self.path)
+
+
+class Vote(models.Model):
+    UP = 1
+    DOWN = -1
+    VALUES = ((UP, 'up'), (DOWN, 'down'))
+
+    article = models.ForeignKey(Article, on_delete=models.CASCADE)
+    author = models.ForeignKey(Author, on_delete=models.CASCADE)
+    value = models.SmallIntegerField(choices=VALUES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('article', 'author')
+
+
+class ArticleTrend(models.Model):
+    """
+    Materialized trending score of an article, see articles_app.trending. Scores of all rows are relative
+    to the same epoch, so the feed is one range of the score index
+    """
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='trend')
+    score = models.FloatField()
+    epoch = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', '-article'], name='trend_score_article_idx'),
+        ]
+
+
+class TrendingEpoch(models.Model):
+    """
+    Epoch of all ArticleTrend scores, a single row. It is locked by every writer of scores, so that no score
+    is written relative to an epoch the decay job is moving away from
+    """
+    epoch = models.DateTimeField()
+
+
+class ChangeQuerySet(models.QuerySet):
+    def record(self, kind, ids, action):
+        """
+        Log action on objects of kind with ids in a single insert
+        """
+        changes = [self.model(kind=kind, object_id=pk, action=action) for pk in ids]
+        if changes:
+            self.bulk_create(changes)
+
+
+class Change(models.Model):
+    """
+    Entry of the change log of articles, comments and tags read by replicating clients. Entries are
+    numbered by seq in the order they were written, deleted objects leave a delete entry (tombstone)
+    """
+    ARTICLE = 'article'
+    COMMENT = 'comment'
+    TAG = 'tag'
+    KINDS = ((ARTICLE, 'article'), (COMMENT, 'comment'), (TAG, 'tag'))
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = ((CREATE, 'create'), (UPDATE, 'update'), (DELETE, 'delete'))
+
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=8, choices=KINDS)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=8, choices=ACTIONS)
+    created_at = models.DateTimeField(default=timezone.now)
+    objects = ChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id', 'seq'], name='change_object_seq_idx'),
+        ]
+
+
+class ChangeCompaction(models.Model):
+    """
+    Change log entries up to seq were pruned, clients which synchronized to an older seq must start over
+    """
+    seq = models.BigIntegerField()
+    compacted_at = models.DateTimeField(default=timezone.now)
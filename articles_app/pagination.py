@@ -1,7 +1,275 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
 
-class ArticlesPagination(PageNumberPagination):
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination which seeks directly to the position stored in the cursor using every ordering field,
+    so that neither OFFSET nor COUNT(*) is ever run. Ordering must end with a unique field.
+    """
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 10
+    ordering = ('-publication_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+        return tuple(self.ordering)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = data['p'], bool(data.get('r', False))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError()
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        data = {'p': position}
+        if reverse:
+            data['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_position(self, instance):
+        return [instance._meta.get_field(name.lstrip('-')).value_to_string(instance) for name in self.ordering]
+
+    def build_seek_filter(self, model, position, ordering):
+        """
+        Translate (a, b, c) > (x, y, z) taking direction of every ordering field into account into
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        """
+        try:
+            values = [model._meta.get_field(name.lstrip('-')).to_python(value)
+                      for name, value in zip(ordering, position)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        seek, equal = Q(), dict()
+        for name, value in zip(ordering, values):
+            field_name = name.lstrip('-')
+            lookup = '{}__{}'.format(field_name, 'lt' if name.startswith('-') else 'gt')
+            seek |= Q(**equal, **{lookup: value})
+            equal[field_name] = value
+        return seek
+
+    def fetch(self, queryset, position, reverse, limit):
+        """
+        Return up to limit rows following position in ordering, or preceding it in reverse ordering
+        """
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(name[1:] if name.startswith('-') else '-' + name for name in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.build_seek_filter(queryset.model, position, ordering))
+        return list(queryset[:limit])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        position, reverse = cursor if cursor is not None else (None, False)
+
+        results = self.fetch(queryset, position, reverse, self.page_size + 1)
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return self.encode_cursor(self.decode_cursor(self.request)[0], False)
+        return self.encode_cursor(self.get_position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return self.encode_cursor(self.decode_cursor(self.request)[0], True)
+        return self.encode_cursor(self.get_position(self.page[0]), True)
+
+
+class CommentsPagination(KeysetPagination):
+    page_size = 20
+    max_page_size = 100
+    ordering = ('publication_date', 'id')
+
+
+class CommentThreadsPagination(KeysetPagination):
+    """
+    Thread roots in path order, which is the order they were posted in
+    """
+    page_size = 10
+    max_page_size = 50
+    ordering = ('path',)
+
+
+class SearchPagination(KeysetPagination):
+    """
+    Keyset pagination of ArticleSearch results by rank and id
+    """
+    ordering = ('-rank', '-id')
+
+    def fetch(self, search, position, reverse, limit):
+        if position is not None:
+            try:
+                rank = float(position[0])
+                int(position[1])
+            except (TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if not math.isfinite(rank):
+                raise NotFound(self.invalid_cursor_message)
+        return search.fetch(position, reverse, limit)
+
+    def get_position(self, instance):
+        return [repr(instance.rank), str(instance.id)]
+
+
+class CountLimitedPage(Page):
+    """
+    Page of a paginator whose count is not exact, the next page exists when more rows than the page were read
+    """
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CountLimitedPaginator(Paginator):
+    """
+    Paginator which counts at most count_limit rows, or reads the planner estimate for unfiltered tables
+    on PostgreSQL when estimate is set. Only the reported count is limited: when it is not exact, pages
+    past it are still served and the next page exists as long as rows follow the current one
+    """
+
+    def __init__(self, *args, count_limit=None, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_limit = count_limit
+        self.estimate = estimate
+        self.count_is_exact = True
+
+    def estimated_count(self):
+        query = self.object_list.query
+        connection = connections[self.object_list.db]
+        if query.where or connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                           [self.object_list.model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+
+    @cached_property
+    def count(self):
+        if self.estimate:
+            count = self.estimated_count()
+            if count is not None:
+                self.count_is_exact = False
+                return count if self.count_limit is None else min(count, self.count_limit)
+        if self.count_limit is None:
+            return super().count
+        # Annotations of the serialized rows are not needed to count them
+        count = self.object_list.order_by().values('pk')[:self.count_limit].count()
+        self.count_is_exact = count < self.count_limit
+        return count
+
+    def validate_number(self, number):
+        self.count
+        if self.count_is_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_is_exact:
+            return super().page(number)
+        # One row more than the page tells whether another page follows
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return CountLimitedPage(rows[:self.per_page], number, self, len(rows) > self.per_page)
+
+
+class CountLimitedPageNumberPagination(PageNumberPagination):
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 10
+    count_limit = 1000
+    estimate_count = False
+
+    def django_paginator_class(self, *args, **kwargs):
+        return CountLimitedPaginator(*args, count_limit=self.count_limit, estimate=self.estimate_count, **kwargs)
+
+
+class ArticlesPagination(BasePagination):
+    """
+    Page number pagination with total count limited to count_limit rows by default. Clients opt in
+    to keyset pagination, which never counts, with ?pagination=cursor and then follow its cursors
+    """
+    cursor_pagination_class = KeysetPagination
+    page_number_pagination_class = CountLimitedPageNumberPagination
+    mode_query_param = 'pagination'
+    default_mode = 'page'
+
+    def get_mode(self, request):
+        if self.cursor_pagination_class.cursor_query_param in request.query_params:
+            return 'cursor'
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            return 'cursor'
+        return self.default_mode
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.get_mode(request) == 'page':
+            self.paginator = self.page_number_pagination_class()
+        else:
+            self.paginator = self.cursor_pagination_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    @property
+    def display_page_controls(self):
+        return getattr(getattr(self, 'paginator', None), 'display_page_controls', False)
+
+    def to_html(self):
+        return self.paginator.to_html()
@@ -0,0 +1,92 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch, TextField
+from rest_framework import serializers
+
+
+def _source_path(field):
+    return field.source.replace('.', '__')
+
+
+def _prefixed(prefix, select_related, prefetch_related):
+    select = ['{}__{}'.format(prefix, path) for path in select_related]
+    prefetch = [Prefetch('{}__{}'.format(prefix, lookup.prefetch_through), queryset=lookup.queryset)
+                for lookup in prefetch_related]
+    return select, prefetch
+
+
+def _build_plan(serializer):
+    """
+    Walk serializer fields and collect relations which would otherwise be fetched row by row.
+    Nested single objects are joined with select_related, nested lists are prefetched with a queryset
+    planned recursively for the child serializer. Large text columns which are not serialized are deferred.
+    Fields may take part in planning by implementing plan_annotation(model) or, for list serializers,
+    plan_prefetch(path, queryset, model).
+    """
+    model = serializer.Meta.model
+    select_related, prefetch_related, annotations = [], [], {}
+    sources = set(field.source.split('.')[0] for field in serializer.fields.values())
+    deferred = [field.name for field in model._meta.concrete_fields
+                if isinstance(field, TextField) and field.name not in sources]
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        if hasattr(field, 'plan_annotation'):
+            annotations[field.source] = field.plan_annotation(model)
+            continue
+
+        if isinstance(field, serializers.ManyRelatedField):
+            prefetch_related.append(Prefetch(_source_path(field)))
+            continue
+
+        many = isinstance(field, serializers.ListSerializer)
+        nested = field.child if many else field
+        if not isinstance(nested, serializers.ModelSerializer):
+            continue
+
+        path = _source_path(field)
+        child_select, child_prefetch, child_annotations, child_deferred = _build_plan(nested)
+        if many:
+            queryset = _apply_plan(nested.Meta.model._default_manager.all(),
+                                   child_select, child_prefetch, child_annotations, child_deferred)
+            if hasattr(field, 'plan_prefetch'):
+                prefetch_related.append(field.plan_prefetch(path, queryset, model))
+            else:
+                prefetch_related.append(Prefetch(path, queryset=queryset))
+        else:
+            select_related.append(path)
+            select, prefetch = _prefixed(path, child_select, child_prefetch)
+            select_related.extend(select)
+            prefetch_related.extend(prefetch)
+
+    return select_related, prefetch_related, annotations, deferred
+
+
+def _apply_plan(queryset, select_related, prefetch_related, annotations, deferred):
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if annotations:
+        queryset = queryset.annotate(**annotations)
+    if deferred:
+        queryset = queryset.defer(*deferred)
+    return queryset
+
+
+@lru_cache(maxsize=None)
+def get_plan(serializer_class, fields=None):
+    if fields is None:
+        return _build_plan(serializer_class())
+    return _build_plan(serializer_class(fields=fields))
+
+
+def plan_queryset(queryset, serializer_class, fields=None):
+    """
+    Apply eager loading required by serializer_class, limited to fields when given, to queryset
+    so that serializing any number of rows runs a constant number of queries
+    """
+    if serializer_class is None:
+        return queryset
+    return _apply_plan(queryset, *get_plan(serializer_class, tuple(fields) if fields is not None else None))
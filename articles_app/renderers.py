@@ -0,0 +1,67 @@
+import json
+import re
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Floats json writes in exponent notation, under 1e-4 or from 1e16 on, are written by orjson as 1e-6, 0.000015
+# or 1e16 where json writes 1e-06, 1.5e-05 or 1e+16. orjson agrees on all other floats. Strings may match
+# as well, they are rare enough to be rendered twice
+EXPONENT_FLOAT = re.compile(rb'[0-9]e-?[0-9]|(?<![0-9])0\.0000[0-9]')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer which serializes with orjson when it is installed and ARTICLES_JSON_BACKEND is 'orjson'.
+    Dates, times, decimals and other values orjson would format differently or does not support are
+    converted by the DRF encoder. Indented or ASCII-only output, data orjson rejects (e.g. integers over
+    64 bits) and output with floats in exponent notation are rendered by JSONRenderer, so the output is
+    the same with either backend. The exceptions are NaN and infinities, orjson writes them as null where
+    JSONRenderer fails
+    """
+
+    def use_orjson(self, accepted_media_type, renderer_context):
+        return orjson is not None and getattr(settings, 'ARTICLES_JSON_BACKEND', 'orjson') == 'orjson' \
+               and self.compact and not self.ensure_ascii \
+               and self.get_indent(accepted_media_type, renderer_context or {}) is None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not self.use_orjson(accepted_media_type, renderer_context) or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default,
+                               option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if EXPONENT_FLOAT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping of the line separators as JSONRenderer, they are not valid in JavaScript strings
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline delimited JSON. Views stream their NDJSON content themselves, the renderer makes the format
+    negotiable and renders error responses as a single line
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, cls=JSONEncoder) + '\n').encode(self.charset)
+
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'articles_primary'
+
+LAG_QUERIES = {
+    'postgresql': 'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)',
+}
+
+_state = threading.local()
+
+
+def replica_lag(alias):
+    """
+    Return replication lag of database in seconds, 0 for backends which cannot report it
+    """
+    connection = connections[alias]
+    connection.ensure_connection()
+    query = LAG_QUERIES.get(connection.vendor)
+    if query is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(query)
+        return float(cursor.fetchone()[0] or 0)
+
+
+class ReplicaPool(object):
+    """
+    Read replicas with cached health. A replica is healthy when it accepts connections and lags
+    at most max_lag seconds behind the primary, health is checked at most once per check_interval
+    """
+
+    def __init__(self, aliases, max_lag=10.0, check_interval=5.0, lag=replica_lag):
+        self.aliases = tuple(aliases)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = lag
+        self.health = dict()
+        self.lock = threading.Lock()
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self.lock:
+            checked = self.health.get(alias)
+        if checked is not None and now - checked[0] < self.check_interval:
+            return checked[1]
+
+        try:
+            healthy = self.lag(alias) <= self.max_lag
+        except DatabaseError:
+            healthy = False
+        with self.lock:
+            self.health[alias] = (now, healthy)
+        return healthy
+
+    def choose(self):
+        """
+        Return alias of random healthy replica or None when none is healthy
+        """
+        healthy = [alias for alias in self.aliases if self.is_healthy(alias)]
+        return random.choice(healthy) if healthy else None
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    config = (tuple(getattr(settings, 'ARTICLES_READ_REPLICAS', ())),
+              getattr(settings, 'ARTICLES_REPLICA_MAX_LAG', 10.0),
+              getattr(settings, 'ARTICLES_REPLICA_CHECK_INTERVAL', 5.0))
+    if _pool is None or (_pool.aliases, _pool.max_lag, _pool.check_interval) != config:
+        _pool = ReplicaPool(*config)
+    return _pool
+
+
+def is_sticky(request):
+    return STICKY_COOKIE in request.COOKIES
+
+
+@contextmanager
+def replica_reads(request):
+    """
+    Route reads made inside the block to a replica when request is a safe one and its client did not
+    write recently. All reads of the block go to the same replica
+    """
+    alias = None
+    if request.method in SAFE_METHODS and not is_sticky(request):
+        alias = get_pool().choose()
+    previous = getattr(_state, 'read_alias', None)
+    _state.read_alias = alias
+    try:
+        yield alias
+    finally:
+        _state.read_alias = previous
+
+
+def read_alias():
+    """
+    Alias of the replica reads are routed to, None when they go to the primary
+    """
+    return getattr(_state, 'read_alias', None)
+
+
+def may_lag_behind(moment):
+    """
+    Return True when reads go to a replica which may not have replayed changes committed at moment
+    (a time.time() timestamp) yet. Replicas are used only while they lag at most ARTICLES_REPLICA_MAX_LAG seconds
+    """
+    return read_alias() is not None and time.time() - moment < get_pool().max_lag
+
+
+class ReplicaRouter(object):
+    """
+    Send reads to the replica selected by replica_reads(), everything else to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaReadMixin(object):
+    """
+    Serve safe requests of the view from a read replica. Successful writes pin the client to
+    the primary for ARTICLES_STICKY_SECONDS so that it reads its own writes
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with replica_reads(request):
+            response = super().dispatch(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=getattr(settings, 'ARTICLES_STICKY_SECONDS', 5),
+                                httponly=True)
+        return response
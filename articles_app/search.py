@@ -0,0 +1,197 @@
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.html import escape
+
+from articles_app.models import Article
+from articles_app.planner import plan_queryset
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+# Backends delimit matches with characters of the private use area, snippets are escaped before
+# the delimiters are replaced by highlight tags
+MATCH_START = '\ue000'
+MATCH_STOP = '\ue001'
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS articles_app_article_fts USING fts5(
+        title, content, content='articles_app_article', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS articles_app_article_fts_insert AFTER INSERT ON articles_app_article BEGIN
+        INSERT INTO articles_app_article_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS articles_app_article_fts_delete AFTER DELETE ON articles_app_article BEGIN
+        INSERT INTO articles_app_article_fts(articles_app_article_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS articles_app_article_fts_update
+    AFTER UPDATE OF title, content ON articles_app_article BEGIN
+        INSERT INTO articles_app_article_fts(articles_app_article_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO articles_app_article_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+]
+SQLITE_TRIGGERS = ('articles_app_article_fts_insert', 'articles_app_article_fts_delete',
+                   'articles_app_article_fts_update')
+
+
+def install_sqlite_index(using='default'):
+    """
+    Create FTS5 index of articles on SQLite. SQLite rebuilds tables on most schema changes which drops
+    their triggers, so this runs after every migrate and rebuilds the index when anything was missing
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                       SQLITE_TRIGGERS)
+        if len(cursor.fetchall()) == len(SQLITE_TRIGGERS):
+            return
+        for statement in SQLITE_INDEX:
+            cursor.execute(statement)
+        cursor.execute("INSERT INTO articles_app_article_fts(articles_app_article_fts) VALUES ('rebuild')")
+
+
+class PostgresSearchBackend(object):
+    """
+    Match against trigger maintained search_vector column (GIN index), rank with ts_rank_cd.
+    Headlines are computed only for rows of the returned page
+    """
+    sql = """
+        SELECT page.id, page.rank, ts_headline('pg_catalog.english', page.content, page.query, %s)
+        FROM (
+            SELECT ranked.id, ranked.content, ranked.query, ranked.rank
+            FROM (
+                SELECT a.id, a.content, q.query, round(ts_rank_cd(a.search_vector, q.query)::numeric, 6) AS rank
+                FROM articles_app_article a, plainto_tsquery('pg_catalog.english', %s) q(query)
+                WHERE a.search_vector @@ q.query {restrict}
+            ) ranked
+            {seek}
+            ORDER BY ranked.rank {direction}, ranked.id {direction}
+            LIMIT %s
+        ) page
+        ORDER BY page.rank {direction}, page.id {direction}
+    """
+    restrict_column = 'a.id'
+    seek_columns = ('ranked.rank', 'ranked.id')
+
+    def to_rank(self, value):
+        return Decimal(value)
+
+    def search_params(self, query):
+        options = 'StartSel={}, StopSel={}, MaxFragments=2'.format(MATCH_START, MATCH_STOP)
+        return [options, query]
+
+
+class SqliteSearchBackend(PostgresSearchBackend):
+    """
+    Match against FTS5 index, rank with bm25 giving title ten times the weight of content
+    """
+    sql = """
+        SELECT ranked.id, ranked.rank, ranked.snippet
+        FROM (
+            SELECT f.rowid AS id, round(-bm25(articles_app_article_fts, 10.0, 1.0), 6) AS rank,
+                   snippet(articles_app_article_fts, 1, %s, %s, '...', 16) AS snippet
+            FROM articles_app_article_fts f
+            WHERE articles_app_article_fts MATCH %s {restrict}
+        ) ranked
+        {seek}
+        ORDER BY ranked.rank {direction}, ranked.id {direction}
+        LIMIT %s
+    """
+    restrict_column = 'f.rowid'
+
+    def to_rank(self, value):
+        return float(value)
+
+    def search_params(self, query):
+        # Quote every term so that user input is never parsed as FTS5 query syntax
+        terms = ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+        return [MATCH_START, MATCH_STOP, terms]
+
+
+def highlight(snippet):
+    """
+    HTML of snippet with matches delimited by the backend wrapped in highlight tags
+    """
+    return escape(snippet).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_STOP, HIGHLIGHT_STOP)
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+class ArticleSearch(object):
+    """
+    Full-text search of query in title and content of articles, ordered by rank and id.
+    Rows are fetched page by page with fetch(), so search objects are handed to the pagination
+    in place of querysets
+    """
+
+    def __init__(self, query, articles, serializer_class=None, fields=None):
+        self.query = query
+        self.articles = articles
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.connection = connections[articles.db]
+
+    def fetch_rows(self, position, reverse, limit):
+        """
+        Return (id, rank, snippet) of at most limit matches following position
+        """
+        backend_class = SEARCH_BACKENDS.get(self.connection.vendor)
+        if backend_class is None:
+            return self.fetch_without_index(position, reverse, limit)
+        return self.fetch_with_backend(backend_class(), position, reverse, limit)
+
+    def fetch(self, position, reverse, limit):
+        rows = self.fetch_rows(position, reverse, limit)
+        articles = plan_queryset(Article.objects.filter(id__in=[row[0] for row in rows]), self.serializer_class,
+                                 self.fields)
+        articles = {article.id: article for article in articles}
+        results = list()
+        for article_id, rank, snippet in rows:
+            article = articles.get(article_id)
+            if article is not None:
+                article.rank, article.snippet = float(rank), highlight(snippet)
+                results.append(article)
+        return results
+
+    def fetch_with_backend(self, backend, position, reverse, limit):
+        restrict, restrict_params = '', []
+        if self.articles.query.where:
+            restrict_sql, restrict_params = self.articles.order_by().values('id').query.sql_with_params()
+            restrict = 'AND {} IN ({})'.format(backend.restrict_column, restrict_sql)
+
+        seek, seek_params = '', []
+        if position is not None:
+            rank, last_id = backend.to_rank(position[0]), int(position[1])
+            operator = '>' if reverse else '<'
+            seek = 'WHERE {rank} {op} %s OR ({rank} = %s AND {id} {op} %s)'.format(
+                rank=backend.seek_columns[0], id=backend.seek_columns[1], op=operator)
+            seek_params = [rank, rank, last_id]
+
+        sql = backend.sql.format(restrict=restrict, seek=seek, direction='ASC' if reverse else 'DESC')
+        params = backend.search_params(self.query) + list(restrict_params) + seek_params + [limit]
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def fetch_without_index(self, position, reverse, limit):
+        articles = self.articles.filter(Q(title__icontains=self.query) | Q(content__icontains=self.query))
+        if position is not None:
+            articles = articles.filter(id__gt=position[1]) if reverse else articles.filter(id__lt=position[1])
+        articles = articles.order_by('id' if reverse else '-id')
+        return [(article_id, 0, '') for article_id in articles.values_list('id', flat=True)[:limit]]
@@ -1,5 +1,68 @@
+from collections import OrderedDict
+from operator import attrgetter
+from types import SimpleNamespace
+
+from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from articles_app.models import Article, Author, Tag, Comment
+from articles_app.models import Article, Author, Tag, Comment, Vote, MAX_COMMENT_DEPTH
+
+
+class RelatedCountField(serializers.ReadOnlyField):
+    """
+    Number of rows in a reverse foreign key relation. The queryset planner annotates it with a subquery,
+    instances loaded without the annotation fall back to COUNT(*) query
+    """
+
+    def __init__(self, relation, **kwargs):
+        self.relation = relation
+        super().__init__(**kwargs)
+
+    def plan_annotation(self, model):
+        related_field = getattr(model, self.relation).field
+        counts = related_field.model._default_manager.filter(**{related_field.name: OuterRef('pk')}) \
+            .order_by().values(related_field.name).annotate(count=Count('pk')).values('count')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    def get_attribute(self, instance):
+        try:
+            return getattr(instance, self.source)
+        except AttributeError:
+            return getattr(instance, self.relation).count()
+
+
+class NewestListSerializer(serializers.ListSerializer):
+    """
+    Serialize at most limit newest rows of a reverse foreign key relation
+    """
+
+    def __init__(self, *args, limit, ordering, **kwargs):
+        self.limit = limit
+        self.ordering = ordering
+        super().__init__(*args, **kwargs)
+
+    def plan_prefetch(self, path, queryset, model):
+        """
+        Prefetch the newest rows of every parent, the child model's queryset has to be a TopPerParentQuerySet
+        """
+        related_field = getattr(model, path).field
+        # Rows are grouped by parent in the direction of the ordering, so that an index of
+        # (parent, *ordering) returns them already sorted
+        grouping = '-' + related_field.name if self.ordering[0].startswith('-') else related_field.name
+        newest = queryset.limit_per_parent(related_field.name, self.ordering, self.limit)
+        return Prefetch(path, queryset=newest.order_by(grouping, *self.ordering))
+
+    def get_items(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+            if data._result_cache is None:
+                data = data.order_by(*self.ordering)
+            data = data[:self.limit]
+        return data
+
+    def to_representation(self, data):
+        return super().to_representation(self.get_items(data))
 
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -16,6 +79,12 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['name']
 
 
+class TagChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ['id', 'name']
+
+
 class StringToTagSerializer(serializers.ModelSerializer):
     name = serializers.CharField()
 
@@ -32,7 +101,40 @@ class CommentGetSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['author', 'content', 'publication_date']
+        fields = ['id', 'parent', 'author', 'content', 'publication_date']
+
+
+class CommentChangeSerializer(CommentGetSerializer):
+    class Meta(CommentGetSerializer.Meta):
+        fields = ['id', 'article', 'parent', 'author', 'content', 'publication_date']
+
+
+class CommentTreeListSerializer(serializers.ListSerializer):
+    """
+    Assemble comments ordered by path into trees of replies in one pass. Path order puts every comment
+    after its parent, so each one is attached to an already built node
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        nodes, roots = dict(), list()
+        for comment in data:
+            node = self.child.to_representation(comment)
+            node['replies'] = list()
+            nodes[comment.id] = node
+            parent = nodes.get(comment.parent_id)
+            (roots if parent is None else parent['replies']).append(node)
+        return roots
+
+
+class CommentTreeSerializer(serializers.ModelSerializer):
+    author = AuthorSerializer()
+
+    class Meta:
+        model = Comment
+        fields = ['id', 'author', 'content', 'publication_date', 'depth']
+        list_serializer_class = CommentTreeListSerializer
 
 
 class CommentPostSerializer(serializers.ModelSerializer):
@@ -43,6 +145,32 @@ class CommentPostSerializer(serializers.ModelSerializer):
         fields = ['id', 'content']
 
 
+class CommentReplySerializer(CommentPostSerializer):
+    """
+    New comment, a reply when parent is given. Parent must be a comment of the same article
+    """
+    parent = serializers.PrimaryKeyRelatedField(queryset=Comment.objects.all(), required=False, allow_null=True)
+
+    def validate_parent(self, parent):
+        if parent is None:
+            return parent
+        if parent.article_id != self.instance.article_id:
+            raise serializers.ValidationError('Comment of another article.')
+        if parent.depth + 1 >= MAX_COMMENT_DEPTH:
+            raise serializers.ValidationError('Replies can be nested at most {} levels deep.'.format(
+                MAX_COMMENT_DEPTH - 1))
+        return parent
+
+    class Meta(CommentPostSerializer.Meta):
+        fields = CommentPostSerializer.Meta.fields + ['parent']
+
+
+class VoteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Vote
+        fields = ['value']
+
+
 class ArticlesPostSerializer(serializers.ModelSerializer):
     tags = StringToTagSerializer(many=True, required=False)
     id = serializers.ReadOnlyField(required=False)
@@ -55,8 +183,8 @@ class ArticlesPostSerializer(serializers.ModelSerializer):
             pass
 
         article = Article.objects.create(**validated_data)
-        for tag in tags_list:
-            article.tags.create(**tag)
+        if tags_list:
+            article.tags.add(*Tag.objects.get_or_create_many(tag['name'] for tag in tags_list))
 
         return article
 
@@ -67,12 +195,13 @@ class ArticlesPostSerializer(serializers.ModelSerializer):
         except KeyError:
             pass
 
-        for tag in tags_list:
-            instance.tags.create(**tag)
+        if tags_list:
+            instance.tags.add(*Tag.objects.get_or_create_many(tag['name'] for tag in tags_list))
 
         instance.title = validated_data.pop('title')
         instance.content = validated_data.pop('content')
-        instance.save()
+        # Buffered counters are written by their own UPDATEs, saving their loaded values would undo them
+        instance.save(update_fields=['title', 'content', 'excerpt', 'updated_at'])
         return instance
 
     class Meta:
@@ -80,11 +209,185 @@ class ArticlesPostSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'tags', 'content']
 
 
-class ArticlesGetSerializer(serializers.ModelSerializer):
+class URLField(serializers.HyperlinkedIdentityField):
+    """
+    Hyperlinked identity rendered as plain string, which unlike Hyperlink does not keep a reference
+    to the serialized instance, so payloads can be pickled into cache
+    """
+
+    def to_representation(self, value):
+        return str(super().to_representation(value))
+
+    def compile_representation(self):
+        """
+        Reverse the URL once with a marker lookup value, which is replaced with the lookup value
+        of each object, instead of resolving it for every object
+        """
+        marker = 918273645546372819
+        url = self.to_representation(SimpleNamespace(**{'pk': marker, self.lookup_field: marker}))
+        if url.count(str(marker)) != 1:
+            return None
+        prefix, suffix = url.split(str(marker))
+        get = attrgetter(self.lookup_field)
+
+        def represent(instance):
+            if instance.pk is None:
+                return None
+            return prefix + str(get(instance)) + suffix
+        return represent
+
+
+# Fields whose to_representation only coerces the attribute, mapped to the coercion
+PLAIN_FIELDS = {
+    serializers.ReadOnlyField: None,
+    serializers.CharField: str,
+    serializers.IntegerField: int,
+    serializers.FloatField: float,
+}
+
+
+def _list_items(field, data):
+    if hasattr(field, 'get_items'):
+        return field.get_items(data)
+    return data.all() if isinstance(data, models.Manager) else data
+
+
+def _compile_field(field):
+    if hasattr(field, 'compile_representation'):
+        represent = field.compile_representation()
+        if represent is not None:
+            return represent
+
+    if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+        child = compile_representation(field.child)
+        get = attrgetter(field.source)
+        return lambda instance: [child(item) for item in _list_items(field, get(instance))]
+
+    if isinstance(field, serializers.ModelSerializer):
+        nested = compile_representation(field)
+        get = attrgetter(field.source)
+
+        def represent(instance):
+            value = get(instance)
+            return None if value is None else nested(value)
+        return represent
+
+    if type(field) in PLAIN_FIELDS and field.source != '*':
+        get, coerce = attrgetter(field.source), PLAIN_FIELDS[type(field)]
+        if coerce is None:
+            return get
+
+        def represent(instance):
+            value = get(instance)
+            return None if value is None else coerce(value)
+        return represent
+
+    # Anything else goes through the field itself, skipping only the serializer loop
+    get, to_representation = field.get_attribute, field.to_representation
+
+    def represent(instance):
+        value = get(instance)
+        return None if value is None else to_representation(value)
+    return represent
+
+
+def compile_representation(serializer):
+    """
+    Return function building the same representation of an instance as serializer.to_representation()
+    with plain attribute access and dict construction. Nested model serializers are compiled recursively,
+    fields with custom representation are called directly
+    """
+    fields = [(field.field_name, _compile_field(field)) for field in serializer._readable_fields]
+
+    def represent(instance):
+        return OrderedDict([(name, field(instance)) for name, field in fields])
+    return represent
+
+
+class CompiledRepresentationMixin(object):
+    """
+    Read-only fast path: represent instances with function compiled once per serializer instead of
+    going through field machinery for every object
+    """
+
+    def to_representation(self, instance):
+        represent = getattr(self, '_compiled_representation', None)
+        if represent is None:
+            represent = self._compiled_representation = compile_representation(self)
+        return represent(instance)
+
+
+class SparseFieldsMixin(object):
+    """
+    Serialize only fields given in fields argument, or default_fields when it is not given.
+    Any of Meta.fields can be selected
+    """
+    default_fields = None
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            fields = self.default_fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields=None, exclude=None, base=None):
+        """
+        Return names of fields to serialize in declaration order, raise ValueError for unknown names
+        """
+        available = list(cls.Meta.fields)
+        unknown = [name for name in (fields or []) + (exclude or []) if name not in available]
+        if unknown:
+            raise ValueError('Unknown fields: {}'.format(', '.join(unknown)))
+        selected = set(fields or base or cls.default_fields or available) - set(exclude or [])
+        return [name for name in available if name in selected]
+
+
+class ArticlesGetSerializer(SparseFieldsMixin, CompiledRepresentationMixin, serializers.ModelSerializer):
+    EMBEDDED_COMMENTS_LIMIT = 5
+
     author = AuthorSerializer()
     tags = TagSerializer(many=True)
-    comments = CommentGetSerializer(source='comment_set', many=True)
+    comments = NewestListSerializer(child=CommentGetSerializer(), source='comment_set',
+                                    limit=EMBEDDED_COMMENTS_LIMIT, ordering=('-publication_date', '-id'))
+    comment_count = RelatedCountField(relation='comment_set')
+    comments_url = URLField(view_name='articles:comments')
+
+    default_fields = ['id', 'title', 'author', 'tags', 'content', 'comments', 'comment_count', 'comments_url',
+                      'publication_date', 'rating']
+    summary_fields = ['id', 'title', 'author', 'tags', 'excerpt', 'comment_count', 'comments_url',
+                      'publication_date', 'rating']
 
     class Meta:
         model = Article
-        fields = ['id', 'title', 'author', 'tags', 'content', 'comments', 'publication_date', 'rating']
+        fields = ['id', 'title', 'author', 'tags', 'content', 'excerpt', 'comments', 'comment_count',
+                  'comments_url', 'publication_date', 'rating', 'views']
+
+
+class ArticleSearchResultSerializer(ArticlesGetSerializer):
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    default_fields = ArticlesGetSerializer.default_fields + ['rank', 'snippet']
+    summary_fields = ArticlesGetSerializer.summary_fields + ['rank', 'snippet']
+
+    class Meta(ArticlesGetSerializer.Meta):
+        fields = ArticlesGetSerializer.Meta.fields + ['rank', 'snippet']
+
+
+class CommentImportSerializer(serializers.Serializer):
+    author = serializers.CharField(max_length=150, required=False)
+    content = serializers.CharField(allow_blank=True, required=False, default='')
+    publication_date = serializers.DateTimeField()
+
+
+class ArticleImportSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    content = serializers.CharField()
+    author = serializers.CharField(max_length=150, required=False)
+    tags = serializers.ListField(child=serializers.CharField(max_length=32), required=False, default=list)
+    publication_date = serializers.DateField()
+    rating = serializers.IntegerField(required=False, default=0)
+    comments = CommentImportSerializer(many=True, required=False, default=list)
@@ -1,7 +1,16 @@
+from django.core.signals import request_finished
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed, post_migrate
 
-from articles_app.models import CustomUser, Author
+from rest_framework.authtoken.models import Token
+
+from articles_app import trending
+from articles_app.authentication import invalidate_token, invalidate_user_tokens
+from articles_app.cache import invalidate_articles
+from articles_app.counters import flush_due
+from articles_app.models import CustomUser, Author, Article, Comment, Tag, Vote, Change
+from articles_app.search import install_sqlite_index
 
 
 @receiver(post_save, sender=CustomUser)
@@ -9,3 +18,161 @@ def create_author_data_on_user_creation(sender, instance, created, **kwargs):
     if created:
         author = Author(user=instance)
         author.save()
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user_tokens(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_cached_author_tokens(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.user_id)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+def embedded_data_changed(article_ids, log_changes=True):
+    """
+    Data embedded in articles (comments, tags or authors) has changed
+    """
+    article_ids = list(article_ids)
+    if article_ids:
+        Article.objects.filter(id__in=article_ids).touch()
+        if log_changes:
+            Change.objects.record(Change.ARTICLE, article_ids, Change.UPDATE)
+    invalidate_articles(article_ids)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_cached_article(sender, instance, **kwargs):
+    invalidate_articles([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_cached_commented_article(sender, instance, **kwargs):
+    # Comments have entries in the change log of their own
+    embedded_data_changed([instance.article_id], log_changes=False)
+
+
+@receiver(m2m_changed, sender=Article.tags.through)
+def invalidate_cached_tagged_articles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_article_ids = list(instance.article_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        embedded_data_changed([instance.pk])
+    elif action == 'post_clear':
+        embedded_data_changed(getattr(instance, '_cleared_article_ids', ()))
+    else:
+        embedded_data_changed(pk_set)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_articles_of_deleted_tag(sender, instance, **kwargs):
+    instance._tagged_article_ids = list(instance.article_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_cached_articles_with_tag(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    article_ids = getattr(instance, '_tagged_article_ids', None)
+    if article_ids is None:
+        article_ids = instance.article_set.values_list('id', flat=True)
+    embedded_data_changed(article_ids)
+
+
+def related_article_ids(author):
+    """
+    Articles written or commented by author, both embed author data
+    """
+    return list(Article.objects.filter(Q(author=author) | Q(comment__author=author))
+                .values_list('id', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=Author)
+def remember_articles_of_deleted_author(sender, instance, **kwargs):
+    instance._related_article_ids = related_article_ids(instance)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_cached_articles_of_author(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    article_ids = getattr(instance, '_related_article_ids', None)
+    if article_ids is None:
+        article_ids = related_article_ids(instance)
+    embedded_data_changed(article_ids)
+
+
+@receiver(post_save, sender=Article)
+def score_published_article(sender, instance, created, using, update_fields=None, **kwargs):
+    if created:
+        trending.add_article(instance, using)
+    elif update_fields and 'publication_date' in update_fields:
+        trending.rebuild([instance.pk], using)
+
+
+CHANGE_KINDS = {Article: Change.ARTICLE, Comment: Change.COMMENT, Tag: Change.TAG}
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Tag)
+def log_saved_object(sender, instance, created, using, **kwargs):
+    Change.objects.using(using).record(CHANGE_KINDS[sender], [instance.pk], Change.CREATE if created else Change.UPDATE)
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Tag)
+def log_deleted_object(sender, instance, using, **kwargs):
+    Change.objects.using(using).record(CHANGE_KINDS[sender], [instance.pk], Change.DELETE)
+
+
+# Changes of the publication date of an existing comment are not followed, decay_trending --rebuild
+# recomputes all scores
+@receiver(post_save, sender=Comment)
+def score_comment(sender, instance, created, using, **kwargs):
+    if created:
+        trending.add_event(instance.article_id, trending.COMMENT_WEIGHT, instance.publication_date, using)
+
+
+@receiver(post_delete, sender=Comment)
+def unscore_comment(sender, instance, using, **kwargs):
+    trending.add_event(instance.article_id, -trending.COMMENT_WEIGHT, instance.publication_date, using)
+
+
+# Changed votes are scored by cast_vote, which knows the previous value
+@receiver(post_save, sender=Vote)
+def score_vote(sender, instance, created, using, **kwargs):
+    if created:
+        trending.add_event(instance.article_id, trending.VOTE_WEIGHT * instance.value, instance.created_at, using)
+
+
+@receiver(post_delete, sender=Vote)
+def unscore_vote(sender, instance, using, **kwargs):
+    trending.add_event(instance.article_id, -trending.VOTE_WEIGHT * instance.value, instance.created_at, using)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    if sender.name == 'articles_app':
+        install_sqlite_index(using)
+
+
+@receiver(request_finished)
+def flush_due_counters(sender, **kwargs):
+    flush_due()
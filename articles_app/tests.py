@@ -1,10 +1,52 @@
-from django.test import Client
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as day_time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from django.utils.translation import gettext_lazy
 
-from rest_framework.test import APITestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.serializers import Serializer
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework.utils import json
 
-from articles_app.models import CustomUser, Author, Article, Comment
+from articles_app.asgi import ASGIHandler
+from articles_app.authentication import CachedTokenAuthentication, token_cache_key
+from articles_app.benchmark import compare, percentile, seed_dataset
+from articles_app.cache import get_cache, get_or_compute
+from articles_app.compression import brotli, negotiate
+from articles_app.counters import flush_all
+from articles_app.export import export_articles
+from articles_app.importer import ArticleImporter
+from articles_app.instrumentation import RequestMetrics, explain
+from articles_app.models import CustomUser, Author, Article, Comment, Tag, Vote, get_author_data_related_to_user, \
+    MAX_COMMENT_DEPTH, ArticleTrend, Change, TrendingEpoch
+from articles_app.pagination import CountLimitedPageNumberPagination
+from articles_app.planner import plan_queryset
+from articles_app.renderers import FastJSONRenderer, orjson
+from articles_app.routers import ReplicaPool
+from articles_app.serializers import ArticlesGetSerializer, ArticleSearchResultSerializer
+from articles_app.trending import compute_scores, current_epoch, is_trending, rebase
+from articles_app.viewcounts import views_buffer
+from articles_app.votes import cast_vote, rating_buffer
 
 
 # Create your tests here.
@@ -152,3 +194,2213 @@ class ArticleTestCase(APITestCase):
         response = self.client.post('http://testserver/articles/{}/comment'.format(article_id), data=data,
                                     format='json')
         self.assertEqual(response.status_code, 403)
+
+
+class QueryCountTestCase(APITestCase):
+    """
+    Number of queries run by read endpoints must not depend on the number of articles, tags or comments
+    """
+
+    def setUp(self):
+        self.authors = list()
+        for i in range(3):
+            user = CustomUser.objects.create_user(username='query_user{}'.format(i), password='password')
+            self.authors.append(Author.objects.get(user=user))
+        # Restart flush interval of view counts so that no flush is run inside a measured request
+        views_buffer.flush()
+        self.client = Client()
+
+    def create_articles(self, count, tags_per_article=2, comments_per_article=3):
+        articles = list()
+        for i in range(count):
+            article = Article.objects.create(title='Article {}'.format(i), content='Content {}'.format(i),
+                                             author=self.authors[i % len(self.authors)],
+                                             publication_date=timezone.now())
+            for j in range(tags_per_article):
+                article.tags.add(Tag.objects.get_or_create(name='tag{}_{}'.format(i, j))[0])
+            for j in range(comments_per_article):
+                Comment.objects.create(article=article, author=self.authors[j % len(self.authors)],
+                                       content='Comment {}'.format(j), publication_date=timezone.now())
+            articles.append(article)
+        return articles
+
+    def test_article_list_query_count_is_constant(self):
+        # Count, articles, tags, comments
+        self.create_articles(1, tags_per_article=1, comments_per_article=1)
+        with self.assertNumQueries(4):
+            self.client.get('http://testserver/articles/')
+
+        self.create_articles(10, tags_per_article=3, comments_per_article=5)
+        with self.assertNumQueries(4):
+            response = self.client.get('http://testserver/articles/?page_size=10')
+        self.assertEqual(len(json.loads(response.content)['results']), 10)
+
+    def test_article_list_page_number_mode_query_count_is_constant(self):
+        self.create_articles(1, tags_per_article=1, comments_per_article=1)
+        with self.assertNumQueries(4):
+            self.client.get('http://testserver/articles/?page=1')
+
+        self.create_articles(10, tags_per_article=3, comments_per_article=5)
+        with self.assertNumQueries(4):
+            self.client.get('http://testserver/articles/?page=2&page_size=5')
+
+    def test_article_list_cursor_mode_query_count_is_constant(self):
+        self.create_articles(1, tags_per_article=1, comments_per_article=1)
+        with self.assertNumQueries(3):
+            self.client.get('http://testserver/articles/?pagination=cursor')
+
+        self.create_articles(10, tags_per_article=3, comments_per_article=5)
+        with self.assertNumQueries(3):
+            self.client.get('http://testserver/articles/?pagination=cursor&page_size=10')
+
+    def test_tag_filtered_article_list_query_count_is_constant(self):
+        self.create_articles(1, tags_per_article=1)
+        with self.assertNumQueries(4):
+            self.client.get('http://testserver/articles/?tags=tag0_0')
+
+        self.create_articles(10, tags_per_article=3, comments_per_article=5)
+        with self.assertNumQueries(4):
+            self.client.get('http://testserver/articles/?tags=tag0_0,tag1_1,tag2_2,tag3_0')
+
+    def test_article_details_query_count_is_constant(self):
+        # Modification time lookup, article, tags, comments
+        article = self.create_articles(1, tags_per_article=1, comments_per_article=1)[0]
+        with self.assertNumQueries(4):
+            self.client.get('http://testserver/articles/{}'.format(article.id))
+
+        article = self.create_articles(1, tags_per_article=5, comments_per_article=20)[0]
+        with self.assertNumQueries(4):
+            response = self.client.get('http://testserver/articles/{}'.format(article.id))
+        received_data = json.loads(response.content)
+        self.assertEqual(len(received_data['comments']), ArticlesGetSerializer.EMBEDDED_COMMENTS_LIMIT)
+        self.assertEqual(received_data['comment_count'], 20)
+
+
+class ArticlesPaginationTestCase(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='pagination_user', password='password')
+        author = Author.objects.get(user=user)
+        tag = Tag.objects.create(name='paged')
+        self.articles = list()
+        for i in range(12):
+            # Pairs of articles share publication date so that ties have to be resolved by id
+            article = Article.objects.create(title='Article {}'.format(i), content='Content', author=author,
+                                             publication_date=date(2019, 1, 1 + i // 2))
+            if i % 3 == 0:
+                article.tags.add(tag)
+            self.articles.append(article)
+        self.expected_ids = [article.id for article in sorted(self.articles,
+                                                              key=lambda a: (a.publication_date, a.id),
+                                                              reverse=True)]
+        self.client = Client()
+
+    def walk(self, url, link):
+        ids, pages = list(), 0
+        while url:
+            data = json.loads(self.client.get(url).content)
+            ids.extend(article['id'] for article in data['results'])
+            url = data[link]
+            pages += 1
+        return ids, pages
+
+    def test_page_number_mode_is_the_default(self):
+        data = json.loads(self.client.get('http://testserver/articles/').content)
+        self.assertEqual(data['count'], 12)
+        self.assertEqual([a['id'] for a in data['results']], self.expected_ids[:5])
+        ids, pages = self.walk('http://testserver/articles/?page_size=5', 'next')
+        self.assertEqual((ids, pages), (self.expected_ids, 3))
+
+    def test_cursor_pages_cover_all_articles_in_order(self):
+        ids, pages = self.walk('http://testserver/articles/?page_size=5&pagination=cursor', 'next')
+        self.assertEqual(ids, self.expected_ids)
+        self.assertEqual(pages, 3)
+
+    def test_cursor_response_has_no_count(self):
+        data = json.loads(self.client.get('http://testserver/articles/?pagination=cursor').content)
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['previous'])
+        self.assertIsNotNone(data['next'])
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first = json.loads(self.client.get('http://testserver/articles/?page_size=4&pagination=cursor').content)
+        second = json.loads(self.client.get(first['next']).content)
+        back = json.loads(self.client.get(second['previous']).content)
+        self.assertEqual([a['id'] for a in back['results']], [a['id'] for a in first['results']])
+        self.assertIsNone(back['previous'])
+        self.assertEqual([a['id'] for a in second['results']], self.expected_ids[4:8])
+
+    def test_cursor_pagination_with_tags_filter(self):
+        ids, _ = self.walk('http://testserver/articles/?tags=paged&page_size=2&pagination=cursor', 'next')
+        tagged = [article.id for article in self.articles if article.tags.filter(name='paged').exists()]
+        self.assertEqual(ids, [i for i in self.expected_ids if i in tagged])
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get('http://testserver/articles/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_is_available(self):
+        data = json.loads(self.client.get('http://testserver/articles/?page=2&page_size=5').content)
+        self.assertEqual(data['count'], 12)
+        self.assertEqual([a['id'] for a in data['results']], self.expected_ids[5:10])
+
+    def test_page_number_mode_count_is_limited(self):
+        with mock.patch.object(CountLimitedPageNumberPagination, 'count_limit', 7):
+            data = json.loads(self.client.get('http://testserver/articles/?page=1&page_size=5').content)
+            self.assertEqual(data['count'], 7)
+            # Only the reported count is limited, every page stays reachable
+            data = json.loads(self.client.get('http://testserver/articles/?page=2&page_size=5').content)
+            self.assertEqual([a['id'] for a in data['results']], self.expected_ids[5:10])
+            self.assertIsNotNone(data['next'])
+            data = json.loads(self.client.get(data['next']).content)
+            self.assertEqual([a['id'] for a in data['results']], self.expected_ids[10:])
+            self.assertIsNone(data['next'])
+            response = self.client.get('http://testserver/articles/?page=4&page_size=5')
+            self.assertEqual(response.status_code, 404)
+
+
+class ArticleCommentsTestCase(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='comments_user', password='password')
+        self.author = Author.objects.get(user=user)
+        self.article = Article.objects.create(title='Commented', content='Content', author=self.author,
+                                              publication_date=timezone.now())
+        self.other_article = Article.objects.create(title='Other', content='Content', author=self.author,
+                                                    publication_date=timezone.now())
+        start = timezone.now() - timedelta(days=1)
+        self.comments = [Comment.objects.create(article=self.article, author=self.author,
+                                                content='Comment {}'.format(i),
+                                                publication_date=start + timedelta(minutes=i % 7))
+                         for i in range(12)]
+        Comment.objects.create(article=self.other_article, author=self.author, content='Other comment',
+                               publication_date=start)
+        self.client = Client()
+
+    def test_embedded_comments_are_limited_to_newest(self):
+        response = self.client.get('http://testserver/articles/{}'.format(self.article.id))
+        received_data = json.loads(response.content)
+        newest = sorted(self.comments, key=lambda c: (c.publication_date, c.id), reverse=True)
+        newest = newest[:ArticlesGetSerializer.EMBEDDED_COMMENTS_LIMIT]
+        self.assertEqual([c['content'] for c in received_data['comments']], [c.content for c in newest])
+        self.assertEqual(received_data['comment_count'], 12)
+        self.assertTrue(received_data['comments_url'].endswith('/articles/{}/comments'.format(self.article.id)))
+
+    def test_embedded_comments_are_ranked_per_article(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('http://testserver/articles/')
+        comments = {a['id']: [c['content'] for c in a['comments']]
+                    for a in json.loads(response.content)['results']}
+        newest = sorted(self.comments, key=lambda c: (c.publication_date, c.id), reverse=True)
+        self.assertEqual(comments[self.article.id],
+                         [c.content for c in newest[:ArticlesGetSerializer.EMBEDDED_COMMENTS_LIMIT]])
+        self.assertEqual(comments[self.other_article.id], ['Other comment'])
+        # Comments of the fetched articles are ranked once, no subquery is run per comment row
+        ranked = [query['sql'] for query in queries.captured_queries if 'ROW_NUMBER()' in query['sql']]
+        self.assertEqual(len(ranked), 1)
+        self.assertNotIn('U0', ranked[0])
+
+    def test_comment_count_in_list(self):
+        response = self.client.get('http://testserver/articles/')
+        counts = {a['id']: a['comment_count'] for a in json.loads(response.content)['results']}
+        self.assertEqual(counts, {self.article.id: 12, self.other_article.id: 1})
+
+    def test_comments_endpoint_pages_through_comments_in_publication_order(self):
+        url, contents = 'http://testserver/articles/{}/comments?page_size=5'.format(self.article.id), list()
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            received_data = json.loads(response.content)
+            contents.extend(c['content'] for c in received_data['results'])
+            url = received_data['next']
+        expected = sorted(self.comments, key=lambda c: (c.publication_date, c.id))
+        self.assertEqual(contents, [c.content for c in expected])
+
+    def test_comments_endpoint_query_count_is_constant(self):
+        with self.assertNumQueries(2):
+            self.client.get('http://testserver/articles/{}/comments?page_size=100'.format(self.article.id))
+
+    def test_comments_endpoint_returns_404_for_missing_article(self):
+        response = self.client.get('http://testserver/articles/10000/comments')
+        self.assertEqual(response.status_code, 404)
+
+
+class TagTestCase(APITestCase):
+    def setUp(self):
+        self.redactor_credentials = {'username': 'tag_redactor', 'password': 'password'}
+        user = CustomUser.objects.create_user(**self.redactor_credentials, is_redaction=True)
+        self.author = Author.objects.get(user=user)
+        self.client = Client()
+
+    def create_article(self, title, tags):
+        article = Article.objects.create(title=title, content='Content', author=self.author,
+                                         publication_date=timezone.now())
+        article.tags.add(*Tag.objects.get_or_create_many(tags))
+        return article
+
+    def test_posting_articles_does_not_duplicate_tags(self):
+        self.assertTrue(self.client.login(**self.redactor_credentials))
+        for title in ('First', 'Second'):
+            data = {'title': title, 'content': 'Content', 'tags': ['shared', 'shared', title]}
+            response = self.client.post('http://testserver/articles/', data=json.dumps(data),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ['First', 'Second', 'shared'])
+
+    def test_get_or_create_many_runs_single_query_for_existing_tags(self):
+        Tag.objects.get_or_create_many(['a', 'b'])
+        with self.assertNumQueries(1):
+            tags = Tag.objects.get_or_create_many(['a', 'b'])
+        self.assertEqual(sorted(tag.name for tag in tags), ['a', 'b'])
+
+    def test_tags_filter_matches_any_tag_without_duplicates(self):
+        both = self.create_article('Both', ['python', 'django'])
+        python = self.create_article('Python', ['python'])
+        self.create_article('Other', ['other'])
+        response = self.client.get('http://testserver/articles/?tags=python,django')
+        ids = [article['id'] for article in json.loads(response.content)['results']]
+        self.assertEqual(sorted(ids), sorted([both.id, python.id]))
+
+    def test_tags_all_filter_matches_every_tag(self):
+        both = self.create_article('Both', ['python', 'django'])
+        self.create_article('Python', ['python'])
+        response = self.client.get('http://testserver/articles/?tags_all=python,django')
+        ids = [article['id'] for article in json.loads(response.content)['results']]
+        self.assertEqual(ids, [both.id])
+
+
+class MergeDuplicateTagsMigrationTestCase(TransactionTestCase):
+    migrate_from = [('articles_app', '0001_initial')]
+    migrate_to = [('articles_app', '0003_tag_name_unique')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_tags_are_merged(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('articles_app', 'CustomUser')
+        Author = apps.get_model('articles_app', 'Author')
+        Article = apps.get_model('articles_app', 'Article')
+        Tag = apps.get_model('articles_app', 'Tag')
+        author = Author.objects.create(user=User.objects.create(username='migration_user'))
+        first = Article.objects.create(title='First', content='', author=author, publication_date=date.today())
+        second = Article.objects.create(title='Second', content='', author=author, publication_date=date.today())
+        kept, duplicate, other = (Tag.objects.create(name=name) for name in ('dup', 'dup', 'other'))
+        first.tags.add(kept, duplicate)
+        second.tags.add(duplicate, other)
+
+        apps = self.migrate(self.migrate_to)
+        Article = apps.get_model('articles_app', 'Article')
+        Tag = apps.get_model('articles_app', 'Tag')
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ['dup', 'other'])
+        self.assertEqual(list(Article.objects.get(pk=first.pk).tags.values_list('id', flat=True)), [kept.id])
+        self.assertEqual(sorted(Article.objects.get(pk=second.pk).tags.values_list('id', flat=True)),
+                         sorted([kept.id, other.id]))
+
+
+class ArticleCacheTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.credentials = {'username': 'cache_user', 'password': 'password'}
+        user = CustomUser.objects.create_user(**self.credentials)
+        self.author = Author.objects.get(user=user)
+        self.article = Article.objects.create(title='Cached', content='Content', author=self.author,
+                                              publication_date=timezone.now())
+        self.list_url = 'http://testserver/articles/'
+        self.detail_url = 'http://testserver/articles/{}'.format(self.article.id)
+        self.client = Client()
+
+    def get(self, url):
+        return json.loads(self.client.get(url).content)
+
+    def test_cached_responses_do_not_query_database(self):
+        list_data, detail_data = self.get(self.list_url), self.get(self.detail_url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(self.list_url), list_data)
+        # Only modification time of the article is read
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(self.detail_url), detail_data)
+
+    def test_query_params_are_part_of_cache_key(self):
+        self.get(self.list_url)
+        with self.assertNumQueries(4):
+            self.get(self.list_url + '?page_size=1')
+
+    @override_settings(ALLOWED_HOSTS=['internal.svc', 'api.example.com'])
+    def test_host_and_scheme_are_part_of_cache_key(self):
+        Article.objects.create(title='Second', content='Content', author=self.author, publication_date=timezone.now())
+        internal = self.client.get(self.list_url + '?page_size=1', HTTP_HOST='internal.svc:8000')
+        self.assertTrue(json.loads(internal.content)['next'].startswith('http://internal.svc:8000/'))
+        public = self.client.get(self.list_url + '?page_size=1', HTTP_HOST='api.example.com', secure=True)
+        self.assertNotEqual(public['ETag'], internal['ETag'])
+        page = json.loads(public.content)
+        self.assertTrue(page['next'].startswith('https://api.example.com/'))
+        self.assertTrue(page['results'][0]['comments_url'].startswith('https://api.example.com/'))
+        detail = self.client.get(self.detail_url, HTTP_HOST='api.example.com', secure=True)
+        self.assertTrue(json.loads(detail.content)['comments_url'].startswith('https://api.example.com/'))
+
+    def test_article_change_invalidates_cache(self):
+        self.get(self.list_url), self.get(self.detail_url)
+        self.article.title = 'Changed'
+        self.article.save()
+        self.assertEqual(self.get(self.detail_url)['title'], 'Changed')
+        self.assertEqual(self.get(self.list_url)['results'][0]['title'], 'Changed')
+
+    def test_comment_invalidates_cache(self):
+        self.get(self.list_url), self.get(self.detail_url)
+        self.assertTrue(self.client.login(**self.credentials))
+        self.client.post('http://testserver/articles/{}/comment'.format(self.article.id),
+                         data={'content': 'New comment'})
+        self.assertEqual(self.get(self.detail_url)['comment_count'], 1)
+        self.assertEqual(self.get(self.list_url)['results'][0]['comment_count'], 1)
+
+    def test_tag_changes_invalidate_cache(self):
+        self.get(self.detail_url)
+        tag = Tag.objects.create(name='cached')
+        self.article.tags.add(tag)
+        self.assertEqual(self.get(self.detail_url)['tags'], [{'name': 'cached'}])
+        tag.name = 'renamed'
+        tag.save()
+        self.assertEqual(self.get(self.detail_url)['tags'], [{'name': 'renamed'}])
+        tag.delete()
+        self.assertEqual(self.get(self.detail_url)['tags'], [])
+
+    def test_author_change_invalidates_cache(self):
+        self.get(self.detail_url)
+        self.author.nickname = 'renamed'
+        self.author.save()
+        self.assertEqual(self.get(self.detail_url)['author']['nickname'], 'renamed')
+
+    def test_unrelated_article_change_keeps_detail_cached(self):
+        self.get(self.detail_url)
+        Article.objects.create(title='Other', content='Content', author=self.author, publication_date=timezone.now())
+        with self.assertNumQueries(1):
+            self.get(self.detail_url)
+
+    def test_missing_value_is_computed_once_by_concurrent_requests(self):
+        calls = list()
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = list()
+        threads = [threading.Thread(target=lambda: results.append(get_or_compute('hot', compute)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.credentials = {'username': 'conditional_user', 'password': 'password'}
+        user = CustomUser.objects.create_user(**self.credentials)
+        self.author = Author.objects.get(user=user)
+        self.article = Article.objects.create(title='Conditional', content='Content', author=self.author,
+                                              publication_date=timezone.now())
+        self.list_url = 'http://testserver/articles/'
+        self.detail_url = 'http://testserver/articles/{}'.format(self.article.id)
+        self.client = Client()
+
+    def test_responses_have_validators(self):
+        for url in (self.list_url, self.detail_url):
+            response = self.client.get(url)
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertIn('Last-Modified', response)
+
+    def test_matching_etag_returns_304_without_loading_article(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_matching_list_etag_returns_304_without_queries(self):
+        etag = self.client.get(self.list_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.detail_url)['Last-Modified']
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_query_params(self):
+        self.assertNotEqual(self.client.get(self.list_url)['ETag'],
+                            self.client.get(self.list_url + '?page_size=1')['ETag'])
+
+    def test_new_comment_changes_etags(self):
+        list_etag, detail_etag = self.client.get(self.list_url)['ETag'], self.client.get(self.detail_url)['ETag']
+        updated_at = self.article.updated_at
+        Comment.objects.create(article=self.article, author=self.author, content='Comment',
+                               publication_date=timezone.now())
+        self.assertGreater(Article.objects.get(pk=self.article.pk).updated_at, updated_at)
+        self.assertEqual(self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_tag_change_bumps_modification_time(self):
+        updated_at = self.article.updated_at
+        self.article.tags.add(Tag.objects.create(name='conditional'))
+        self.assertGreater(Article.objects.get(pk=self.article.pk).updated_at, updated_at)
+
+    def test_missing_article_returns_404(self):
+        response = self.client.get('http://testserver/articles/10000', HTTP_IF_NONE_MATCH='"whatever"')
+        self.assertEqual(response.status_code, 404)
+
+
+class ArticleSearchTestCase(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='search_user', password='password')
+        self.author = Author.objects.get(user=user)
+        self.title_match = self.create_article('Python tips', 'Short text about snakes')
+        self.content_match = self.create_article('Snakes', 'Long text which mentions python only once')
+        self.create_article('Unrelated', 'Nothing to see here')
+        self.client = Client()
+
+    def create_article(self, title, content, tags=()):
+        article = Article.objects.create(title=title, content=content, author=self.author,
+                                         publication_date=timezone.now())
+        article.tags.add(*Tag.objects.get_or_create_many(tags))
+        return article
+
+    def search(self, query):
+        response = self.client.get('http://testserver/articles/search?' + query)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_results_are_ranked(self):
+        results = self.search('q=python')['results']
+        self.assertEqual([r['id'] for r in results], [self.title_match.id, self.content_match.id])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+
+    def test_results_have_highlighted_snippets(self):
+        results = self.search('q=python')['results']
+        self.assertIn('<mark>python</mark>', results[1]['snippet'])
+
+    def test_snippets_are_escaped(self):
+        article = self.create_article('Markup', 'Pasted <script>alert(1)</script> python & more')
+        snippet = {r['id']: r['snippet'] for r in self.search('q=python')['results']}[article.id]
+        self.assertIn('&lt;script&gt;', snippet)
+        self.assertIn('<mark>python</mark> &amp; more', snippet)
+        self.assertNotIn('<script>', snippet)
+
+    def test_invalid_cursor_returns_404(self):
+        for position in (['x', '1'], ['1.5', 'x'], [None, '1'], ['nan', '1']):
+            cursor = base64.urlsafe_b64encode(json.dumps({'p': position}).encode('utf-8')).decode('ascii')
+            response = self.client.get('http://testserver/articles/search?q=python&cursor=' + cursor)
+            self.assertEqual(response.status_code, 404)
+
+    def test_search_combines_with_tags_filter(self):
+        tagged = self.create_article('Python tagged', 'Python content', tags=['lang'])
+        results = self.search('q=python&tags=lang')['results']
+        self.assertEqual([r['id'] for r in results], [tagged.id])
+
+    def test_search_is_cursor_paginated(self):
+        expected = [self.create_article('Python {}'.format(i), 'python ' * (i + 1)).id for i in range(7)]
+        expected += [self.title_match.id, self.content_match.id]
+        url, found = 'http://testserver/articles/search?q=python&page_size=2', list()
+        while url:
+            data = json.loads(self.client.get(url).content)
+            found.extend(r['id'] for r in data['results'])
+            url = data['next']
+        self.assertEqual(sorted(found), sorted(expected))
+        self.assertEqual(len(found), len(set(found)))
+
+        first = self.search('q=python&page_size=3')
+        second = json.loads(self.client.get(first['next']).content)
+        back = json.loads(self.client.get(second['previous']).content)
+        self.assertEqual([r['id'] for r in back['results']], [r['id'] for r in first['results']])
+
+    def test_index_follows_article_changes(self):
+        self.content_match.content = 'No longer relevant'
+        self.content_match.save()
+        self.title_match.delete()
+        self.assertEqual(self.search('q=python')['results'], [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('q=%22python%22+OR+*')['results'], [])
+
+    def test_missing_query_returns_400(self):
+        response = self.client.get('http://testserver/articles/search')
+        self.assertEqual(response.status_code, 400)
+
+
+class ArticleImportTestCase(APITestCase):
+    def setUp(self):
+        self.redactor_credentials = {'username': 'import_redactor', 'password': 'password'}
+        user = CustomUser.objects.create_user(**self.redactor_credentials, is_redaction=True)
+        self.redactor = Author.objects.get(user=user)
+        self.commenter = Author.objects.get(user=CustomUser.objects.create_user(username='commenter',
+                                                                                password='password'))
+        self.client = Client()
+
+    def record(self, i, **kwargs):
+        record = {'title': 'Imported {}'.format(i), 'content': 'Content {}'.format(i),
+                  'publication_date': '2019-01-{:02d}'.format(i % 28 + 1), 'tags': ['imported', 'tag{}'.format(i % 3)],
+                  'comments': [{'author': 'commenter', 'content': 'Comment', 'publication_date': '2019-02-01T10:00'}]}
+        record.update(kwargs)
+        return json.dumps(record)
+
+    def post(self, lines):
+        return self.client.post('http://testserver/articles/bulk', data='\n'.join(lines),
+                                content_type='application/x-ndjson')
+
+    def test_bulk_endpoint_imports_articles_with_tags_and_comments(self):
+        self.assertTrue(self.client.login(**self.redactor_credentials))
+        response = self.post([self.record(i) for i in range(7)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'imported': 7, 'failed': 0, 'errors': []})
+
+        articles = Article.objects.filter(title__startswith='Imported')
+        self.assertEqual(articles.count(), 7)
+        self.assertEqual(Tag.objects.filter(name__in=['imported', 'tag0', 'tag1', 'tag2']).count(), 4)
+        article = articles.get(title='Imported 4')
+        self.assertEqual(article.author, self.redactor)
+        self.assertEqual(sorted(article.tags.values_list('name', flat=True)), ['imported', 'tag1'])
+        self.assertEqual(article.comment_set.get().author, self.commenter)
+
+    def test_bulk_endpoint_reports_rejected_rows(self):
+        self.assertTrue(self.client.login(**self.redactor_credentials))
+        lines = [self.record(1), '{not json', self.record(2, title=''), self.record(3, author='commenter'),
+                 self.record(4, comments=[{'author': 'nobody', 'publication_date': '2019-02-01T10:00'}]),
+                 self.record(5)]
+        received_data = json.loads(self.post(lines).content)
+        self.assertEqual(received_data['imported'], 2)
+        self.assertEqual([error['line'] for error in received_data['errors']], [2, 3, 4, 5])
+        self.assertIn('title', received_data['errors'][1]['errors'])
+        self.assertIn('author', received_data['errors'][2]['errors'])
+
+    def test_bulk_endpoint_requires_redaction(self):
+        self.assertTrue(self.client.login(username='commenter', password='password'))
+        self.assertEqual(self.post([self.record(1)]).status_code, 403)
+
+    def test_import_runs_constant_number_of_queries_per_chunk(self):
+        importer = ArticleImporter(default_author=self.redactor, chunk_size=50)
+        with self.assertNumQueries(25):
+            errors = list(importer.import_lines(self.record(i) for i in range(5)))
+        with self.assertNumQueries(25):
+            errors += list(importer.import_lines(self.record(i, tags=['new{}'.format(i)]) for i in range(50)))
+        self.assertEqual(errors, [])
+        self.assertEqual(importer.imported, 55)
+
+    def test_import_resolves_ids_by_import_key(self):
+        # Backends other than SQLite which do not return ids of bulk inserted rows
+        Article.objects.create(title='Concurrent', content='Content', author=self.redactor,
+                               publication_date=date(2019, 1, 1))
+        importer = ArticleImporter(default_author=self.redactor, chunk_size=50)
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            errors = list(importer.import_lines(self.record(i, tags=['key{}'.format(i)]) for i in range(5)))
+        self.assertEqual(errors, [])
+        for i in range(5):
+            article = Article.objects.get(title='Imported {}'.format(i))
+            self.assertIsNotNone(article.import_key)
+            self.assertEqual(list(article.tags.values_list('name', flat=True)), ['key{}'.format(i)])
+            self.assertEqual(article.comment_set.count(), 1)
+            self.assertTrue(Change.objects.filter(kind=Change.ARTICLE, object_id=article.id,
+                                                  action=Change.CREATE).exists())
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as source:
+            source.write('\n'.join([self.record(1), self.record(2, author='nobody'), self.record(3)]))
+        stdout, stderr = io.StringIO(), io.StringIO()
+        try:
+            call_command('import_articles', source.name, author='import_redactor', chunk_size=2,
+                         stdout=stdout, stderr=stderr)
+        finally:
+            os.unlink(source.name)
+        self.assertIn('Imported 2 articles, rejected 1', stdout.getvalue())
+        self.assertEqual(json.loads(stderr.getvalue())['line'], 2)
+        self.assertEqual(Article.objects.filter(title__startswith='Imported').count(), 2)
+
+
+class ArticleExportTestCase(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='export_user', password='password')
+        self.author = Author.objects.get(user=user)
+        self.author.nickname = 'exporter'
+        self.author.save()
+        self.articles = list()
+        for i in range(5):
+            article = Article.objects.create(title='Export {}'.format(i), content='Content, "quoted" {}'.format(i),
+                                             author=self.author, publication_date=date(2019, 1, i + 1))
+            article.tags.add(*Tag.objects.get_or_create_many(['export', 'odd' if i % 2 else 'even']))
+            self.articles.append(article)
+        self.client = Client()
+
+    def export(self, query=''):
+        response = self.client.get('http://testserver/articles/export?' + query)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_export(self):
+        lines = [json.loads(line) for line in self.export('format=ndjson').splitlines()]
+        self.assertEqual([line['id'] for line in lines], [article.id for article in self.articles])
+        self.assertEqual(lines[1]['tags'], ['export', 'odd'])
+        self.assertEqual(lines[1]['author']['nickname'], 'exporter')
+        self.assertEqual(lines[1]['publication_date'], '2019-01-02')
+
+    def test_csv_export(self):
+        rows = list(csv.reader(io.StringIO(self.export('format=csv'))))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'content'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][2], self.articles[0].content)
+        self.assertEqual(rows[1][6], 'even,export')
+
+    def test_export_filters_and_resume(self):
+        ids = [json.loads(line)['id'] for line in self.export('format=ndjson&tags=odd').splitlines()]
+        self.assertEqual(ids, [self.articles[1].id, self.articles[3].id])
+
+        ids = [json.loads(line)['id'] for line in
+               self.export('format=ndjson&after={}'.format(self.articles[2].id)).splitlines()]
+        self.assertEqual(ids, [self.articles[3].id, self.articles[4].id])
+
+        Article.objects.filter(pk=self.articles[0].pk).update(updated_at=timezone.now() - timedelta(days=3))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        ids = [json.loads(line)['id'] for line in self.export('format=ndjson&since=' + since).splitlines()]
+        self.assertEqual(ids, [article.id for article in self.articles[1:]])
+
+    def test_invalid_since_returns_400(self):
+        response = self.client.get('http://testserver/articles/export?format=ndjson&since=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_queries_per_chunk(self):
+        # One query for rows and one for authors and one for tags of every chunk
+        self.assertEqual(len(list(export_articles(Article.objects.all(), chunk_size=2))), 5)
+        with self.assertNumQueries(7):
+            list(export_articles(Article.objects.all(), chunk_size=2))
+
+    def test_export_command(self):
+        stdout = io.StringIO()
+        call_command('export_articles', format='ndjson', tags='even', stdout=stdout)
+        ids = [json.loads(line)['id'] for line in stdout.getvalue().splitlines()]
+        self.assertEqual(ids, [self.articles[0].id, self.articles[2].id, self.articles[4].id])
+
+
+class SparseFieldsTestCase(APITestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username='sparse_user', password='password')
+        self.author = Author.objects.get(user=user)
+        self.article = Article.objects.create(title='Sparse', content='word ' * 100, author=self.author,
+                                              publication_date=timezone.now())
+        self.article.tags.add(*Tag.objects.get_or_create_many(['sparse']))
+        Comment.objects.create(article=self.article, author=self.author, content='Comment',
+                               publication_date=timezone.now())
+        self.client = Client()
+
+    def get(self, query, pk=None):
+        url = 'http://testserver/articles/{}'.format(pk) if pk else 'http://testserver/articles/'
+        return self.client.get(url + '?' + query)
+
+    def test_excerpt_is_precomputed(self):
+        self.assertLessEqual(len(self.article.excerpt), 280)
+        self.assertTrue(self.article.excerpt.endswith('…'))
+        self.article.content = 'Short'
+        self.article.save()
+        self.assertEqual(Article.objects.get(pk=self.article.pk).excerpt, 'Short')
+
+    def test_fields_selects_fields(self):
+        response = self.get('fields=id,title', pk=self.article.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'id': self.article.id, 'title': 'Sparse'})
+
+        results = json.loads(self.get('fields=id,rating').content)['results']
+        self.assertEqual(results, [{'id': self.article.id, 'rating': 0}])
+
+    def test_exclude_removes_fields(self):
+        data = json.loads(self.get('exclude=content,comments', pk=self.article.id).content)
+        self.assertNotIn('content', data)
+        self.assertNotIn('comments', data)
+        self.assertEqual(data['comment_count'], 1)
+
+    def test_summary_view(self):
+        results = json.loads(self.get('view=summary').content)['results']
+        self.assertEqual(results[0]['excerpt'], self.article.excerpt)
+        self.assertNotIn('content', results[0])
+        self.assertNotIn('comments', results[0])
+        self.assertEqual(results[0]['tags'], [{'name': 'sparse'}])
+
+    def test_unselected_text_is_not_loaded(self):
+        fields = ArticlesGetSerializer.select_fields(base=ArticlesGetSerializer.summary_fields)
+        article = plan_queryset(Article.objects.all(), ArticlesGetSerializer, fields).get(pk=self.article.pk)
+        self.assertIn('content', article.get_deferred_fields())
+        self.assertNotIn('excerpt', article.get_deferred_fields())
+        # Count, articles and tags, summary view drops the comment prefetch
+        with self.assertNumQueries(3):
+            self.get('view=summary')
+
+    def test_invalid_selection_returns_400(self):
+        self.assertEqual(self.get('fields=id,password').status_code, 400)
+        self.assertEqual(self.get('exclude=secret', pk=self.article.id).status_code, 400)
+        self.assertEqual(self.get('view=compact').status_code, 400)
+
+
+class CompiledRepresentationTestCase(APITestCase):
+    """
+    Compiled representation must render to exactly the same bytes as field by field serialization
+    """
+
+    def setUp(self):
+        users = [CustomUser.objects.create_user(username='golden_user{}'.format(i), password='password')
+                 for i in range(2)]
+        self.authors = [Author.objects.get(user=user) for user in users]
+        self.authors[1].nickname = 'Zażółć "gęślą" jaźń'
+        self.authors[1].save()
+        for i in range(4):
+            article = Article.objects.create(title='Golden {} <&>'.format(i), content='Golden content ' * (i * 30),
+                                             author=self.authors[i % 2], rating=i - 2,
+                                             publication_date=date(2019, 2, i + 1))
+            article.tags.add(*Tag.objects.get_or_create_many(['golden{}'.format(j) for j in range(i)]))
+            for j in range(i * 3):
+                Comment.objects.create(article=article, author=self.authors[j % 2], content='Comment {}'.format(j),
+                                       publication_date=timezone.now() - timedelta(minutes=j))
+        request = APIRequestFactory().get('/articles/')
+        self.context = {'request': Request(request)}
+
+    def assertSameBytes(self, serializer_class, articles, fields=None):
+        serializer = serializer_class(fields=fields, context=self.context)
+        compiled = [serializer.to_representation(article) for article in articles]
+        reference = [Serializer.to_representation(serializer, article) for article in articles]
+        self.assertEqual(JSONRenderer().render(compiled), JSONRenderer().render(reference))
+        self.assertEqual(JSONRenderer().render(serializer_class(articles, many=True, fields=fields,
+                                                                context=self.context).data),
+                         JSONRenderer().render(reference))
+
+    def test_planned_articles(self):
+        self.assertSameBytes(ArticlesGetSerializer, list(plan_queryset(Article.objects.all(), ArticlesGetSerializer)))
+
+    def test_articles_without_plan(self):
+        self.assertSameBytes(ArticlesGetSerializer, list(Article.objects.all()))
+
+    def test_sparse_fields(self):
+        for fields in (ArticlesGetSerializer.summary_fields, ['id', 'comments_url'], ['comments', 'rating']):
+            articles = list(plan_queryset(Article.objects.all(), ArticlesGetSerializer, fields))
+            self.assertSameBytes(ArticlesGetSerializer, articles, fields)
+
+    def test_search_results(self):
+        articles = list(plan_queryset(Article.objects.all(), ArticleSearchResultSerializer))
+        for article in articles:
+            article.rank, article.snippet = 1.5 / article.id, '<mark>Golden</mark> content'
+        self.assertSameBytes(ArticleSearchResultSerializer, articles)
+
+    def test_benchmark_command(self):
+        stdout = io.StringIO()
+        count = Article.objects.count()
+        call_command('bench_serializers', articles=3, repeat=1, stdout=stdout)
+        self.assertIn('compiled', stdout.getvalue())
+        self.assertIn('speedup', stdout.getvalue())
+        self.assertEqual(Article.objects.count(), count)
+
+
+class ArticleVoteTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        rating_buffer.flush()
+        self.users = [CustomUser.objects.create_user(username='vote_user{}'.format(i), password='password')
+                      for i in range(3)]
+        author = Author.objects.get(user=self.users[0])
+        self.articles = [Article.objects.create(title='Vote {}'.format(i), content='Content', author=author,
+                                                publication_date=date(2019, 3, i + 1)) for i in range(4)]
+        self.interval = mock.patch.object(rating_buffer, 'flush_interval', 3600)
+        self.interval.start()
+        self.client = Client()
+
+    def tearDown(self):
+        self.interval.stop()
+
+    def vote(self, user, article, value):
+        self.client.force_login(user)
+        return self.client.post('http://testserver/articles/{}/vote'.format(article.id), {'value': value})
+
+    def rating(self, article):
+        rating_buffer.flush()
+        return Article.objects.get(pk=article.pk).rating
+
+    def test_one_vote_per_author(self):
+        self.assertEqual(self.vote(self.users[0], self.articles[0], 1).status_code, 201)
+        self.assertEqual(self.vote(self.users[1], self.articles[0], 1).status_code, 201)
+        self.assertEqual(rating_buffer.get_pending(self.articles[0].id), 2)
+        self.assertEqual(self.rating(self.articles[0]), 2)
+
+        response = self.vote(self.users[0], self.articles[0], 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.rating(self.articles[0]), 2)
+
+        response = self.vote(self.users[0], self.articles[0], -1)
+        self.assertEqual(json.loads(response.content), {'value': -1})
+        self.assertEqual(self.rating(self.articles[0]), 0)
+        self.assertEqual(Vote.objects.filter(article=self.articles[0]).count(), 2)
+
+    def test_invalid_votes(self):
+        self.assertEqual(self.vote(self.users[0], self.articles[0], 2).status_code, 400)
+        response = self.vote(self.users[0], Article(id=self.articles[-1].id + 1), 1)
+        self.assertEqual(response.status_code, 404)
+        self.client.logout()
+        response = self.client.post('http://testserver/articles/{}/vote'.format(self.articles[0].id), {'value': 1})
+        self.assertEqual(response.status_code, 403)
+
+    def test_flush_runs_single_update(self):
+        for i, article in enumerate(self.articles):
+            for _ in range(i + 1):
+                rating_buffer.add(article.id, 1)
+        rating_buffer.add(self.articles[0].id, -1)
+        updated_at = Article.objects.get(pk=self.articles[0].pk).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rating_buffer.flush(), 3)
+        # The change log entries are the only other statement
+        statements = [query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(statements, ['UPDATE', 'INSERT'])
+        self.assertEqual([self.rating(article) for article in self.articles], [0, 2, 3, 4])
+        self.assertGreater(Article.objects.get(pk=self.articles[1].pk).updated_at, updated_at)
+
+    def test_flush_size(self):
+        with mock.patch.object(rating_buffer, 'flush_size', 2):
+            rating_buffer.add(self.articles[0].id, 1)
+            self.assertEqual(Article.objects.get(pk=self.articles[0].pk).rating, 0)
+            rating_buffer.add(self.articles[1].id, 1)
+            self.assertEqual(Article.objects.filter(rating=1).count(), 2)
+
+    def test_failed_flush_does_not_fail_vote(self):
+        with mock.patch.object(rating_buffer, 'flush_size', 1), \
+                mock.patch.object(rating_buffer, '_update', side_effect=OperationalError('database is locked')), \
+                self.assertLogs('articles_app.counters', 'ERROR'):
+            self.assertEqual(self.vote(self.users[0], self.articles[0], 1).status_code, 201)
+        self.assertEqual(Vote.objects.filter(article=self.articles[0]).count(), 1)
+        self.assertEqual(rating_buffer.get_pending(self.articles[0].id), 1)
+        self.assertEqual(self.rating(self.articles[0]), 1)
+
+    def test_flush_invalidates_cached_payloads(self):
+        url = 'http://testserver/articles/{}'.format(self.articles[0].id)
+        self.assertEqual(json.loads(self.client.get(url).content)['rating'], 0)
+        self.vote(self.users[0], self.articles[0], 1)
+        rating_buffer.flush()
+        self.assertEqual(json.loads(self.client.get(url).content)['rating'], 1)
+
+    def test_ordering_by_rating(self):
+        for article, rating in zip(self.articles, (2, -1, 5, 2)):
+            rating_buffer.add(article.id, rating)
+        rating_buffer.flush()
+        response = self.client.get('http://testserver/articles/?ordering=-rating&page_size=2')
+        data = json.loads(response.content)
+        ids = [article['id'] for article in data['results']]
+        data = json.loads(self.client.get(data['next']).content)
+        ids += [article['id'] for article in data['results']]
+        self.assertEqual(ids, [self.articles[i].id for i in (2, 3, 0, 1)])
+
+        response = self.client.get('http://testserver/articles/?ordering=-rating&page=1&page_size=2')
+        self.assertEqual([article['id'] for article in json.loads(response.content)['results']],
+                         [self.articles[2].id, self.articles[3].id])
+        self.assertEqual(self.client.get('http://testserver/articles/?ordering=title').status_code, 400)
+
+
+class ConcurrentVoteTestCase(TransactionTestCase):
+    def setUp(self):
+        rating_buffer.flush()
+        self.authors = [Author.objects.get(user=CustomUser.objects.create_user(username='concurrent{}'.format(i)))
+                        for i in range(8)]
+        self.article = Article.objects.create(title='Concurrent', content='Content', author=self.authors[0],
+                                              publication_date=date(2019, 3, 1))
+
+    def run_threads(self, targets):
+        errors = list()
+
+        def run(target):
+            try:
+                for attempt in range(50):
+                    try:
+                        return target()
+                    except OperationalError as e:
+                        # Shared cache in-memory SQLite test database fails instead of waiting for table locks,
+                        # failed transactions are rolled back so they are simply retried
+                        if 'locked' not in str(e):
+                            raise
+                        time.sleep(0.01)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_votes(self):
+        def vote(author, value):
+            return lambda: cast_vote(self.article.id, author, value)
+
+        with mock.patch.object(rating_buffer, 'flush_size', 3):
+            self.run_threads([vote(author, 1 if i % 4 else -1) for i, author in enumerate(self.authors)])
+            # Every author changes their mind at the same time
+            self.run_threads([vote(author, -1 if i % 4 else 1) for i, author in enumerate(self.authors)])
+        rating_buffer.flush()
+        self.assertEqual(Vote.objects.filter(article=self.article).count(), 8)
+        self.assertEqual(Article.objects.get(pk=self.article.pk).rating, -4)
+
+    def test_parallel_increments(self):
+        def increment():
+            for _ in range(200):
+                rating_buffer.add(self.article.id, 1)
+
+        with mock.patch.object(rating_buffer, 'flush_size', 7):
+            self.run_threads([increment] * 8)
+        rating_buffer.flush()
+        self.assertEqual(Article.objects.get(pk=self.article.pk).rating, 1600)
+
+
+class TokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = CustomUser.objects.create_user(username='token_user', password='password', is_redaction=True)
+        self.client = Client()
+        credentials = base64.b64encode(b'token_user:password').decode('ascii')
+        response = self.client.post('http://testserver/articles/token', HTTP_AUTHORIZATION='Basic ' + credentials)
+        self.assertEqual(response.status_code, 201)
+        self.key = json.loads(response.content)['token']
+        self.headers = {'HTTP_AUTHORIZATION': 'Token ' + self.key}
+
+    def post_article(self, **headers):
+        return self.client.post('http://testserver/articles/', json.dumps({'title': 'Token', 'content': 'Content', 'tags': []}),
+                                content_type='application/json', **headers)
+
+    def test_token_authenticates_requests(self):
+        self.assertEqual(self.post_article(**self.headers).status_code, 201)
+        self.assertEqual(Article.objects.get(title='Token').author.user, self.user)
+        self.assertEqual(self.post_article(HTTP_AUTHORIZATION='Token invalid').status_code, 403)
+
+    def test_principal_is_cached(self):
+        authentication = CachedTokenAuthentication()
+        with self.assertNumQueries(1):
+            user, _ = authentication.authenticate_credentials(self.key)
+            self.assertEqual(get_author_data_related_to_user(user).user_id, self.user.id)
+        with self.assertNumQueries(0):
+            user, _ = authentication.authenticate_credentials(self.key)
+            get_author_data_related_to_user(user)
+
+    def test_password_hash_is_not_cached(self):
+        CachedTokenAuthentication().authenticate_credentials(self.key)
+        cached_user, cached_token = get_cache().get(token_cache_key(self.key))
+        self.assertNotIn('password', cached_user.__dict__)
+        self.assertNotIn('password', cached_token.user.__dict__)
+
+        user, _ = CachedTokenAuthentication().authenticate_credentials(self.key)
+        user.first_name = 'Cached'
+        user.save()
+        user = CustomUser.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Cached')
+        self.assertTrue(user.check_password('password'))
+
+    def test_revoke_invalidates_cached_token(self):
+        self.assertEqual(self.post_article(**self.headers).status_code, 201)
+        response = self.client.delete('http://testserver/articles/token', **self.headers)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.post_article(**self.headers).status_code, 403)
+
+    def test_user_and_author_changes_invalidate_cached_token(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.key)
+        author = Author.objects.get(user=self.user)
+        author.nickname = 'changed'
+        author.save()
+        user, _ = authentication.authenticate_credentials(self.key)
+        self.assertEqual(get_author_data_related_to_user(user).nickname, 'changed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.post_article(**self.headers).status_code, 403)
+
+    def test_issuing_again_returns_same_token(self):
+        response = self.client.post('http://testserver/articles/token', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['token'], self.key)
+
+
+@override_settings(ARTICLES_INSTRUMENTATION=True, ARTICLES_SLOW_REQUEST_MS=60000)
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        user = CustomUser.objects.create_user(username='instrumented_user', password='password')
+        author = Author.objects.get(user=user)
+        self.article = Article.objects.create(title='Instrumented', content='Content', author=author,
+                                              publication_date=date(2019, 4, 1))
+        self.client = Client()
+
+    def server_timing(self, response):
+        return dict((metric.split(';')[0], metric) for metric in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        with self.assertLogs('articles_app.instrumentation', 'INFO') as logs:
+            response = self.client.get('http://testserver/articles/')
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'sql', 'serialize', 'render', 'total'})
+        self.assertIn('desc="4 queries"', timing['sql'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], '/articles/')
+        self.assertEqual(record['queries'], 4)
+        self.assertNotIn('statements', record)
+
+    def test_slow_requests_are_logged_with_query_plans(self):
+        with override_settings(ARTICLES_SLOW_REQUEST_MS=0), \
+                self.assertLogs('articles_app.instrumentation', 'WARNING') as logs:
+            Client().get('http://testserver/articles/{}'.format(self.article.id))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record['slow'])
+        self.assertTrue(record['statements'])
+        selects = [statement for statement in record['statements'] if statement['sql'].startswith('SELECT')]
+        self.assertTrue(all(statement['plan'] for statement in selects))
+
+    def test_disabled_instrumentation_is_not_installed(self):
+        with override_settings(ARTICLES_INSTRUMENTATION=False):
+            response = Client().get('http://testserver/articles/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class BenchmarkTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+
+    def test_compare_reports_regressions(self):
+        baseline = {'scenarios': {'list': {'p50_ms': 2.0, 'p95_ms': 4.0, 'p99_ms': 8.0, 'queries_per_request': 3,
+                                           'throughput_rps': 400}}}
+        report = {'scenarios': {'list': {'p50_ms': 2.2, 'p95_ms': 6.0, 'p99_ms': 8.0, 'queries_per_request': 4,
+                                         'throughput_rps': 250}, 'detail': {}}}
+        self.assertEqual(compare(report, baseline, 0.2), [('list', 'p95_ms', 4.0, 6.0),
+                                                          ('list', 'queries_per_request', 3, 4),
+                                                          ('list', 'throughput_rps', 400, 250)])
+
+    def leftovers(self):
+        counts = {model.__name__: model.objects.count() for model in (Article, Comment, Tag, CustomUser, Vote,
+                                                                      ArticleTrend)}
+        counts['Change'] = Change.objects.exclude(action=Change.DELETE).count()
+        return counts
+
+    def test_bench_command(self):
+        articles = Article.objects.count()
+        before = self.leftovers()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            call_command('bench', articles=6, authors=2, requests=3, warmup=1, output=output, stdout=io.StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+            self.assertEqual(set(report['scenarios']), {'list', 'tagged_list', 'detail', 'comment_post',
+                                                        'article_post'})
+            self.assertTrue(all(scenario['errors'] == 0 for scenario in report['scenarios'].values()))
+            self.assertEqual(Article.objects.count(), articles)
+            self.assertEqual(self.leftovers(), before)
+            # Clients which read the log during the run learn about the deletes
+            deleted = Change.objects.filter(action=Change.DELETE)
+            self.assertTrue(deleted.filter(kind=Change.ARTICLE).exists())
+            self.assertTrue(deleted.filter(kind=Change.COMMENT).exists())
+            self.assertFalse(deleted.filter(kind=Change.ARTICLE, object_id__in=Article.objects.all()).exists())
+
+            for scenario in report['scenarios'].values():
+                scenario['p95_ms'] = scenario['p50_ms'] = scenario['p99_ms'] = 0.001
+            with open(output, 'w') as report_file:
+                json.dump(report, report_file)
+            with self.assertRaises(CommandError):
+                call_command('bench', articles=6, authors=2, requests=3, scenarios='detail', baseline=output,
+                             stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class ReplicaPoolTestCase(APITestCase):
+    def test_unhealthy_and_lagging_replicas_are_skipped(self):
+        lags = {'fresh': 0, 'lagging': 30}
+        calls = list()
+
+        def lag(alias):
+            calls.append(alias)
+            if alias not in lags:
+                raise OperationalError('connection refused')
+            return lags[alias]
+
+        pool = ReplicaPool(['fresh', 'lagging', 'down'], max_lag=10, check_interval=60, lag=lag)
+        self.assertEqual({pool.choose() for _ in range(10)}, {'fresh'})
+        self.assertEqual(sorted(calls), ['down', 'fresh', 'lagging'])
+
+        lags['fresh'] = 20
+        self.assertEqual(pool.choose(), 'fresh')
+        pool.check_interval = 0
+        self.assertIsNone(pool.choose())
+
+
+@override_settings(ARTICLES_READ_REPLICAS=['replica'], ARTICLES_REPLICA_CHECK_INTERVAL=0)
+class ReplicaRouterTestCase(TransactionTestCase):
+    """
+    Two SQLite databases stand in for the primary and the replica, each holds a different article
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        self.directory = tempfile.TemporaryDirectory()
+        connections.databases['replica'] = {'ENGINE': 'django.db.backends.sqlite3',
+                                            'NAME': os.path.join(self.directory.name, 'replica.sqlite3')}
+        call_command('migrate', database='replica', verbosity=0)
+
+        for alias in ('default', 'replica'):
+            user = CustomUser.objects.db_manager(alias).create_user(username='router_user', password='password')
+            Article.objects.using(alias).create(title='{} article'.format(alias), content='Content',
+                                                author=Author.objects.using(alias).get(user=user),
+                                                publication_date=date(2019, 5, 1))
+        self.primary_user = CustomUser.objects.get(username='router_user')
+        self.client = Client()
+
+    def tearDown(self):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        self.directory.cleanup()
+
+    def titles(self):
+        get_cache().clear()
+        return [article['title'] for article in json.loads(self.client.get('http://testserver/articles/').content)
+                ['results']]
+
+    def cached_titles(self, client):
+        return [article['title'] for article in json.loads(client.get('http://testserver/articles/').content)
+                ['results']]
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.titles(), ['replica article'])
+        article = Article.objects.using('replica').get()
+        response = self.client.get('http://testserver/articles/{}/comments'.format(article.id))
+        self.assertEqual(response.status_code, 200)
+
+    def test_client_reads_own_writes(self):
+        self.client.force_login(self.primary_user)
+        article = Article.objects.get()
+        response = self.client.post('http://testserver/articles/{}/comment'.format(article.id), {'content': 'Hi'})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('articles_primary', response.cookies)
+        self.assertEqual(self.titles(), ['default article'])
+
+        self.assertEqual(Client().get('http://testserver/articles/').status_code, 200)
+        self.client.cookies.pop('articles_primary')
+        self.assertEqual(self.titles(), ['replica article'])
+
+    def test_lagging_replica_does_not_fill_cache_after_write(self):
+        # The replica never receives the article written to the primary, it lags behind that write
+        Article.objects.create(title='written article', content='Content', author=self.primary_user.author,
+                               publication_date=date(2019, 5, 2))
+        self.assertEqual(self.cached_titles(self.client), ['replica article'])
+        self.assertNotIn('ETag', self.client.get('http://testserver/articles/'))
+        with override_settings(ARTICLES_READ_REPLICAS=[]):
+            self.assertEqual(self.cached_titles(Client()), ['written article', 'default article'])
+
+        # Once the write is older than the allowed lag, replica responses are cached again
+        get_cache().clear()
+        with override_settings(ARTICLES_REPLICA_MAX_LAG=0):
+            self.assertEqual(self.cached_titles(self.client), ['replica article'])
+        with override_settings(ARTICLES_READ_REPLICAS=[]):
+            self.assertEqual(self.cached_titles(Client()), ['replica article'])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        with override_settings(ARTICLES_REPLICA_MAX_LAG=-1):
+            self.assertEqual(self.titles(), ['default article'])
+        with mock.patch.object(connections['replica'], 'ensure_connection',
+                               side_effect=OperationalError('unable to open database file')):
+            self.assertEqual(self.titles(), ['default article'])
+        self.assertEqual(self.titles(), ['replica article'])
+
+
+class ASGIHandlerTestCase(TransactionTestCase):
+    """
+    Requests are handled by the pool threads of the handler, so the data has to be committed
+    """
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = CustomUser.objects.create_user(username='asgi_user', password='password', is_redaction=True)
+        self.article = Article.objects.create(title='ASGI article', content='Content', author=self.user.author,
+                                              publication_date=date(2019, 5, 1))
+        self.application = ASGIHandler(max_workers=2)
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.application.executor.shutdown()
+
+    def request(self, method, path, body=b'', headers=(), chunk_size=None):
+        chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] if chunk_size else [body]
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                    for i, chunk in enumerate(chunks)]
+        sent = list()
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        path, _, query = path.partition('?')
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+                 'headers': [(b'host', b'testserver')] + list(headers)}
+        self.loop.run_until_complete(self.application(scope, receive, send))
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertFalse(sent[-1].get('more_body', False))
+        return sent[0]['status'], dict(sent[0]['headers']), b''.join(message['body'] for message in sent[1:])
+
+    def test_get(self):
+        status, headers, body = self.request('GET', '/articles/?fields=id,title')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(json.loads(body)['results'], [{'id': self.article.id, 'title': 'ASGI article'}])
+
+    def test_post_body_in_chunks(self):
+        credentials = base64.b64encode(b'asgi_user:password')
+        body = json.dumps({'content': 'Comment sent over ASGI'}).encode()
+        status, _, _ = self.request('POST', '/articles/{}/comment'.format(self.article.id), body,
+                                    headers=[(b'content-type', b'application/json'),
+                                             (b'content-length', str(len(body)).encode()),
+                                             (b'authorization', b'Basic ' + credentials)],
+                                    chunk_size=7)
+        self.assertEqual(status, 201)
+        self.assertEqual(Comment.objects.get().content, 'Comment sent over ASGI')
+
+    def test_streaming_response(self):
+        for i in range(30):
+            Article.objects.create(title='Streamed {}'.format(i), content='Content', author=self.user.author,
+                                   publication_date=date(2019, 5, 1))
+        self.client.force_login(self.user)
+        session = self.client.cookies['sessionid'].value
+        status, _, body = self.request('GET', '/articles/export?format=csv',
+                                       headers=[(b'cookie', 'sessionid={}'.format(session).encode())])
+        self.assertEqual(status, 200)
+        self.assertEqual(len(list(csv.reader(io.StringIO(body.decode())))), 32)
+
+    def test_disconnect_before_body(self):
+        sent = list()
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/articles/', 'headers': []}
+        self.loop.run_until_complete(self.application(scope, receive, send))
+        self.assertEqual(sent, [])
+
+    def test_lifespan_flushes_counters(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = list()
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        with mock.patch('articles_app.asgi.flush_all') as flush_all:
+            self.loop.run_until_complete(self.application({'type': 'lifespan'}, receive, send))
+        flush_all.assert_called_once_with()
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+    def test_bench_asgi_command(self):
+        output = io.StringIO()
+        call_command('bench_asgi', connections=6, workers=2, client_delay=0.01, articles=3, stdout=output)
+        report = json.loads(output.getvalue())
+        for deployment in ('wsgi', 'asgi'):
+            self.assertEqual(report[deployment]['errors'], 0)
+        self.assertFalse(CustomUser.objects.filter(username__startswith='bench_').exists())
+        self.assertEqual(Article.objects.count(), 1)
+        self.assertFalse(Tag.objects.filter(name__startswith='bench').exists())
+        self.assertFalse(ArticleTrend.objects.exclude(article_id__in=Article.objects.all()).exists())
+        self.assertFalse(Change.objects.exclude(action=Change.DELETE)
+                         .exclude(kind=Change.ARTICLE, object_id__in=Article.objects.all()).exists())
+
+
+class FastJSONRendererTestCase(APITestCase):
+    data = {
+        'datetime': datetime(2019, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        'date': date(2019, 5, 1),
+        'time': day_time(8, 15, 30, 250000),
+        'duration': timedelta(minutes=90),
+        'decimal': Decimal('4.50'),
+        'uuid': uuid.UUID('12345678123456781234567812345678'),
+        'lazy': gettext_lazy('Lazy text'),
+        'separators': 'line\u2028paragraph\u2029 ąę',
+        'nested': [{'id': 1, 'tags': ('a', 'b')}, None, True, 1.5],
+        'big': 2 ** 70,
+    }
+    floats = [0.1, 100.0, -0.0, 0.0001, 123456789012345.6, 1e-06, 1.5e-05, 1e+16, 1.23e+16, 5e-324,
+              1.7976931348623157e+308, 'not a float 3e5']
+
+    def assertRendersLikeDRF(self, data, media_type=None):
+        for backend in ('orjson', 'json'):
+            with override_settings(ARTICLES_JSON_BACKEND=backend):
+                self.assertEqual(FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_output_matches_drf(self):
+        self.assertRendersLikeDRF(self.data)
+        data = dict(self.data)
+        del data['big']
+        self.assertRendersLikeDRF(data)
+        self.assertRendersLikeDRF(data, 'application/json; indent=4')
+        self.assertRendersLikeDRF(None)
+
+    def test_floats_match_drf(self):
+        self.assertRendersLikeDRF(self.floats)
+        for value in self.floats:
+            self.assertRendersLikeDRF({'value': value})
+
+    @skipUnless(orjson, 'orjson is not installed')
+    def test_orjson_is_used(self):
+        with mock.patch('articles_app.renderers.orjson.dumps', wraps=orjson.dumps) as dumps:
+            FastJSONRenderer().render({'id': 1})
+            with override_settings(ARTICLES_JSON_BACKEND='json'):
+                FastJSONRenderer().render({'id': 1})
+        self.assertEqual(dumps.call_count, 1)
+
+    def test_api_responses(self):
+        user = CustomUser.objects.create_user(username='renderer_user', password='password')
+        Article.objects.create(title='Rendered', content='Content', author=user.author,
+                               publication_date=date(2019, 5, 1))
+        response = self.client.get('http://testserver/articles/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_bench_render_command(self):
+        output = io.StringIO()
+        call_command('bench_render', articles=3, comments_per_article=2, repeat=1, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(list(report['pages']), ['list_summary', 'list_full', 'detail'])
+        for page in report['pages'].values():
+            self.assertLess(page['gzip_bytes'], page['identity_bytes'])
+        self.assertFalse(Article.objects.exists())
+
+
+@override_settings(ARTICLES_COMPRESSION_MIN_SIZE=200)
+class CompressionTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = CustomUser.objects.create_user(username='compression_user', password='password')
+        for i in range(5):
+            Article.objects.create(title='Compressed {}'.format(i), content='Compressible content ' * 20,
+                                   author=self.user.author, publication_date=date(2019, 5, 1))
+        self.client = Client()
+
+    def test_negotiate(self):
+        codings = ('br', 'gzip')
+        self.assertEqual(negotiate('gzip, deflate, br', codings), 'br')
+        self.assertEqual(negotiate('gzip;q=1.0, br;q=0.5', codings), 'gzip')
+        self.assertEqual(negotiate('br;q=0, *', codings), 'gzip')
+        self.assertEqual(negotiate('identity', codings), None)
+        self.assertEqual(negotiate('', codings), None)
+        self.assertEqual(negotiate('gzip;q=0', codings), None)
+
+    def test_gzip(self):
+        plain = self.client.get('http://testserver/articles/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('http://testserver/articles/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        revalidated = self.client.get('http://testserver/articles/', HTTP_ACCEPT_ENCODING='gzip',
+                                      HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    @skipUnless(brotli, 'brotli is not installed')
+    def test_brotli(self):
+        plain = self.client.get('http://testserver/articles/')
+        response = self.client.get('http://testserver/articles/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_small_responses_are_not_compressed(self):
+        article = Article.objects.first()
+        with override_settings(ARTICLES_COMPRESSION_MIN_SIZE=100000):
+            response = self.client.get('http://testserver/articles/{}'.format(article.id),
+                                       HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+
+    @override_settings(ARTICLES_COMPRESSION_FLUSH_SIZE=1)
+    def test_streaming_response(self):
+        self.client.force_login(self.user)
+        plain = b''.join(self.client.get('http://testserver/articles/export').streaming_content)
+        response = self.client.get('http://testserver/articles/export', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual(gzip.decompress(b''.join(chunks)), plain)
+
+
+class ArticleViewsTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        views_buffer.flush()
+        self.user = CustomUser.objects.create_user(username='views_user', password='password', is_redaction=True)
+        self.articles = [Article.objects.create(title='Viewed {}'.format(i), content='Content',
+                                                author=self.user.author, publication_date=date(2019, 4, i + 1))
+                         for i in range(4)]
+        self.interval = mock.patch.object(views_buffer, 'flush_interval', 3600)
+        self.interval.start()
+        self.client = Client()
+
+    def tearDown(self):
+        self.interval.stop()
+        views_buffer.flush()
+
+    def view(self, article, **headers):
+        return self.client.get('http://testserver/articles/{}'.format(article.id), **headers)
+
+    def views(self, article):
+        views_buffer.flush()
+        return Article.objects.get(pk=article.pk).views
+
+    def test_views_are_counted_in_batches(self):
+        updated_at = Article.objects.get(pk=self.articles[0].pk).updated_at
+        response = self.view(self.articles[0])
+        self.view(self.articles[0], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.view(self.articles[1])
+        self.client.get('http://testserver/articles/0')
+        self.assertEqual(views_buffer.get_pending(self.articles[0].id), 2)
+        self.assertEqual(Article.objects.get(pk=self.articles[0].pk).views, 0)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(views_buffer.flush(), 2)
+        article = Article.objects.get(pk=self.articles[0].pk)
+        self.assertEqual((article.views, article.updated_at), (2, updated_at))
+        self.assertEqual(self.views(self.articles[1]), 1)
+
+    def test_flushed_views_are_served(self):
+        url = 'http://testserver/articles/{}?fields=id,views'.format(self.articles[0].id)
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content)['views'], 0)
+        list_response = self.client.get('http://testserver/articles/?ordering=-views&fields=id,views')
+        for _ in range(4):
+            self.view(self.articles[0])
+        views_buffer.flush()
+
+        stale = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(json.loads(stale.content)['views'], 5)
+        stale = self.client.get('http://testserver/articles/?ordering=-views&fields=id,views',
+                                HTTP_IF_NONE_MATCH=list_response['ETag'])
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(json.loads(stale.content)['results'][0], {'id': self.articles[0].id, 'views': 5})
+
+    def test_flush_size(self):
+        with mock.patch.object(views_buffer, 'flush_size', 3):
+            for _ in range(2):
+                self.view(self.articles[0])
+            self.assertEqual(Article.objects.get(pk=self.articles[0].pk).views, 0)
+            self.view(self.articles[2])
+            self.assertEqual(Article.objects.get(pk=self.articles[0].pk).views, 2)
+            self.assertEqual(Article.objects.get(pk=self.articles[2].pk).views, 1)
+
+    def test_due_counts_are_flushed_when_request_finishes(self):
+        self.view(self.articles[1])
+        self.client.get('http://testserver/articles/')
+        self.assertEqual(Article.objects.get(pk=self.articles[1].pk).views, 0)
+
+        # No further view is counted, the finished request of another endpoint writes the pending one
+        with mock.patch.object(views_buffer, 'flush_interval', 0):
+            self.client.get('http://testserver/articles/')
+        self.assertEqual(views_buffer.get_pending(self.articles[1].id), 0)
+        self.assertEqual(Article.objects.get(pk=self.articles[1].pk).views, 1)
+
+    def test_flushed_at_shutdown(self):
+        self.view(self.articles[3])
+        flush_all()
+        self.assertEqual(Article.objects.get(pk=self.articles[3].pk).views, 1)
+
+    def test_update_keeps_counters(self):
+        self.view(self.articles[0])
+        views_buffer.flush()
+        self.client.force_login(self.user)
+        response = self.client.put('http://testserver/articles/{}'.format(self.articles[0].id),
+                                   json.dumps({'title': 'Edited', 'content': 'Edited', 'tags': []}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        article = Article.objects.get(pk=self.articles[0].pk)
+        self.assertEqual((article.title, article.views), ('Edited', 1))
+
+    def test_ordering_by_views(self):
+        for article, count in zip(self.articles, (2, 0, 3, 2)):
+            for _ in range(count):
+                self.view(article)
+        views_buffer.flush()
+        get_cache().clear()
+
+        response = self.client.get('http://testserver/articles/?ordering=-views&page_size=3&fields=id,views')
+        page = json.loads(response.content)
+        self.assertEqual(page['results'], [{'id': self.articles[2].id, 'views': 3},
+                                           {'id': self.articles[3].id, 'views': 2},
+                                           {'id': self.articles[0].id, 'views': 2}])
+        page = json.loads(self.client.get(page['next']).content)
+        self.assertEqual(page['results'], [{'id': self.articles[1].id, 'views': 0}])
+
+
+class QueryPlanTestCase(APITestCase):
+    """
+    Every SELECT of hot read paths is explained on a seeded dataset. Full table scans and sorts of
+    rows which an index could return in order fail the test
+    """
+    # Derived tables are read whole: limited counts of page number mode read at most count_limit ids,
+    # embedded comments read the ranked comments of the fetched articles
+    FULL_SCANS = {
+        'sqlite': re.compile(r'\bSCAN (TABLE )?(?!\(?subquery\b|ranked\b)\S+( AS \S+)?$'),
+        'postgresql': re.compile(r'\bSeq Scan\b'),
+    }
+    SORTS = {
+        'sqlite': re.compile(r'\bUSE TEMP B-TREE FOR ORDER BY\b'),
+        'postgresql': re.compile(r'^\s*(->\s+)?(Incremental )?Sort\b'),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.article_ids = seed_dataset(200, 5, 3, 10)
+
+    def setUp(self):
+        get_cache().clear()
+        if connection.vendor == 'postgresql':
+            # Small tables are always scanned otherwise, an index which exists is used with this
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+        self.client = Client()
+
+    def plans(self, path):
+        metrics = RequestMetrics(keep_statements=100)
+        with connection.execute_wrapper(metrics):
+            response = self.client.get('http://testserver' + path)
+        self.assertEqual(response.status_code, 200)
+        statements = [statement for statement in metrics.slowest_statements() if explain(statement) is not None]
+        self.assertTrue(statements)
+        return response, [(statement['sql'], explain(statement)) for statement in statements]
+
+    def assertIndexedPlans(self, path, sorts=False):
+        response, plans = self.plans(path)
+        if connection.vendor not in self.FULL_SCANS:
+            return response
+        for sql, plan in plans:
+            for row in plan:
+                self.assertIsNone(self.FULL_SCANS[connection.vendor].search(row), '{}\n{}'.format(sql, plan))
+                if not sorts:
+                    self.assertIsNone(self.SORTS[connection.vendor].search(row), '{}\n{}'.format(sql, plan))
+        return response
+
+    def test_article_lists(self):
+        for ordering in ('-publication_date', '-rating', '-views'):
+            for mode in ('page', 'cursor'):
+                response = self.assertIndexedPlans('/articles/?page_size=10&ordering={}&pagination={}'.format(
+                    ordering, mode))
+                self.assertIndexedPlans(json.loads(response.content)['next'].replace('http://testserver', ''))
+        self.assertIndexedPlans('/articles/?view=summary')
+
+    def test_tag_filtered_lists(self):
+        # Articles are read in page order from the ordering index, their tags are checked through indexes
+        for ordering in ('-publication_date', '-rating'):
+            for mode in ('page', 'cursor'):
+                for tags in ('tags=bench1,bench2', 'tags_all=bench1,bench2'):
+                    self.assertIndexedPlans('/articles/?{}&ordering={}&pagination={}'.format(tags, ordering, mode))
+
+    def test_article_details_and_comments(self):
+        article_id = self.article_ids[0]
+        self.assertIndexedPlans('/articles/{}'.format(article_id))
+        response = self.assertIndexedPlans('/articles/{}/comments?page_size=5'.format(article_id))
+        self.assertIndexedPlans(json.loads(response.content)['next'].replace('http://testserver', ''))
+        response = self.assertIndexedPlans('/articles/{}/comments?view=threads&page_size=5'.format(article_id))
+        self.assertIndexedPlans(json.loads(response.content)['next'].replace('http://testserver', ''))
+        thread = Comment.objects.filter(article_id=article_id).first()
+        self.assertIndexedPlans('/articles/{}/comments?thread={}'.format(article_id, thread.id))
+
+    def test_trending_feed(self):
+        # Only the fetched page is sorted into ranking order, the ranking itself is one range of the score index
+        response = self.assertIndexedPlans('/articles/trending?limit=10', sorts=True)
+        self.assertEqual(len(json.loads(response.content)), 10)
+        _, plans = self.plans('/articles/trending?limit=10')
+        ranking = [plan for sql, plan in plans if 'articletrend' in sql]
+        self.assertEqual(len(ranking), 1)
+        if connection.vendor in self.SORTS:
+            for row in ranking[0]:
+                self.assertIsNone(self.SORTS[connection.vendor].search(row), ranking[0])
+
+
+class BatchTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = CustomUser.objects.create_user(username='batch_user', password='password', is_redaction=True)
+        self.token = Token.objects.create(user=self.user)
+        self.articles = [Article.objects.create(title='Batch {}'.format(i), content='Content',
+                                                author=self.user.author, publication_date=date(2019, 6, i + 1))
+                         for i in range(5)]
+        self.client = Client()
+
+    def batch(self, operations, **headers):
+        return self.client.post('http://testserver/articles/batch', json.dumps({'operations': operations}),
+                                content_type='application/json', **headers)
+
+    def test_multi_get_keeps_requested_order(self):
+        ids = [self.articles[3].id, self.articles[0].id, 999999, self.articles[3].id]
+        response = self.client.get('http://testserver/articles/?fields=id&ids=' + ','.join(map(str, ids)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), [{'id': self.articles[3].id}, {'id': self.articles[0].id}])
+
+    def test_multi_get_query_count_is_constant(self):
+        for articles in (self.articles[:1], self.articles):
+            get_cache().clear()
+            with self.assertNumQueries(3):
+                response = self.client.get('http://testserver/articles/?ids=' +
+                                           ','.join(str(article.id) for article in articles))
+            self.assertEqual(len(json.loads(response.content)), len(articles))
+
+    def test_multi_get_validation(self):
+        for ids in ('', 'a,b', ','.join(str(i) for i in range(1, 52))):
+            response = self.client.get('http://testserver/articles/?ids=' + ids)
+            self.assertEqual(response.status_code, 400, ids)
+
+    def test_batch(self):
+        article = self.articles[0]
+        with mock.patch.object(CachedTokenAuthentication, 'authenticate_credentials',
+                               wraps=CachedTokenAuthentication().authenticate_credentials) as authenticate:
+            response = self.batch([
+                {'method': 'GET', 'path': '/articles/{}?fields=id,title'.format(article.id)},
+                {'method': 'POST', 'path': '/articles/{}/comment'.format(article.id), 'body': {'content': 'Batched'}},
+                {'method': 'POST', 'path': '/articles/999999/comment', 'body': {'content': 'Lost'}},
+                {'path': '/articles/{}/comments'.format(article.id)},
+                {'method': 'GET', 'path': '/articles/999999'},
+                {'method': 'DELETE', 'path': '/articles/{}'.format(article.id)},
+                {'method': 'POST', 'path': '/articles/batch', 'body': {'operations': []}},
+                {'method': 'GET', 'path': '/unknown'},
+            ], HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertEqual(authenticate.call_count, 1)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('articles_primary', response.cookies)
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['status'] for result in results], [200, 201, 404, 200, 404, 405, 405, 404])
+        self.assertEqual(results[0]['body'], {'id': article.id, 'title': 'Batch 0'})
+        self.assertEqual(results[1]['body']['content'], 'Batched')
+        self.assertEqual([comment['content'] for comment in results[3]['body']['results']], ['Batched'])
+        self.assertTrue(Article.objects.filter(pk=article.pk).exists())
+
+    def test_batch_respects_permissions(self):
+        article = self.articles[0]
+        response = self.batch([
+            {'method': 'GET', 'path': '/articles/?ids={}&fields=id'.format(article.id)},
+            {'method': 'POST', 'path': '/articles/{}/comment'.format(article.id), 'body': {'content': 'Anonymous'}},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertEqual(results[0], {'status': 200, 'body': [{'id': article.id}]})
+        self.assertEqual(results[1]['status'], 403)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_batch_validation(self):
+        self.assertEqual(self.batch([]).status_code, 400)
+        self.assertEqual(self.batch([{'method': 'GET'}]).status_code, 400)
+        self.assertEqual(self.batch([{'path': '/articles/'}] * 21).status_code, 400)
+
+
+class CommentThreadsTestCase(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='thread_user', password='password')
+        self.article = Article.objects.create(title='Threads', content='Content', author=self.user.author,
+                                              publication_date=date(2019, 7, 1))
+        self.other = Article.objects.create(title='Other', content='Content', author=self.user.author,
+                                            publication_date=date(2019, 7, 1))
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post(self, content, parent=None, article=None):
+        data = {'content': content}
+        if parent is not None:
+            data['parent'] = parent
+        return self.client.post('http://testserver/articles/{}/comment'.format((article or self.article).id),
+                                json.dumps(data), content_type='application/json')
+
+    def reply(self, content, parent=None):
+        response = self.post(content, parent)
+        self.assertEqual(response.status_code, 201)
+        return json.loads(response.content)['id']
+
+    def create_threads(self):
+        first = self.reply('first')
+        first_reply = self.reply('first reply', first)
+        second = self.reply('second')
+        self.reply('nested reply', first_reply)
+        self.reply('second reply', first)
+        self.reply('third')
+        self.post('other article', article=self.other)
+        return first, second
+
+    def contents(self, nodes):
+        return [(node['content'], self.contents(node['replies'])) for node in nodes]
+
+    def test_paths(self):
+        first, _ = self.create_threads()
+        comments = {comment.content: comment for comment in Comment.objects.all()}
+        self.assertEqual(comments['first'].path, '{:010d}'.format(first))
+        self.assertTrue(comments['nested reply'].path.startswith(comments['first reply'].path))
+        self.assertEqual(comments['nested reply'].depth, 2)
+        self.assertEqual([comment.content for comment in Comment.objects.subtree(comments['first'])],
+                         ['first', 'first reply', 'nested reply', 'second reply'])
+
+    def test_threads(self):
+        self.create_threads()
+        # Article, thread roots, whole threads
+        with self.assertNumQueries(3):
+            response = Client().get('http://testserver/articles/{}/comments?view=threads&page_size=2'.format(
+                self.article.id))
+        page = json.loads(response.content)
+        self.assertEqual(self.contents(page['results']), [
+            ('first', [('first reply', [('nested reply', [])]), ('second reply', [])]),
+            ('second', []),
+        ])
+        page = json.loads(self.client.get(page['next']).content)
+        self.assertEqual(self.contents(page['results']), [('third', [])])
+        self.assertIsNone(page['next'])
+
+    def test_thread(self):
+        first, second = self.create_threads()
+        first_reply = Comment.objects.get(content='first reply')
+        response = self.client.get('http://testserver/articles/{}/comments?thread={}'.format(
+            self.article.id, first_reply.id))
+        thread = json.loads(response.content)
+        self.assertEqual((thread['id'], thread['depth']), (first_reply.id, 1))
+        self.assertEqual(self.contents(thread['replies']), [('nested reply', [])])
+
+        response = self.client.get('http://testserver/articles/{}/comments?thread={}'.format(self.other.id, first))
+        self.assertEqual(response.status_code, 404)
+
+    def test_flat_list_contains_replies(self):
+        first, _ = self.create_threads()
+        response = self.client.get('http://testserver/articles/{}/comments'.format(self.article.id))
+        comments = json.loads(response.content)['results']
+        self.assertEqual(len(comments), 6)
+        self.assertEqual(comments[1]['parent'], first)
+
+    def test_reply_validation(self):
+        other = json.loads(self.post('other article', article=self.other).content)['id']
+        self.assertEqual(self.post('wrong article', parent=other).status_code, 400)
+        self.assertEqual(self.post('missing parent', parent=999999).status_code, 400)
+
+        parent = None
+        for depth in range(MAX_COMMENT_DEPTH):
+            parent = self.reply('level {}'.format(depth), parent)
+        self.assertEqual(self.post('too deep', parent=parent).status_code, 400)
+        deepest = Comment.objects.get(pk=parent)
+        self.assertEqual(len(deepest.path), Comment._meta.get_field('path').max_length)
+
+    def test_bulk_created_comments_get_paths(self):
+        Comment.objects.bulk_create([Comment(article=self.article, author=self.user.author, content='Bulk',
+                                             publication_date=timezone.now())])
+        self.assertEqual(Comment.objects.fill_paths(), 1)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.path, '{:010d}'.format(comment.id))
+
+
+class AdminTestCase(APITestCase):
+    """
+    Admin pages run the same number of queries however many articles, comments, authors and tags exist
+    """
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='admin', email='admin@example.com',
+                                                         password='password')
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create(self, count):
+        start = Article.objects.count()
+        users = [CustomUser.objects.create_user(username='admin_author{}'.format(start + i)) for i in range(count)]
+        tags = Tag.objects.get_or_create_many('admin{}'.format(start + i) for i in range(count))
+        articles = list()
+        for i, user in enumerate(users):
+            article = Article.objects.create(title='Admin article {}'.format(i), content='Searchable content',
+                                             author=user.author, publication_date=date(2019, 8, 1))
+            article.tags.add(*tags[:3])
+            Comment.objects.create(article=article, author=user.author, content='Comment',
+                                   publication_date=timezone.now())
+            articles.append(article)
+        return articles
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('http://testserver' + path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, make_path):
+        article = self.create(1)[0]
+        # Content types are cached by the first request
+        self.count_queries(make_path(article))
+        counts = [self.count_queries(make_path(article))]
+        self.create(20)
+        counts.append(self.count_queries(make_path(article)))
+        self.assertEqual(counts[0], counts[1])
+        return counts[0]
+
+    def test_article_changelist(self):
+        self.assertConstantQueries(lambda article: '/admin/articles_app/article/')
+        self.assertConstantQueries(lambda article: '/admin/articles_app/article/?publication_date__year=2019')
+
+    def test_comment_changelist(self):
+        self.assertConstantQueries(lambda article: '/admin/articles_app/comment/')
+        self.assertConstantQueries(lambda article: '/admin/articles_app/comment/?q={}'.format(article.id))
+
+    def test_change_forms(self):
+        self.assertConstantQueries(lambda article: '/admin/articles_app/article/{}/change/'.format(article.id))
+        self.assertConstantQueries(lambda article: '/admin/articles_app/comment/{}/change/'.format(
+            article.comment_set.get().id))
+
+    def test_article_search_uses_full_text_index(self):
+        self.create(3)
+        Article.objects.create(title='Needle', content='Content', author=self.admin.author,
+                               publication_date=date(2019, 8, 1))
+        response = self.client.get('http://testserver/admin/articles_app/article/?q=needle')
+        self.assertEqual(list(response.context['cl'].result_list), list(Article.objects.filter(title='Needle')))
+
+    def test_comment_search_by_article(self):
+        articles = self.create(2)
+        response = self.client.get('http://testserver/admin/articles_app/comment/?q={}'.format(articles[1].id))
+        self.assertEqual([comment.article_id for comment in response.context['cl'].result_list], [articles[1].id])
+        response = self.client.get('http://testserver/admin/articles_app/comment/?q=text')
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_edit_keeps_counters(self):
+        article = self.create(1)[0]
+        Article.objects.filter(pk=article.pk).update(views=7, rating=3)
+        response = self.client.post('http://testserver/admin/articles_app/article/{}/change/'.format(article.id), {
+            'title': 'Edited in admin', 'content': 'Content', 'author': article.author_id,
+            'tags': [tag.id for tag in article.tags.all()], 'publication_date': '2019-08-01', 'excerpt': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        article = Article.objects.get(pk=article.pk)
+        self.assertEqual((article.title, article.views, article.rating), ('Edited in admin', 7, 3))
+
+    def test_excerpt_is_read_only(self):
+        article = self.create(1)[0]
+        url = 'http://testserver/admin/articles_app/article/{}/change/'.format(article.id)
+        self.assertNotIn('excerpt', self.client.get(url).context['adminform'].form.fields)
+        response = self.client.post(url, {
+            'title': article.title, 'content': 'Rewritten content', 'author': article.author_id,
+            'tags': [tag.id for tag in article.tags.all()], 'publication_date': '2019-08-01',
+            'excerpt': 'Ignored excerpt',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Article.objects.get(pk=article.pk).excerpt, 'Rewritten content')
+
+
+class TrendingTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.users = [CustomUser.objects.create_user(username='trending_user{}'.format(i), password='password')
+                      for i in range(3)]
+        self.authors = [user.author for user in self.users]
+        today = date.today()
+        self.fresh, self.recent, self.old = [
+            Article.objects.create(title='Article {}'.format(days), content='Content', author=self.authors[0],
+                                   publication_date=today - timedelta(days=days))
+            for days in (0, 3, 30)]
+        self.now = timezone.now()
+
+    def comment(self, article, hours_ago=0, parent=None):
+        return Comment.objects.create(article=article, author=self.authors[0], content='Comment', parent=parent,
+                                      publication_date=self.now - timedelta(hours=hours_ago))
+
+    def assertMatchesRecomputation(self):
+        rows = {row.article_id: row for row in ArticleTrend.objects.all()}
+        epochs = set(row.epoch for row in rows.values())
+        self.assertEqual(len(epochs), 1)
+        epoch = epochs.pop()
+        expected = compute_scores(Article.objects.values_list('id', flat=True), epoch)
+        self.assertEqual(set(rows), set(pk for pk, score in expected.items() if is_trending(score, epoch)))
+        for pk, row in rows.items():
+            self.assertAlmostEqual(row.score, expected[pk], delta=abs(expected[pk]) * 1e-9)
+
+    def ranking(self, path='/articles/trending'):
+        response = self.client.get('http://testserver' + path)
+        self.assertEqual(response.status_code, 200)
+        return [article['id'] for article in json.loads(response.content)]
+
+    def test_incremental_scores_match_recomputation(self):
+        # Published a month ago, decayed out of the feed
+        self.assertFalse(ArticleTrend.objects.filter(article=self.old).exists())
+        self.assertMatchesRecomputation()
+
+        root = self.comment(self.recent, hours_ago=2)
+        self.comment(self.recent, hours_ago=1, parent=root)
+        self.comment(self.fresh, hours_ago=5)
+        self.comment(self.old)
+        cast_vote(self.fresh.id, self.authors[1], Vote.UP)
+        cast_vote(self.fresh.id, self.authors[1], Vote.DOWN)
+        cast_vote(self.recent.id, self.authors[2], Vote.UP)
+        self.assertTrue(ArticleTrend.objects.filter(article=self.old).exists())
+        self.assertMatchesRecomputation()
+
+        self.client.force_authenticate(self.users[1])
+        response = self.client.post('http://testserver/articles/{}/comment'.format(self.old.id),
+                                    {'content': 'Posted'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        root.delete()
+        call_command('decay_trending', stdout=io.StringIO())
+        cast_vote(self.recent.id, self.authors[2], Vote.DOWN)
+        self.comment(self.fresh)
+        Vote.objects.filter(article=self.fresh).delete()
+        self.assertMatchesRecomputation()
+
+        scores = dict(ArticleTrend.objects.values_list('article_id', 'score'))
+        call_command('decay_trending', '--rebuild', stdout=io.StringIO())
+        self.assertMatchesRecomputation()
+        self.assertEqual(sorted(scores, key=scores.get), list(ArticleTrend.objects.order_by('score')
+                                                               .values_list('article_id', flat=True)))
+
+    def test_feed_is_ranked_by_score(self):
+        self.assertEqual(self.ranking(), [self.fresh.id, self.recent.id])
+        for _ in range(3):
+            self.comment(self.old)
+        for author in self.authors:
+            cast_vote(self.recent.id, author, Vote.UP)
+        self.assertEqual(self.ranking(), [self.recent.id, self.fresh.id, self.old.id])
+        self.assertEqual(self.ranking('/articles/trending?limit=1'), [self.recent.id])
+
+        response = self.client.get('http://testserver/articles/trending?view=summary')
+        self.assertNotIn('content', json.loads(response.content)[0])
+        for limit in ('0', '101', 'many'):
+            response = self.client.get('http://testserver/articles/trending?limit={}'.format(limit))
+            self.assertEqual(response.status_code, 400)
+
+    def test_decay_drops_articles_out_of_the_feed(self):
+        rebased, pruned = rebase(self.now + timedelta(days=7))
+        # Publications of the fresh and the recent article decayed to 10 / 2 ** 7 and 10 / 2 ** 10
+        self.assertEqual((rebased, pruned), (2, 1))
+        self.assertEqual(self.ranking(), [self.fresh.id])
+
+        # Scored from scratch relative to the new epoch
+        self.comment(self.recent)
+        self.assertEqual(self.ranking(), [self.fresh.id, self.recent.id])
+        self.assertMatchesRecomputation()
+
+    def test_new_rows_use_stored_epoch(self):
+        later = self.now + timedelta(hours=1)
+        rebase(later)
+        self.assertEqual(TrendingEpoch.objects.get().epoch, later)
+        with CaptureQueriesContext(connection) as queries:
+            published = Article.objects.create(title='Published', content='Content', author=self.authors[0],
+                                               publication_date=date.today())
+        # The epoch is read from its row, not aggregated over the scores
+        self.assertFalse([query for query in queries if 'MAX(' in query['sql'].upper()])
+        self.assertEqual(ArticleTrend.objects.get(article=published).epoch, later)
+        self.assertMatchesRecomputation()
+
+    def test_row_written_while_epoch_moves_is_recomputed(self):
+        later = self.now + timedelta(hours=1)
+        # The publication reads the epoch right before the decay job moves it
+        stale = [current_epoch()]
+        rebase(later)
+        with mock.patch('articles_app.trending.current_epoch',
+                        side_effect=lambda using='default': stale.pop() if stale else current_epoch(using)):
+            published = Article.objects.create(title='Published', content='Content', author=self.authors[0],
+                                               publication_date=date.today())
+        self.assertFalse(stale)
+        self.assertEqual(ArticleTrend.objects.get(article=published).epoch, later)
+        self.assertMatchesRecomputation()
+
+    def test_deleted_article_leaves_feed(self):
+        self.comment(self.fresh)
+        cast_vote(self.fresh.id, self.authors[1], Vote.UP)
+        self.fresh.delete()
+        self.assertEqual(self.ranking(), [self.recent.id])
+        self.assertMatchesRecomputation()
+
+
+class ChangeLogTestCase(APITestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.settle = override_settings(ARTICLES_CHANGES_SETTLE_SECONDS=0)
+        self.settle.enable()
+        self.addCleanup(self.settle.disable)
+        self.user = CustomUser.objects.create_user(username='replicated', password='password', is_redaction=True)
+        self.client.force_login(self.user)
+        self.start = Change.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+
+    def changes(self, since=None, limit=100):
+        response = self.client.get('http://testserver/articles/changes?since={}&limit={}'.format(
+            self.start if since is None else since, limit))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def entries(self, since=None):
+        return [(entry['type'], entry['id'], entry['action']) for entry in self.changes(since)['results']]
+
+    def create_article(self, title='Replicated', tags=('sync',)):
+        response = self.client.post('http://testserver/articles/', {'title': title, 'content': 'Content',
+                                                                     'tags': list(tags)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Article.objects.get(pk=json.loads(response.content)['id'])
+
+    def test_created_updated_and_deleted_objects(self):
+        article = self.create_article()
+        tag = Tag.objects.get(name='sync')
+        comment = Comment.objects.create(article=article, author=self.user.author, content='First',
+                                         publication_date=timezone.now())
+        page = self.changes()
+        # Tagging the new article is its update, only the latest entry of an object is returned
+        self.assertEqual([(entry['type'], entry['id'], entry['action']) for entry in page['results']],
+                         [('tag', tag.id, 'create'), ('article', article.id, 'update'),
+                          ('comment', comment.id, 'create')])
+        data = {entry['type']: entry['data'] for entry in page['results']}
+        self.assertEqual(data['tag'], {'id': tag.id, 'name': 'sync'})
+        self.assertEqual((data['article']['title'], data['article']['tags']), ('Replicated', [{'name': 'sync'}]))
+        self.assertNotIn('comments', data['article'])
+        self.assertEqual((data['comment']['article'], data['comment']['content']), (article.id, 'First'))
+        self.assertIsNone(page['next'])
+
+        since = page['last_seq']
+        response = self.client.delete('http://testserver/articles/{}'.format(article.id))
+        self.assertEqual(response.status_code, 204)
+        tag.name = 'renamed'
+        tag.save()
+        # Comments deleted with the article leave tombstones as well
+        self.assertEqual(self.entries(since), [('comment', comment.id, 'delete'), ('article', article.id, 'delete'),
+                                               ('tag', tag.id, 'update')])
+        self.assertEqual([entry['data'] for entry in self.changes(since)['results']][:2], [None, None])
+
+    def test_pages_continue_from_last_seq(self):
+        tags = [Tag.objects.create(name='page{}'.format(i)) for i in range(5)]
+        seen, since, requests = list(), self.start, 0
+        while True:
+            page = self.changes(since, limit=2)
+            requests += 1
+            seen += [entry['id'] for entry in page['results']]
+            since = page['last_seq']
+            if page['next'] is None:
+                break
+            self.assertIn('since={}'.format(since), page['next'])
+        self.assertEqual((seen, requests), ([tag.id for tag in tags], 3))
+        self.assertEqual(self.changes(since), {'last_seq': since, 'next': None, 'results': []})
+
+    def test_bulk_writes_are_logged(self):
+        # Existing tags are not logged again
+        Tag.objects.create(name='bulk')
+        since = self.changes()['last_seq']
+        importer = ArticleImporter(default_author=self.user.author)
+        line = json.dumps({'title': 'Imported', 'content': 'Content', 'tags': ['bulk', 'fresh'],
+                           'publication_date': '2019-01-01',
+                           'comments': [{'content': 'Comment', 'publication_date': '2019-02-01T10:00:00'}]})
+        self.assertEqual(list(importer.import_lines([line])), [])
+        article = Article.objects.get(title='Imported')
+        self.assertEqual(self.entries(since), [('tag', Tag.objects.get(name='fresh').id, 'create'),
+                                               ('article', article.id, 'create'),
+                                               ('comment', article.comment_set.get().id, 'create')])
+
+        since = self.changes()['last_seq']
+        cast_vote(article.id, self.user.author, Vote.UP)
+        rating_buffer.flush()
+        self.assertEqual(self.entries(since), [('article', article.id, 'update')])
+
+    def test_recent_changes_wait_until_settled(self):
+        Tag.objects.create(name='unsettled')
+        with override_settings(ARTICLES_CHANGES_SETTLE_SECONDS=60):
+            self.assertEqual(self.changes(), {'last_seq': self.start, 'next': None, 'results': []})
+        self.assertEqual(len(self.changes()['results']), 1)
+
+    def test_invalid_parameters(self):
+        for query in ('since=-1', 'since=first', 'limit=0', 'limit=1001'):
+            response = self.client.get('http://testserver/articles/changes?{}'.format(query))
+            self.assertEqual(response.status_code, 400)
+
+    def test_compaction(self):
+        article = self.create_article()
+        for title in ('Second', 'Third'):
+            article.title = title
+            article.save()
+        Tag.objects.create(name='kept')
+        before = self.entries()
+
+        call_command('compact_changes', stdout=io.StringIO())
+        self.assertEqual(Change.objects.filter(kind=Change.ARTICLE, object_id=article.id).count(), 1)
+        self.assertEqual(self.entries(), before)
+
+        last_seq = self.changes()['last_seq']
+        out = io.StringIO()
+        call_command('compact_changes', '--days', '0', stdout=out)
+        self.assertIn('and 3 expired', out.getvalue())
+        response = self.client.get('http://testserver/articles/changes?since={}'.format(self.start))
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(json.loads(response.content)['compacted_seq'], last_seq)
+        self.assertEqual(self.changes(last_seq)['results'], [])
+
+
+class ExcerptMigrationTestCase(TransactionTestCase):
+    migrate_from = [('articles_app', '0005_article_search')]
+    migrate_to = [('articles_app', '0006_article_excerpt')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_articles_get_excerpts(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('articles_app', 'CustomUser')
+        Author = apps.get_model('articles_app', 'Author')
+        Article = apps.get_model('articles_app', 'Article')
+        author = Author.objects.create(user=User.objects.create(username='excerpt_user'))
+        article = Article.objects.create(title='Long', content='word  ' * 100, author=author,
+                                         publication_date=date.today())
+
+        apps = self.migrate(self.migrate_to)
+        excerpt = apps.get_model('articles_app', 'Article').objects.get(pk=article.pk).excerpt
+        self.assertEqual(excerpt, ' '.join(['word'] * 55) + '…')
+
+
+class CommentPathMigrationTestCase(TransactionTestCase):
+    migrate_from = [('articles_app', '0009_hot_path_indexes')]
+    migrate_to = [('articles_app', '0010_comment_threads')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_comments_become_thread_roots(self):
+        apps = self.migrate(self.migrate_from)
+        User = apps.get_model('articles_app', 'CustomUser')
+        Author = apps.get_model('articles_app', 'Author')
+        Article = apps.get_model('articles_app', 'Article')
+        Comment = apps.get_model('articles_app', 'Comment')
+        author = Author.objects.create(user=User.objects.create(username='path_user'))
+        article = Article.objects.create(title='Threads', content='', author=author, publication_date=date.today())
+        comments = [Comment.objects.create(article=article, author=author, content='Comment',
+                                           publication_date=timezone.now()) for _ in range(2)]
+
+        apps = self.migrate(self.migrate_to)
+        Comment = apps.get_model('articles_app', 'Comment')
+        self.assertEqual(list(Comment.objects.order_by('id').values_list('path', 'depth')),
+                         [(str(comment.id).zfill(10), 0) for comment in comments])
@@ -0,0 +1,192 @@
+import math
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from articles_app.models import Article, ArticleTrend, Comment, TrendingEpoch, Vote
+
+# Every publication, comment and vote adds its weight to the trending score of the article, halved every
+# ARTICLES_TRENDING_HALF_LIFE hours since it happened. Decay is applied implicitly: a row stores
+#
+#     score = sum(weight * exp((happened_at - epoch) / TIME_CONSTANT))
+#
+# which orders articles the same way as their decayed scores at any moment, so an event only adds its own
+# term to one row and the feed is read from the score index as it is. Terms grow with time, the decay job
+# moves epoch of all rows forward (see rebase) and prunes rows which decayed below ARTICLES_TRENDING_MIN_SCORE.
+# The epoch is stored in the TrendingEpoch row. Only the decay job locks it, writers of new rows read it
+# without a lock and check it again after writing, rows written while it moved are recomputed. A row which
+# still misses the move keeps its epoch column and is rescaled by the next rebase
+HALF_LIFE = getattr(settings, 'ARTICLES_TRENDING_HALF_LIFE', 24.0)
+TIME_CONSTANT = HALF_LIFE * 3600 / math.log(2)
+PUBLICATION_WEIGHT = getattr(settings, 'ARTICLES_TRENDING_PUBLICATION_WEIGHT', 10.0)
+COMMENT_WEIGHT = getattr(settings, 'ARTICLES_TRENDING_COMMENT_WEIGHT', 1.0)
+VOTE_WEIGHT = getattr(settings, 'ARTICLES_TRENDING_VOTE_WEIGHT', 2.0)
+MIN_SCORE = getattr(settings, 'ARTICLES_TRENDING_MIN_SCORE', 0.01)
+REBUILD_CHUNK_SIZE = 500
+UPDATE_ATTEMPTS = 3
+EPOCH_ID = 1
+
+
+def as_datetime(moment):
+    """
+    Aware datetime of moment, dates (article publication) are taken at their midnight
+    """
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_default_timezone())
+    return moment
+
+
+def publication_moment(publication_date):
+    # Instances saved with a datetime store only its date
+    if isinstance(publication_date, datetime):
+        publication_date = publication_date.date()
+    return as_datetime(publication_date)
+
+
+def growth(moment, epoch):
+    return math.exp((as_datetime(moment) - epoch).total_seconds() / TIME_CONSTANT)
+
+
+def current_epoch(using='default'):
+    """
+    Epoch of the scores, created with now when missing
+    """
+    row, _ = TrendingEpoch.objects.using(using).get_or_create(pk=EPOCH_ID, defaults={'epoch': timezone.now()})
+    return row.epoch
+
+
+def move_epoch(now, using='default'):
+    """
+    Store now as the epoch, the row stays locked until the end of the transaction
+    """
+    row, _ = TrendingEpoch.objects.using(using).select_for_update() \
+        .get_or_create(pk=EPOCH_ID, defaults={'epoch': now})
+    row.epoch = now
+    row.save(using=using, update_fields=['epoch'])
+
+
+def compute_scores(article_ids, epoch, using='default'):
+    """
+    Full recomputation of scores of article_ids relative to epoch from their comments and votes.
+    Return {article id: score} of articles which exist
+    """
+    scores = dict()
+    for article_id, publication_date in Article.objects.using(using).filter(id__in=article_ids) \
+            .values_list('id', 'publication_date'):
+        scores[article_id] = PUBLICATION_WEIGHT * growth(publication_moment(publication_date), epoch)
+    for article_id, publication_date in Comment.objects.using(using).filter(article_id__in=list(scores)) \
+            .values_list('article_id', 'publication_date'):
+        scores[article_id] += COMMENT_WEIGHT * growth(publication_date, epoch)
+    for article_id, value, created_at in Vote.objects.using(using).filter(article_id__in=list(scores)) \
+            .values_list('article_id', 'value', 'created_at'):
+        scores[article_id] += VOTE_WEIGHT * value * growth(created_at, epoch)
+    return scores
+
+
+def is_trending(score, epoch, now=None):
+    return score * growth(epoch, now or timezone.now()) >= MIN_SCORE
+
+
+def store_scores(ids, epoch, using='default'):
+    """
+    Insert rows of articles with ids relative to epoch, return number of stored rows
+    """
+    stored = 0
+    now = timezone.now()
+    for start in range(0, len(ids), REBUILD_CHUNK_SIZE):
+        scores = compute_scores(ids[start:start + REBUILD_CHUNK_SIZE], epoch, using)
+        rows = [ArticleTrend(article_id=article_id, score=score, epoch=epoch)
+                for article_id, score in scores.items() if is_trending(score, epoch, now)]
+        ArticleTrend.objects.using(using).bulk_create(rows)
+        stored += len(rows)
+    return stored
+
+
+def rebuild(article_ids=None, using='default'):
+    """
+    Recompute rows of article_ids, of all articles when None. Articles whose score decayed below
+    MIN_SCORE get no row. Return number of stored rows
+    """
+    trends = ArticleTrend.objects.using(using)
+    with transaction.atomic(using=using):
+        if article_ids is None:
+            epoch = timezone.now()
+            move_epoch(epoch, using)
+            trends.all().delete()
+            return store_scores(list(Article.objects.using(using).order_by('id').values_list('id', flat=True)),
+                                epoch, using)
+
+        ids = list(article_ids)
+        for _ in range(UPDATE_ATTEMPTS):
+            epoch = current_epoch(using)
+            trends.filter(article_id__in=ids).delete()
+            stored = store_scores(ids, epoch, using)
+            if current_epoch(using) == epoch:
+                break
+    return stored
+
+
+def add_article(article, using='default'):
+    """
+    Row of a new article, which has neither comments nor votes yet. It is recomputed when the epoch
+    moved while it was written
+    """
+    epoch = current_epoch(using)
+    score = PUBLICATION_WEIGHT * growth(publication_moment(article.publication_date), epoch)
+    if not is_trending(score, epoch):
+        return
+    ArticleTrend.objects.using(using).create(article_id=article.pk, score=score, epoch=epoch)
+    if current_epoch(using) != epoch:
+        rebuild([article.pk], using)
+
+
+def add_event(article_id, weight, moment, using='default'):
+    """
+    Add term of an event to the score of article. A missing row is recomputed from scratch, unless weight
+    is negative: such article has decayed out of the feed or is being deleted. Rows which drop below
+    MIN_SCORE are deleted
+    """
+    trends = ArticleTrend.objects.using(using)
+    for _ in range(UPDATE_ATTEMPTS):
+        epoch = trends.filter(article_id=article_id).values_list('epoch', flat=True).first()
+        if epoch is None:
+            if weight > 0:
+                rebuild([article_id], using)
+            return
+        # Epoch of the row is checked, the decay job may have moved it since it was read
+        if trends.filter(article_id=article_id, epoch=epoch) \
+                .update(score=F('score') + weight * growth(moment, epoch)):
+            if weight < 0:
+                trends.filter(article_id=article_id, epoch=epoch,
+                              score__lt=MIN_SCORE / growth(epoch, timezone.now())).delete()
+            return
+    rebuild([article_id], using)
+
+
+def rebase(now=None, using='default'):
+    """
+    Move epoch of all scores to now and delete rows which decayed below MIN_SCORE.
+    Return (rebased, pruned) numbers of rows
+    """
+    now = now or timezone.now()
+    rebased = 0
+    with transaction.atomic(using=using):
+        move_epoch(now, using)
+        trends = ArticleTrend.objects.using(using)
+        for epoch in list(trends.exclude(epoch=now).values_list('epoch', flat=True).distinct()):
+            rebased += trends.filter(epoch=epoch).update(score=F('score') * growth(epoch, now), epoch=now)
+        pruned, _ = trends.filter(score__lt=MIN_SCORE).delete()
+    return rebased, pruned
+
+
+def trending_ids(limit):
+    """
+    Ids of the limit top articles, one range scan of the score index
+    """
+    return list(ArticleTrend.objects.order_by('-score', '-article_id')
+                .values_list('article_id', flat=True)[:limit])
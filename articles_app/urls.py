@@ -6,8 +6,17 @@ from django.urls import path, include
 app_name = 'articles'
 urlpatterns = [
     path('', views.ArticlesController.as_view()),
+    path('search', views.ArticleSearchController.as_view()),
+    path('trending', views.TrendingController.as_view()),
+    path('bulk', views.ArticlesImportController.as_view()),
+    path('export', views.ArticlesExportController.as_view()),
+    path('changes', views.ChangesController.as_view()),
+    path('token', views.TokenController.as_view()),
+    path('batch', views.BatchController.as_view()),
     path('<int:pk>', views.ArticleDetailsController.as_view()),
-    path('<int:pk>/comment', views.CommentController.as_view())
+    path('<int:pk>/vote', views.ArticleVoteController.as_view()),
+    path('<int:pk>/comment', views.CommentController.as_view()),
+    path('<int:pk>/comments', views.CommentController.as_view(), name='comments'),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
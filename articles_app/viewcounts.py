@@ -0,0 +1,18 @@
+from django.conf import settings
+
+from articles_app.cache import invalidate_articles
+from articles_app.counters import CounterBuffer
+from articles_app.models import Article
+
+VIEWS_FLUSH_SIZE = getattr(settings, 'ARTICLES_VIEWS_FLUSH_SIZE', 500)
+VIEWS_FLUSH_INTERVAL = getattr(settings, 'ARTICLES_VIEWS_FLUSH_INTERVAL', 10.0)
+
+# Reads of articles are counted in process memory and written in batches. A view does not modify
+# the article, so neither updated_at nor the change log are touched by a flush. Cached payloads and
+# validators carry the count, they are made stale once per flush
+views_buffer = CounterBuffer(Article, 'views', flush_size=VIEWS_FLUSH_SIZE, flush_interval=VIEWS_FLUSH_INTERVAL,
+                             on_flush=invalidate_articles)
+
+
+def count_view(article_id):
+    views_buffer.add(article_id)
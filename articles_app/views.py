@@ -1,18 +1,48 @@
-from django.http import Http404
+import io
+import json
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db.models import Case, IntegerField, Value, When
+from django.http import Http404, StreamingHttpResponse
+from django.urls import Resolver404, resolve
+from django.utils import timezone
 from django.utils.datetime_safe import datetime
 from rest_framework import generics, permissions, status
 from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
-from articles_app.pagination import ArticlesPagination
+from articles_app.authentication import CachedTokenAuthentication
+from articles_app.cache import CachedReadMixin
+from articles_app.changes import compacted_seq, fetch_changes
+from articles_app.conditional import ConditionalGetMixin
+from articles_app.export import EXPORT_FORMATS, export_articles, filter_export, parse_since
+from articles_app.importer import ArticleImporter
+from articles_app.instrumentation import InstrumentedViewMixin
+from articles_app.pagination import ArticlesPagination, CommentsPagination, CommentThreadsPagination, \
+    SearchPagination
 from articles_app.permissions import IsAuthorOrReadOnly, IsAuthorInRedactionOrReadOnly
+from articles_app.planner import plan_queryset
+from articles_app.renderers import CSVRenderer, NDJSONRenderer
+from articles_app.routers import ReplicaReadMixin
+from articles_app.search import ArticleSearch
+from articles_app.trending import trending_ids
 
-from articles_app.models import Article, Author, get_author_data_related_to_user, Comment
+from articles_app.models import Article, Author, get_author_data_related_to_user, Comment, subtree_range, Change, Tag
+from articles_app.viewcounts import count_view
+from articles_app.votes import cast_vote
 
 # Create your views here.
-from articles_app.serializers import ArticlesPostSerializer, ArticlesGetSerializer, CommentPostSerializer
+from articles_app.serializers import ArticlesPostSerializer, ArticlesGetSerializer, CommentPostSerializer, \
+    CommentGetSerializer, ArticleSearchResultSerializer, VoteSerializer, CommentReplySerializer, \
+    CommentTreeSerializer, CommentChangeSerializer, TagChangeSerializer
 
 
 def convert_string_to_tag_object(tags):
@@ -22,16 +52,92 @@ def convert_string_to_tag_object(tags):
     return tags_object_list
 
 
-class ArticlesController(generics.ListCreateAPIView):
+def split_query_param(value):
+    if value is None:
+        return list()
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+
+def filter_by_tags(queryset, query_params):
+    tags = split_query_param(query_params.get('tags', None))
+    if tags:
+        queryset = queryset.tagged_with_any(tags)
+
+    tags_all = split_query_param(query_params.get('tags_all', None))
+    if tags_all:
+        queryset = queryset.tagged_with_all(tags_all)
+
+    return queryset
+
+
+def in_order_of(queryset, ids):
+    """
+    Rows of queryset with ids in the order of ids, missing ones are left out
+    """
+    position = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(ids)], output_field=IntegerField())
+    return queryset.filter(pk__in=ids).order_by(position)
+
+
+class SparseFieldsViewMixin(object):
+    """
+    Select fields of serialized articles with ?fields= and ?exclude= (comma separated names)
+    and ?view=summary which replaces content and comments with excerpt
+    """
+    views = ('full', 'summary')
+
+    def get_serializer_fields(self):
+        if hasattr(self, '_serializer_fields'):
+            return self._serializer_fields
+
+        self._serializer_fields = None
+        serializer_class = self.get_serializer_class()
+        params = self.request.query_params
+        if not hasattr(serializer_class, 'select_fields'):
+            return None
+        if not any(name in params for name in ('fields', 'exclude', 'view')):
+            return None
+
+        view = params.get('view', 'full')
+        if view not in self.views:
+            raise ValidationError({'view': ['Must be one of: {}.'.format(', '.join(self.views))]})
+        base = serializer_class.summary_fields if view == 'summary' else None
+        try:
+            self._serializer_fields = serializer_class.select_fields(split_query_param(params.get('fields', None)),
+                                                                     split_query_param(params.get('exclude', None)),
+                                                                     base)
+        except ValueError as e:
+            raise ValidationError({'fields': [str(e)]})
+        return self._serializer_fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_serializer_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def plan(self, queryset):
+        return plan_queryset(queryset, self.get_serializer_class(), self.get_serializer_fields())
+
+
+class ArticlesController(ReplicaReadMixin, InstrumentedViewMixin, ConditionalGetMixin, CachedReadMixin,
+                         SparseFieldsViewMixin, generics.ListCreateAPIView):
     """
     Handle incoming articles related requests. Allows for getting all articles with get() method
-    or posting new one with post() method
+    or posting new one with post() method. ?ids=1,2,3 returns the given articles, in that order
+    and without pagination
     """
     queryset = Article.objects.all()
     serializer_class = ArticlesGetSerializer
-    authentication_classes = (SessionAuthentication, BasicAuthentication)
+    authentication_classes = (SessionAuthentication, CachedTokenAuthentication, BasicAuthentication)
     permission_classes = (IsAuthorInRedactionOrReadOnly,)
     pagination_class = ArticlesPagination
+    orderings = {
+        '-publication_date': ('-publication_date', '-id'),
+        '-rating': ('-rating', '-id'),
+        '-views': ('-views', '-id'),
+    }
+    default_ordering = '-publication_date'
+    max_ids = 50
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -39,15 +145,37 @@ class ArticlesController(generics.ListCreateAPIView):
         elif self.request.method == 'GET':
             return ArticlesGetSerializer
 
+    def get_ordering(self):
+        ordering = self.request.query_params.get('ordering', self.default_ordering)
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': ['Must be one of: {}.'.format(', '.join(sorted(self.orderings)))]})
+        return self.orderings[ordering]
+
+    def get_ids(self):
+        """
+        Article ids of ?ids= multi-get, None when the parameter is not given
+        """
+        if 'ids' not in self.request.query_params:
+            return None
+        try:
+            ids = list(OrderedDict.fromkeys(int(pk) for pk in split_query_param(self.request.query_params['ids'])))
+        except ValueError:
+            raise ValidationError({'ids': ['Must be comma separated article ids.']})
+        if not ids or len(ids) > self.max_ids:
+            raise ValidationError({'ids': ['Must contain 1 to {} ids.'.format(self.max_ids)]})
+        return ids
+
     def get_queryset(self):
-        tags = self.request.query_params.get('tags', None)
-        if tags is not None:
-            tags = str(tags).split(',')
-            queryset = Article.objects.filter(tags__name__in=tags)
-        else:
-            queryset = Article.objects.order_by('-publication_date')
+        ids = self.get_ids()
+        if ids is not None:
+            return self.plan(in_order_of(Article.objects.all(), ids))
+        queryset = filter_by_tags(Article.objects.order_by(*self.get_ordering()), self.request.query_params)
+        return self.plan(queryset)
 
-        return queryset
+    def paginate_queryset(self, queryset):
+        if self.get_ids() is not None:
+            return None
+        return super().paginate_queryset(queryset)
 
     def perform_create(self, serializer):
         related_author = get_author_data_related_to_user(self.request.user)
@@ -58,14 +186,15 @@ class ArticlesController(generics.ListCreateAPIView):
         return super().create(request, *args, **kwargs)
 
 
-class ArticleDetailsController(generics.RetrieveUpdateDestroyAPIView):
+class ArticleDetailsController(ReplicaReadMixin, InstrumentedViewMixin, ConditionalGetMixin, CachedReadMixin,
+                               SparseFieldsViewMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Get selected article information based on primary ket provided in url, update existing article,
     or delete existing article
     """
     queryset = Article.objects.all()
     serializer_class = ArticlesGetSerializer
-    authentication_classes = (SessionAuthentication, BasicAuthentication)
+    authentication_classes = (SessionAuthentication, CachedTokenAuthentication, BasicAuthentication)
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,
                           IsAuthorOrReadOnly, IsAuthorInRedactionOrReadOnly)
 
@@ -75,10 +204,257 @@ class ArticleDetailsController(generics.RetrieveUpdateDestroyAPIView):
         else:
             return ArticlesPostSerializer
 
+    def get_queryset(self):
+        return self.plan(Article.objects.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        # Revalidated copies are reads as well
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            count_view(kwargs['pk'])
+        return response
+
+
+class TrendingController(ReplicaReadMixin, InstrumentedViewMixin, SparseFieldsViewMixin, generics.ListAPIView):
+    """
+    Top ?limit= articles by trending score, which combines recency with recent comments and votes.
+    Ids are read from the materialized scores, see articles_app.trending
+    """
+    serializer_class = ArticlesGetSerializer
+    pagination_class = None
+    default_limit = 20
+    max_limit = 100
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= self.max_limit:
+            raise ValidationError({'limit': ['Must be a number from 1 to {}.'.format(self.max_limit)]})
+        return limit
+
+    def get_queryset(self):
+        return self.plan(in_order_of(Article.objects.all(), trending_ids(self.get_limit())))
+
+
+class ArticleSearchController(ReplicaReadMixin, InstrumentedViewMixin, SparseFieldsViewMixin, generics.ListAPIView):
+    """
+    Full-text search in article titles and content given by q parameter, ranked best match first.
+    Can be combined with tags filters
+    """
+    serializer_class = ArticleSearchResultSerializer
+    pagination_class = SearchPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['This query parameter is required.']})
+        articles = filter_by_tags(Article.objects.all(), self.request.query_params)
+        return ArticleSearch(query, articles, self.get_serializer_class(), self.get_serializer_fields())
+
+
+class ArticlesImportController(ReplicaReadMixin, APIView):
+    """
+    Import articles from NDJSON request body, one article per line. Rows are validated and inserted
+    in chunks while the body is read, response reports rows which were rejected
+    """
+    authentication_classes = (SessionAuthentication, CachedTokenAuthentication, BasicAuthentication)
+    permission_classes = (permissions.IsAuthenticated, IsAuthorInRedactionOrReadOnly)
+
+    def post(self, request):
+        try:
+            author = get_author_data_related_to_user(request.user)
+        except Author.DoesNotExist:
+            raise Http404("User doesn't have author data associated")
+
+        importer = ArticleImporter(default_author=author, restrict_author=not request.user.is_superuser)
+        lines = (line.decode('utf-8') for line in iter(request.stream.readline, b'')) if request.stream else ()
+        errors = list(importer.import_lines(lines))
+        return Response({'imported': importer.imported, 'failed': importer.failed, 'errors': errors},
+                        status=status.HTTP_200_OK)
+
+
+class ArticlesExportController(APIView):
+    """
+    Stream all articles as NDJSON or CSV (?format=ndjson|csv) in id order. Supports tags filters,
+    ?since= modification time and ?after= id of the last received article to resume export
+    """
+    renderer_classes = (NDJSONRenderer, CSVRenderer)
+    chunk_size = 1000
+
+    def get(self, request):
+        export_format = request.accepted_renderer.format
+        try:
+            since = request.query_params.get('since', None)
+            since = parse_since(since) if since else None
+            after = request.query_params.get('after', None)
+            after = int(after) if after else None
+        except ValueError as e:
+            raise ValidationError({'detail': [str(e)]})
+
+        queryset = filter_export(filter_by_tags(Article.objects.all(), request.query_params), since, after)
+        lines, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(lines(export_articles(queryset, self.chunk_size)),
+                                         content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="articles.{}"'.format(export_format)
+        return response
+
+
+class ChangesController(ReplicaReadMixin, InstrumentedViewMixin, APIView):
+    """
+    Change log of articles, comments and tags after ?since=<seq> in seq order, at most ?limit= entries
+    per response. Only the latest entry of an object is returned, created and updated objects come with
+    their current data (null when the object was deleted since) and deleted ones as tombstones. Clients
+    continue from last_seq. 410 means the log was compacted past since and the client has to synchronize
+    from the article listing again
+    """
+    default_limit = 100
+    max_limit = 1000
+
+    @property
+    def settle_seconds(self):
+        return getattr(settings, 'ARTICLES_CHANGES_SETTLE_SECONDS', 5)
+
+    @property
+    def article_fields(self):
+        return ArticlesGetSerializer.select_fields(exclude=['comments'])
+
+    def get_int_param(self, name, default, minimum, maximum):
+        try:
+            value = int(self.request.query_params.get(name, default))
+        except ValueError:
+            value = minimum - 1
+        if not minimum <= value <= maximum:
+            raise ValidationError({name: ['Must be a number from {} to {}.'.format(minimum, maximum)]})
+        return value
+
+    def get(self, request):
+        since = self.get_int_param('since', 0, 0, 2 ** 63 - 1)
+        limit = self.get_int_param('limit', self.default_limit, 1, self.max_limit)
+        changes, last_seq, has_more = fetch_changes(since, limit,
+                                                    timezone.now() - timedelta(seconds=self.settle_seconds))
+        # Read after the entries, compaction records its horizon together with the deletion
+        horizon = compacted_seq()
+        if since < horizon:
+            return Response({'detail': 'Changes up to {} were compacted.'.format(horizon), 'compacted_seq': horizon},
+                            status=status.HTTP_410_GONE)
+
+        data = self.get_data(changes)
+        results = [OrderedDict([
+            ('seq', change.seq),
+            ('type', change.kind),
+            ('id', change.object_id),
+            ('action', change.action),
+            ('data', data.get((change.kind, change.object_id))),
+        ]) for change in changes]
+        next_link = replace_query_param(request.build_absolute_uri(), 'since', last_seq) if has_more else None
+        return Response(OrderedDict([('last_seq', last_seq), ('next', next_link), ('results', results)]))
 
-class CommentController(APIView):
+    def get_data(self, changes):
+        """
+        Current data of created and updated objects, one query per type of objects
+        """
+        ids = {kind: set() for kind, _ in Change.KINDS}
+        for change in changes:
+            if change.action != Change.DELETE:
+                ids[change.kind].add(change.object_id)
+
+        objects = list()
+        if ids[Change.ARTICLE]:
+            fields = self.article_fields
+            articles = plan_queryset(Article.objects.filter(id__in=ids[Change.ARTICLE]), ArticlesGetSerializer,
+                                     fields)
+            objects.append((Change.ARTICLE, ArticlesGetSerializer(articles, many=True, fields=fields,
+                                                                  context={'request': self.request})))
+        if ids[Change.COMMENT]:
+            comments = Comment.objects.filter(id__in=ids[Change.COMMENT]).select_related('author')
+            objects.append((Change.COMMENT, CommentChangeSerializer(comments, many=True)))
+        if ids[Change.TAG]:
+            objects.append((Change.TAG, TagChangeSerializer(Tag.objects.filter(id__in=ids[Change.TAG]), many=True)))
+        return {(kind, item['id']): item for kind, serializer in objects for item in serializer.data}
+
+
+class TokenController(APIView):
+    """
+    Issue API token of the authenticated user with post() or revoke it with delete().
+    Clients send the token in 'Authorization: Token <key>' header instead of their password
+    """
+    authentication_classes = (SessionAuthentication, CachedTokenAuthentication, BasicAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        token, created = Token.objects.get_or_create(user=request.user)
+        return Response({'token': token.key}, status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+    def delete(self, request):
+        # Deleting the token drops its cached user as well
+        Token.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ArticleVoteController(ReplicaReadMixin, APIView):
+    """
+    Vote for the article with value 1 or -1. Every author has one vote, voting again changes it.
+    Article rating is updated in batches shortly after the vote
+    """
     permission_classes = (permissions.IsAuthenticated,)
 
+    def post(self, request, pk):
+        get_object_or_404(Article.objects.only('id'), pk=pk)
+        try:
+            author = get_author_data_related_to_user(request.user)
+        except Author.DoesNotExist:
+            raise Http404("User doesn't have author data associated")
+        serializer = VoteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        vote, created = cast_vote(pk, author, serializer.validated_data['value'])
+        return Response(VoteSerializer(vote).data, status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class CommentController(ReplicaReadMixin, InstrumentedViewMixin, generics.GenericAPIView):
+    """
+    List comments of the article in publication order with cursor pagination or add new comment,
+    a reply when parent comment id is posted. ?view=threads pages through threads with their replies
+    nested, ?thread=<comment id> returns that comment with all replies
+    """
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    serializer_class = CommentGetSerializer
+    pagination_class = CommentsPagination
+
+    def get_queryset(self):
+        return plan_queryset(Comment.objects.filter(article_id=self.kwargs['pk']), CommentGetSerializer)
+
+    def get(self, request, pk):
+        get_object_or_404(Article.objects.only('id'), pk=pk)
+        if 'thread' in request.query_params:
+            return self.get_thread(pk, request.query_params['thread'])
+        if request.query_params.get('view') == 'threads':
+            return self.get_threads(pk)
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_thread(self, pk, comment_id):
+        comment = get_object_or_404(Comment.objects.only('id', 'article_id', 'path'), pk=comment_id, article_id=pk)
+        comments = Comment.objects.subtree(comment).select_related('author')
+        return Response(CommentTreeSerializer(comments, many=True).data[0])
+
+    def get_threads(self, pk):
+        """
+        Page of thread roots, then all their replies with one range query over paths
+        """
+        paginator = CommentThreadsPagination()
+        roots = paginator.paginate_queryset(Comment.objects.filter(article_id=pk, depth=0).only('id', 'path'),
+                                            self.request, view=self)
+        comments = list()
+        if roots:
+            lowest, highest = roots[0].path, subtree_range(roots[-1].path)[1]
+            comments = Comment.objects.filter(article_id=pk, path__gte=lowest, path__lt=highest) \
+                .select_related('author').order_by('path')
+        return paginator.get_paginated_response(CommentTreeSerializer(comments, many=True).data)
+
     def post(self, request, pk):
         try:
             article = get_object_or_404(Article, pk=pk)
@@ -87,14 +463,14 @@ class CommentController(APIView):
             comment = Comment(article=article, author=comment_author, publication_date=current_date)
         except Author.DoesNotExist:
             raise Http404("User doesn't have author data associated")
-        serializer = CommentPostSerializer(comment, data=request.data)
+        serializer = CommentReplySerializer(comment, data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data, status.HTTP_201_CREATED)
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
 
-class CommentDetailController(APIView):
+class CommentDetailController(ReplicaReadMixin, APIView):
     permission_classes = (IsAuthorOrReadOnly,)
 
     def put(self, request, pk):
@@ -109,3 +485,69 @@ class CommentDetailController(APIView):
         comment = get_object_or_404(Comment, pk=pk)
         comment.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BatchController(ReplicaReadMixin, APIView):
+    """
+    Run up to max_operations sub-requests given as {"operations": [{"method": "GET", "path": "/articles/1"},
+    {"method": "POST", "path": "/articles/1/comment", "body": {...}}]} in one HTTP call and return
+    their statuses and bodies in the same order. The caller is authenticated once for all of them,
+    each sub-request is checked by permissions of its view. Operations are independent, one failing
+    does not undo the others
+    """
+    authentication_classes = (SessionAuthentication, CachedTokenAuthentication, BasicAuthentication)
+    max_operations = 20
+
+    def get_operations(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not 0 < len(operations) <= self.max_operations:
+            raise ValidationError({'operations': ['Must be a list of 1 to {} operations.'.format(self.max_operations)]})
+        for operation in operations:
+            if not isinstance(operation, dict) or not isinstance(operation.get('path'), str) \
+                    or not isinstance(operation.get('method', 'GET'), str):
+                raise ValidationError({'operations': ['Every operation must have a method and a path.']})
+        return operations
+
+    def post(self, request):
+        return Response({'results': [self.run(request, operation)
+                                     for operation in self.get_operations(request)]})
+
+    def run(self, request, operation):
+        method = operation.get('method', 'GET').upper()
+        path, _, query = operation['path'].partition('?')
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': {'detail': 'Not found.'}}
+        if method not in BATCH_OPERATIONS.get(getattr(match.func, 'view_class', None), ()):
+            return {'status': status.HTTP_405_METHOD_NOT_ALLOWED,
+                    'body': {'detail': 'Method "{}" is not allowed in batch for this path.'.format(method)}}
+
+        response = match.func(self.make_request(request, method, path, query, operation.get('body')),
+                              *match.args, **match.kwargs)
+        return {'status': response.status_code, 'body': getattr(response, 'data', None)}
+
+    def make_request(self, request, method, path, query, body):
+        """
+        Sub-request carrying headers of the batch and its authenticated user
+        """
+        content = json.dumps(body).encode('utf-8') if body is not None else b''
+        environ = dict(request._request.META, REQUEST_METHOD=method, PATH_INFO=path, QUERY_STRING=query,
+                       CONTENT_TYPE='application/json', CONTENT_LENGTH=str(len(content)))
+        environ['wsgi.input'] = io.BytesIO(content)
+        for header in ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'):
+            environ.pop(header, None)
+        sub_request = WSGIRequest(environ)
+        for name in ('session', 'metrics'):
+            if hasattr(request._request, name):
+                setattr(sub_request, name, getattr(request._request, name))
+        sub_request.user = sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        return sub_request
+
+
+BATCH_OPERATIONS = {
+    ArticlesController: ('GET',),
+    ArticleDetailsController: ('GET',),
+    CommentController: ('GET', 'POST'),
+}
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from articles_app.cache import invalidate_articles
+from articles_app.counters import CounterBuffer
+from articles_app.models import Article, Change, Vote
+from articles_app.trending import VOTE_WEIGHT, add_event
+
+RATING_FLUSH_SIZE = getattr(settings, 'ARTICLES_RATING_FLUSH_SIZE', 100)
+RATING_FLUSH_INTERVAL = getattr(settings, 'ARTICLES_RATING_FLUSH_INTERVAL', 5.0)
+
+# Changes of Article.rating are written in batches, flushed articles are marked as modified and logged
+# as changed in the same transaction, then their cached payloads are invalidated
+rating_buffer = CounterBuffer(Article, 'rating', flush_size=RATING_FLUSH_SIZE, flush_interval=RATING_FLUSH_INTERVAL,
+                              updates=lambda: {'updated_at': timezone.now()},
+                              on_write=lambda pks: Change.objects.record(Change.ARTICLE, pks, Change.UPDATE),
+                              on_flush=invalidate_articles)
+
+
+def _create_vote(article_id, author, value):
+    try:
+        with transaction.atomic():
+            return Vote.objects.create(article_id=article_id, author=author, value=value)
+    except IntegrityError:
+        # The author voted concurrently, that vote is changed instead
+        return None
+
+
+def cast_vote(article_id, author, value):
+    """
+    Record vote of author replacing the previous one and buffer the resulting change of article rating.
+    Return (vote, created)
+    """
+    with transaction.atomic():
+        vote = Vote.objects.select_for_update().filter(article_id=article_id, author=author).first()
+        created = False
+        if vote is None:
+            vote = _create_vote(article_id, author, value)
+            created = vote is not None
+            if not created:
+                vote = Vote.objects.select_for_update().get(article_id=article_id, author=author)
+
+        delta = value if created else value - vote.value
+        if not created and delta:
+            vote.value = value
+            vote.save(update_fields=['value'])
+
+    if delta:
+        rating_buffer.add(article_id, delta)
+        if not created:
+            # The vote keeps its time, its term changes by the difference
+            add_event(article_id, VOTE_WEIGHT * delta, vote.created_at)
+    return vote, created